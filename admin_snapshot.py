@@ -0,0 +1,146 @@
+import json
+import time
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+
+from app import db
+from models import User, Role, RoleType, Course, Assignment, Submission, AdminSnapshot, course_students
+
+logger = logging.getLogger(__name__)
+
+# Older snapshots are deleted once this many exist
+SNAPSHOTS_KEPT = 96
+
+# Rows in each of the dashboard's top-N lists
+TOP_N = 5
+
+
+def _count(statement):
+    return select(func.count()).select_from(statement.subquery()).scalar_subquery()
+
+
+def compute_admin_metrics(now=None):
+    """Compute every admin dashboard metric in four queries.
+
+    Returns:
+        dict: JSON-serializable metrics, in the names the dashboard template uses
+    """
+    now = now or datetime.utcnow()
+    month_ago = now - timedelta(days=30)
+
+    # All global counts in one statement of scalar subqueries
+    role_users = select(User.id).join(Role, Role.id == User.role_id)
+    counts = db.session.query(
+        _count(select(User.id)).label('total_users'),
+        _count(role_users.where(Role.name == RoleType.FACULTY)).label('total_faculty'),
+        _count(role_users.where(Role.name == RoleType.STUDENT)).label('total_students'),
+        _count(select(Course.id)).label('total_courses'),
+        _count(select(Course.id).where(Course.is_active.is_(True))).label('active_courses'),
+        _count(select(Assignment.id)).label('total_assignments'),
+        _count(select(Submission.id)).label('total_submissions'),
+        _count(select(User.id).where(User.created_at >= month_ago)).label('new_users')
+    ).one()
+    metrics = {name: int(value or 0) for name, value in counts._mapping.items()}
+
+    # Courses with the most submissions
+    submission_counts = db.session.query(
+        Assignment.course_id.label('course_id'),
+        func.count(Submission.id).label('submission_count')
+    ).join(Submission, Submission.assignment_id == Assignment.id).group_by(Assignment.course_id).subquery()
+    metrics['course_activity'] = [{
+        'id': course_id, 'code': code, 'title': title, 'submission_count': int(submission_count)
+    } for course_id, code, title, submission_count in db.session.query(
+        Course.id, Course.code, Course.title, func.coalesce(submission_counts.c.submission_count, 0)
+    ).outerjoin(
+        submission_counts, submission_counts.c.course_id == Course.id
+    ).order_by(func.coalesce(submission_counts.c.submission_count, 0).desc(), Course.id).limit(TOP_N)]
+
+    # Faculty teaching the most courses
+    metrics['faculty_activity'] = [{
+        'id': user_id, 'first_name': first_name, 'last_name': last_name, 'course_count': int(course_count)
+    } for user_id, first_name, last_name, course_count in db.session.query(
+        User.id, User.first_name, User.last_name, func.count(Course.id).label('course_count')
+    ).join(
+        Course, Course.faculty_id == User.id
+    ).group_by(User.id, User.first_name, User.last_name).order_by(
+        func.count(Course.id).desc(), User.id
+    ).limit(TOP_N)]
+
+    # Submissions as a share of students x assignments, per course, best first
+    enrollment_counts = db.session.query(
+        course_students.c.course_id.label('course_id'),
+        func.count(course_students.c.user_id).label('student_count')
+    ).group_by(course_students.c.course_id).subquery()
+    assignment_counts = db.session.query(
+        Assignment.course_id.label('course_id'),
+        func.count(Assignment.id).label('assignment_count')
+    ).group_by(Assignment.course_id).subquery()
+    completion = func.coalesce(submission_counts.c.submission_count, 0) * 100.0 / (
+        enrollment_counts.c.student_count * assignment_counts.c.assignment_count
+    )
+    metrics['course_completion'] = [{
+        'course_code': code, 'completion_rate': float(rate)
+    } for code, rate in db.session.query(
+        Course.code, completion
+    ).join(
+        enrollment_counts, enrollment_counts.c.course_id == Course.id
+    ).join(
+        assignment_counts, assignment_counts.c.course_id == Course.id
+    ).outerjoin(
+        submission_counts, submission_counts.c.course_id == Course.id
+    ).order_by(completion.desc(), Course.id).limit(TOP_N)]
+
+    return metrics
+
+
+def refresh_admin_snapshot():
+    """Compute the admin metrics and store them as the newest snapshot; returns it, or None on error."""
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    try:
+        metrics = compute_admin_metrics(now)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error computing admin metrics: {e}")
+        return None
+
+    snapshot = AdminSnapshot(computed_at=now, duration_ms=(time.perf_counter() - started) * 1000,
+                             data=json.dumps(metrics))
+    db.session.add(snapshot)
+    try:
+        db.session.flush()
+        # Keep the newest SNAPSHOTS_KEPT snapshots
+        cutoff = db.session.query(AdminSnapshot.id).order_by(AdminSnapshot.id.desc()).offset(
+            SNAPSHOTS_KEPT
+        ).limit(1).scalar()
+        if cutoff is not None:
+            AdminSnapshot.query.filter(AdminSnapshot.id <= cutoff).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error saving admin snapshot: {e}")
+        return None
+    logger.info(f"Admin snapshot refreshed in {snapshot.duration_ms:.0f} ms")
+    return snapshot
+
+
+def latest_admin_snapshot():
+    """Return the newest admin snapshot, or None if none was computed yet."""
+    return AdminSnapshot.query.order_by(AdminSnapshot.computed_at.desc(), AdminSnapshot.id.desc()).first()
+
+
+def snapshot_metrics(snapshot):
+    """Return the metrics stored in a snapshot."""
+    return json.loads(snapshot.data)
+
+
+def run_refresher(interval=300, once=False):
+    """Refresh the admin snapshot every `interval` seconds until interrupted (or once, if requested)."""
+    logger.info("Admin snapshot refresher started")
+    while True:
+        snapshot = refresh_admin_snapshot()
+        if once:
+            return snapshot
+        time.sleep(interval)
@@ -1,69 +1,66 @@
 import re
 import string
 import logging
+import heapq
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from bisect import bisect_right
 from collections import Counter
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
+
+from nlp_resources import get_token_normalizer
+from text_models import get_course_model
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-# Initialize NLTK components
-try:
-    nltk.download('punkt', quiet=True)
-    nltk.download('stopwords', quiet=True)
-    nltk.download('wordnet', quiet=True)
-except Exception as e:
-    logger.warning(f"Could not download NLTK data: {e}")
+# Bump whenever the analysis output changes; cached results of older versions are ignored
+ANALYZER_VERSION = '3'
 
-# Initialize lemmatizer and stopwords
-lemmatizer = WordNetLemmatizer()
-try:
-    stop_words = set(stopwords.words('english'))
-except:
-    # Fallback if NLTK data download failed
-    stop_words = set([
-        'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', 'your', 'yours',
-        'yourself', 'yourselves', 'he', 'him', 'his', 'himself', 'she', 'her', 'hers',
-        'herself', 'it', 'its', 'itself', 'they', 'them', 'their', 'theirs', 'themselves',
-        'what', 'which', 'who', 'whom', 'this', 'that', 'these', 'those', 'am', 'is', 'are',
-        'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having', 'do', 'does',
-        'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if', 'or', 'because', 'as', 'until',
-        'while', 'of', 'at', 'by', 'for', 'with', 'about', 'against', 'between', 'into',
-        'through', 'during', 'before', 'after', 'above', 'below', 'to', 'from', 'up', 'down',
-        'in', 'out', 'on', 'off', 'over', 'under', 'again', 'further', 'then', 'once', 'here',
-        'there', 'when', 'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more',
-        'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so',
-        'than', 'too', 'very', 's', 't', 'can', 'will', 'just', 'don', 'should', 'now'
-    ])
+# Precompiled tokenizer: punctuation becomes whitespace, then the text is split
+_PUNCTUATION = string.punctuation + '\u2018\u2019\u201c\u201d\u2013\u2014\u2026'
+_PUNCTUATION_TABLE = str.maketrans(_PUNCTUATION, ' ' * len(_PUNCTUATION))
 
-def preprocess_text(text):
-    """Preprocess text by removing punctuation, lowercase, tokenizing, removing stopwords, and lemmatizing."""
+def preprocess_tokens(text):
+    """Return the lowercased, lemmatized tokens of a text, without stopwords."""
     if not text or not isinstance(text, str):
-        return ""
-    
-    # Convert to lowercase and remove punctuation
-    text = text.lower()
-    text = re.sub(f'[{string.punctuation}]', ' ', text)
+        return []
     
-    # Tokenize and remove stopwords
-    tokens = word_tokenize(text)
-    tokens = [token for token in tokens if token not in stop_words]
+    return get_token_normalizer()(text.lower().translate(_PUNCTUATION_TABLE).split())
+
+def preprocess_text(text):
+    """Preprocess text by removing punctuation, lowercase, tokenizing, removing stopwords, and lemmatizing."""
+    return ' '.join(preprocess_tokens(text))
+
+def preprocess_many(texts, as_ids=False, vocabulary=None):
+    """
+    Preprocess a batch of texts.
     
-    # Lemmatize tokens
-    lemmatized_tokens = [lemmatizer.lemmatize(token) for token in tokens]
+    Args:
+        texts (iterable): The texts to preprocess
+        as_ids (bool): Return token-id arrays instead of joined strings
+        vocabulary (dict, optional): token -> id mapping used with as_ids; new
+            tokens are added to it. A fresh vocabulary is used if omitted.
+        
+    Returns:
+        list: One preprocessed string (or numpy int32 array of token ids) per text
+    """
+    if not as_ids:
+        return [preprocess_text(text) for text in texts]
     
-    return ' '.join(lemmatized_tokens)
+    if vocabulary is None:
+        vocabulary = {}
+    token_ids = []
+    for text in texts:
+        ids = [vocabulary.setdefault(token, len(vocabulary)) for token in preprocess_tokens(text)]
+        token_ids.append(np.array(ids, dtype=np.int32))
+    return token_ids
 
-def calculate_similarity(text1, text2):
-    """Calculate cosine similarity between two texts."""
+def calculate_similarity(text1, text2, course_id=None):
+    """Calculate cosine similarity between two texts, using the course's TF-IDF model if fitted."""
     if not text1 or not text2:
         return 0.0
     
@@ -74,6 +71,14 @@ def calculate_similarity(text1, text2):
     if not processed_text1 or not processed_text2:
         return 0.0
     
+    course_model = get_course_model(course_id)
+    if course_model is not None:
+        try:
+            return course_model.similarity(processed_text1, processed_text2)
+        except Exception as e:
+            logger.error(f"Error using text model of course {course_id}: {e}")
+    
+    # No usable course model: weigh the terms over just these two texts
     # Create TF-IDF vectors
     vectorizer = TfidfVectorizer()
     try:
@@ -86,7 +91,92 @@ def calculate_similarity(text1, text2):
         logger.error(f"Error calculating similarity: {e}")
         return 0.0
 
-def analyze_submission(submission_text, assignment_instructions, rubric=None, reference_answer=None):
+def extract_instruction_keywords(assignment_instructions, top_n=10):
+    """Return the most common preprocessed terms of the assignment instructions."""
+    instruction_words = preprocess_text(assignment_instructions).split()
+    return [word for word, count in Counter(instruction_words).most_common(top_n)]
+
+def _empty_analysis(feedback):
+    return {
+        'score_recommendation': None,
+        'confidence': 0.0,
+        'feedback': feedback,
+        'key_points': [],
+        'improvement_areas': []
+    }
+
+def _compose_analysis(word_count, keyword_coverage, similarity_to_reference, key_points):
+    """Turn the raw submission metrics into a score recommendation and feedback."""
+    # Identify improvement areas
+    improvement_areas = []
+    
+    # Check for wordiness
+    if word_count < 50:
+        improvement_areas.append("The submission is quite brief. Consider providing more detailed explanations.")
+    elif word_count > 1000:
+        improvement_areas.append("The submission is lengthy. Consider being more concise while maintaining key points.")
+    
+    # Check keyword coverage
+    if keyword_coverage < 0.5:
+        improvement_areas.append("The submission may not adequately address all required topics from the instructions.")
+    
+    # Generate score recommendation
+    score_factors = [
+        keyword_coverage * 0.7,  # Weight keyword coverage highly
+    ]
+    
+    if similarity_to_reference is not None:
+        score_factors.append(similarity_to_reference * 0.8)  # Weight similarity to reference answer if available
+    
+    # Basic score calculation
+    if score_factors:
+        avg_score = sum(score_factors) / len(score_factors)
+        # Scale to 0-100
+        score_recommendation = min(100, max(0, avg_score * 100))
+    else:
+        score_recommendation = None
+    
+    # Calculate confidence
+    if similarity_to_reference is not None:
+        confidence = 0.7  # Higher confidence with reference answer
+    else:
+        confidence = 0.5  # Lower confidence without reference
+    
+    # Generate feedback
+    feedback = []
+    if score_recommendation is not None:
+        if score_recommendation >= 90:
+            feedback.append("Excellent work! The submission thoroughly addresses the assignment requirements.")
+        elif score_recommendation >= 80:
+            feedback.append("Good work. The submission addresses most of the key points from the assignment.")
+        elif score_recommendation >= 70:
+            feedback.append("Satisfactory work. The submission addresses the basic requirements but could be improved.")
+        else:
+            feedback.append("The submission needs significant improvement to fully address the assignment requirements.")
+    
+    # Add specific feedback about keyword coverage
+    if keyword_coverage >= 0.8:
+        feedback.append("Excellent coverage of important concepts from the assignment.")
+    elif keyword_coverage >= 0.6:
+        feedback.append("Good coverage of concepts, but some important ideas may be missing or underdeveloped.")
+    else:
+        feedback.append("Several important concepts from the assignment instructions are not adequately addressed.")
+    
+    # Return final analysis results
+    return {
+        'score_recommendation': score_recommendation,
+        'confidence': confidence,
+        'feedback': " ".join(feedback),
+        'key_points': key_points,
+        'improvement_areas': improvement_areas,
+        'metrics': {
+            'word_count': word_count,
+            'keyword_coverage': keyword_coverage,
+            'similarity_to_reference': similarity_to_reference
+        }
+    }
+
+def analyze_submission(submission_text, assignment_instructions, rubric=None, reference_answer=None, course_id=None):
     """
     Analyze a student submission against assignment instructions and optionally a rubric or reference answer.
     
@@ -95,140 +185,266 @@ def analyze_submission(submission_text, assignment_instructions, rubric=None, re
         assignment_instructions (str): The instructions for the assignment
         rubric (str, optional): Rubric text with grading criteria
         reference_answer (str, optional): A reference or model answer
+        course_id (int, optional): Course whose TF-IDF model weighs the reference similarity
         
     Returns:
         dict: Analysis results including score recommendation and feedback
     """
     if not submission_text or not assignment_instructions:
-        return {
-            'score_recommendation': None,
-            'confidence': 0.0,
-            'feedback': "Cannot analyze empty submission or missing assignment instructions.",
-            'key_points': [],
-            'improvement_areas': []
-        }
+        return _empty_analysis("Cannot analyze empty submission or missing assignment instructions.")
+    
+    # Import here to avoid circular imports (the cache lives in the app database)
+    from analysis_cache import analysis_key, get_cached_analysis, store_analysis
     
+    # The reference similarity depends on the course model, so results are cached per fit
+    course_model = get_course_model(course_id) if reference_answer else None
+    key = analysis_key(submission_text, assignment_instructions, rubric, reference_answer, ANALYZER_VERSION,
+                       course_model.fingerprint if course_model else None)
+    analysis = get_cached_analysis(key)
+    if analysis is None:
+        analysis = _analyze_submission(submission_text, assignment_instructions, reference_answer, course_id)
+        # Failed analyses are not cached so they are retried
+        if analysis['score_recommendation'] is not None:
+            store_analysis(key, ANALYZER_VERSION, analysis)
+    return analysis
+
+def _analyze_submission(submission_text, assignment_instructions, reference_answer=None, course_id=None):
+    """Compute the analysis of a single submission (uncached)."""
     try:
-        # Analyze submission
-        analysis_results = {}
-        
         # Calculate basic metrics
         word_count = len(submission_text.split())
-        analysis_results['word_count'] = word_count
         
         # Check keyword coverage
         # Extract key terms from instructions
-        instruction_words = preprocess_text(assignment_instructions).split()
-        # Get frequency of most common words in instructions
-        instruction_keywords = [word for word, count in Counter(instruction_words).most_common(10)]
+        instruction_keywords = extract_instruction_keywords(assignment_instructions)
         
-        # Process submission
-        processed_submission = preprocess_text(submission_text)
-        submission_words = set(processed_submission.split())
+        # Process submission one sentence at a time; the sentences are reused for key points
+        sentences = re.split(r'[.!?]', submission_text)
+        processed_sentences = preprocess_many(sentences)
+        submission_words = set(' '.join(processed_sentences).split())
         
         # Calculate keyword coverage
         keywords_found = [keyword for keyword in instruction_keywords if keyword in submission_words]
         keyword_coverage = len(keywords_found) / len(instruction_keywords) if instruction_keywords else 0
-        analysis_results['keyword_coverage'] = keyword_coverage
         
         # Calculate similarity to reference answer if provided
         if reference_answer:
-            similarity_to_reference = calculate_similarity(submission_text, reference_answer)
-            analysis_results['similarity_to_reference'] = similarity_to_reference
+            similarity_to_reference = calculate_similarity(submission_text, reference_answer, course_id)
         else:
             similarity_to_reference = None
         
         # Extract key points from submission
         key_points = []
-        sentences = re.split(r'[.!?]', submission_text)
-        for sentence in sentences:
+        for sentence, processed_sentence in zip(sentences, processed_sentences):
             if len(sentence.strip()) > 10:  # Skip very short sentences
                 # Simple heuristic: sentences with keywords are likely key points
-                if any(keyword in preprocess_text(sentence) for keyword in instruction_keywords):
+                if any(keyword in processed_sentence for keyword in instruction_keywords):
                     key_points.append(sentence.strip())
         
         # Limit to top 3 key points
         key_points = key_points[:3]
-        analysis_results['key_points'] = key_points
         
-        # Identify improvement areas
-        improvement_areas = []
+        return _compose_analysis(word_count, keyword_coverage, similarity_to_reference, key_points)
         
-        # Check for wordiness
-        if word_count < 50:
-            improvement_areas.append("The submission is quite brief. Consider providing more detailed explanations.")
-        elif word_count > 1000:
-            improvement_areas.append("The submission is lengthy. Consider being more concise while maintaining key points.")
+    except Exception as e:
+        logger.error(f"Error analyzing submission: {e}")
+        return _empty_analysis(f"An error occurred during analysis: {str(e)}")
+
+def analyze_submissions_batch(submission_texts, assignment_instructions, rubric=None, reference_answer=None,
+                              course_id=None, raise_errors=False):
+    """
+    Analyze every submission of an assignment in one vectorized pass.
+    
+    The instructions and reference answer are preprocessed once, each submission
+    sentence is preprocessed once, and all submissions are vectorized into a
+    single sparse matrix so keyword coverage and reference similarity are
+    computed as matrix operations.
+    
+    Args:
+        submission_texts (list): Submission texts, in the order results are wanted
+        assignment_instructions (str): The instructions for the assignment
+        rubric (str, optional): Rubric text with grading criteria
+        reference_answer (str, optional): A reference or model answer
+        course_id (int, optional): Course whose TF-IDF model weighs the reference similarity
+        raise_errors (bool): Re-raise analysis errors instead of returning error
+            analyses, so queued jobs can be retried
         
-        # Check keyword coverage
-        if keyword_coverage < 0.5:
-            improvement_areas.append("The submission may not adequately address all required topics from the instructions.")
+    Returns:
+        list: One analysis dict per submission, same shape as analyze_submission
+    """
+    if not assignment_instructions:
+        return [_empty_analysis("Cannot analyze empty submission or missing assignment instructions.")
+                for _ in submission_texts]
+    
+    try:
+        instruction_keywords = extract_instruction_keywords(assignment_instructions)
         
-        # Generate score recommendation
-        score_factors = [
-            keyword_coverage * 0.7,  # Weight keyword coverage highly
+        # Preprocess every sentence exactly once; the submission is the join of its sentences
+        split_texts = [
+            [sentence.strip() for sentence in re.split(r'[.!?]', text)] if text else []
+            for text in submission_texts
         ]
-        
-        if similarity_to_reference is not None:
-            score_factors.append(similarity_to_reference * 0.8)  # Weight similarity to reference answer if available
-        
-        # Basic score calculation
-        if score_factors:
-            avg_score = sum(score_factors) / len(score_factors)
-            # Scale to 0-100
-            score_recommendation = min(100, max(0, avg_score * 100))
-        else:
-            score_recommendation = None
-        
-        # Calculate confidence
-        if similarity_to_reference is not None:
-            confidence = 0.7  # Higher confidence with reference answer
-        else:
-            confidence = 0.5  # Lower confidence without reference
-        
-        # Generate feedback
-        feedback = []
-        if score_recommendation is not None:
-            if score_recommendation >= 90:
-                feedback.append("Excellent work! The submission thoroughly addresses the assignment requirements.")
-            elif score_recommendation >= 80:
-                feedback.append("Good work. The submission addresses most of the key points from the assignment.")
-            elif score_recommendation >= 70:
-                feedback.append("Satisfactory work. The submission addresses the basic requirements but could be improved.")
-            else:
-                feedback.append("The submission needs significant improvement to fully address the assignment requirements.")
-        
-        # Add specific feedback about keyword coverage
-        if keyword_coverage >= 0.8:
-            feedback.append("Excellent coverage of important concepts from the assignment.")
-        elif keyword_coverage >= 0.6:
-            feedback.append("Good coverage of concepts, but some important ideas may be missing or underdeveloped.")
-        else:
-            feedback.append("Several important concepts from the assignment instructions are not adequately addressed.")
-        
-        # Return final analysis results
-        return {
-            'score_recommendation': score_recommendation,
-            'confidence': confidence,
-            'feedback': " ".join(feedback),
-            'key_points': key_points,
-            'improvement_areas': improvement_areas,
-            'metrics': {
-                'word_count': word_count,
-                'keyword_coverage': keyword_coverage,
-                'similarity_to_reference': similarity_to_reference
-            }
-        }
+        processed_sentences = iter(preprocess_many(
+            sentence for sentences in split_texts for sentence in sentences if sentence
+        ))
+        documents = []
+        sentence_terms = []
+        for sentences in split_texts:
+            processed = [(sentence, next(processed_sentences)) for sentence in sentences if sentence]
+            documents.append(' '.join(terms for _, terms in processed if terms))
+            sentence_terms.append(processed)
+        
+        analyzed = [i for i, text in enumerate(submission_texts) if text]
+        keyword_coverage = np.zeros(len(submission_texts))
+        similarity = None
+        
+        if analyzed:
+            # One sparse document-term matrix for the whole assignment
+            corpus = [documents[i] for i in analyzed]
+            processed_reference = preprocess_text(reference_answer) if reference_answer else ''
+            if processed_reference:
+                corpus.append(processed_reference)
+            vectorizer = TfidfVectorizer(token_pattern=r'\S+')
+            try:
+                tfidf_matrix = vectorizer.fit_transform(corpus)
+            except ValueError:
+                # Empty vocabulary: nothing left after preprocessing
+                tfidf_matrix = None
+            
+            if tfidf_matrix is not None:
+                submission_matrix = tfidf_matrix[:len(analyzed)]
+                vocabulary = vectorizer.vocabulary_
+                keyword_columns = [vocabulary[k] for k in instruction_keywords if k in vocabulary]
+                if instruction_keywords and keyword_columns:
+                    found = (submission_matrix[:, keyword_columns] > 0).sum(axis=1)
+                    keyword_coverage[analyzed] = np.asarray(found).ravel() / len(instruction_keywords)
+                if processed_reference:
+                    # Weigh terms by the course corpus when its model is fitted, else by this batch
+                    course_model = get_course_model(course_id)
+                    weighted = tfidf_matrix
+                    if course_model is not None:
+                        try:
+                            weighted = course_model.transform(corpus)
+                        except Exception as e:
+                            logger.error(f"Error using text model of course {course_id}: {e}")
+                    # Rows are L2-normalized, so the dot product is the cosine similarity
+                    reference_vector = weighted[len(analyzed):]
+                    similarity = np.zeros(len(submission_texts))
+                    similarity[analyzed] = np.asarray(
+                        (weighted[:len(analyzed)] @ reference_vector.T).todense()
+                    ).ravel()
+            elif reference_answer:
+                similarity = np.zeros(len(submission_texts))
+        
+        results = []
+        for i, text in enumerate(submission_texts):
+            if not text:
+                results.append(_empty_analysis("Cannot analyze empty submission or missing assignment instructions."))
+                continue
+            key_points = [
+                sentence for sentence, terms in sentence_terms[i]
+                if len(sentence) > 10 and any(keyword in terms for keyword in instruction_keywords)
+            ][:3]
+            results.append(_compose_analysis(
+                len(text.split()),
+                float(keyword_coverage[i]),
+                float(similarity[i]) if similarity is not None else None,
+                key_points
+            ))
+        return results
         
     except Exception as e:
-        logger.error(f"Error analyzing submission: {e}")
+        logger.error(f"Error analyzing submissions in batch: {e}")
+        if raise_errors:
+            raise
+        return [_empty_analysis(f"An error occurred during analysis: {str(e)}") for _ in submission_texts]
+
+# Number of most recent grades the trend is fitted on
+TREND_WINDOW = 3
+
+def predict_cohort_performance(grade_matrix):
+    """
+    Predict the performance of a whole cohort in one vectorized pass.
+    
+    Args:
+        grade_matrix: 2-D array, one row per student and one column per assignment
+            in chronological order, holding grade percentages (NaN where missing)
+        
+    Returns:
+        dict of 1-D arrays, one entry per student: 'prediction', 'confidence',
+        'trend' and 'current_average' (NaN where a student has fewer than two
+        grades), plus 'grade_count'
+    """
+    grades = np.asarray(grade_matrix, dtype=np.float64)
+    if grades.ndim != 2:
+        raise ValueError("grade_matrix must be 2-D (students x assignments)")
+    valid = ~np.isnan(grades)
+    counts = valid.sum(axis=1)
+    
+    # Move each student's grades to the front (in order) and take the last TREND_WINDOW of them
+    order = np.argsort(~valid, axis=1, kind='stable')
+    packed = np.take_along_axis(grades, order, axis=1)
+    columns = counts[:, None] - TREND_WINDOW + np.arange(TREND_WINDOW)
+    in_window = columns >= 0
+    if grades.shape[1]:
+        window = np.take_along_axis(packed, np.clip(columns, 0, None), axis=1)
+    else:
+        window = np.full((len(grades), TREND_WINDOW), np.nan)
+    
+    # Closed-form least-squares slope over the window (same as np.polyfit(x, y, 1)[0])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        n = in_window.sum(axis=1)
+        x = np.where(in_window, np.arange(TREND_WINDOW), 0.0)
+        y = np.where(in_window, window, 0.0)
+        x_mean = x.sum(axis=1) / n
+        y_mean = y.sum(axis=1) / n
+        dx = np.where(in_window, x - x_mean[:, None], 0.0)
+        trend = (dx * (y - y_mean[:, None])).sum(axis=1) / (dx * dx).sum(axis=1)
+        current_average = np.where(valid, grades, 0.0).sum(axis=1) / counts
+    
+    # Project the trend two assignments forward, with a ceiling of 100 and a floor of 0
+    projected = current_average + trend * 2
+    prediction = np.where(trend > 0, np.minimum(100, projected),
+                          np.where(trend < 0, np.maximum(0, projected), current_average))
+    confidence = np.where(trend == 0, 0.6, np.minimum(0.8, 0.5 + np.abs(trend) / 10))
+    
+    # Fewer than two grades: no prediction
+    insufficient = counts < 2
+    for values in (prediction, confidence, trend, current_average):
+        values[insufficient] = np.nan
+    
+    return {
+        'prediction': prediction,
+        'confidence': confidence,
+        'trend': trend,
+        'current_average': current_average,
+        'grade_count': counts
+    }
+
+def prediction_result(cohort, index):
+    """Build the predict_student_performance result for row `index` of a cohort prediction."""
+    if cohort['grade_count'][index] < 2:
         return {
-            'score_recommendation': None,
+            'prediction': None,
             'confidence': 0.0,
-            'feedback': f"An error occurred during analysis: {str(e)}",
-            'key_points': [],
-            'improvement_areas': []
+            'explanation': "Insufficient data for prediction"
         }
+    
+    trend = float(cohort['trend'][index])
+    if trend > 0:
+        explanation = "Based on your improving grades trend, you're likely to continue improving."
+    elif trend < 0:
+        explanation = "Based on your recent grades trend, you may need additional support to improve performance."
+    else:
+        explanation = "Based on your consistent grades, your performance is likely to remain stable."
+    
+    return {
+        'prediction': float(cohort['prediction'][index]),
+        'confidence': float(cohort['confidence'][index]),
+        'explanation': explanation,
+        'trend': trend,
+        'current_average': float(cohort['current_average'][index])
+    }
 
 def predict_student_performance(student_id, course_id, grades_data):
     """
@@ -237,72 +453,26 @@ def predict_student_performance(student_id, course_id, grades_data):
     Args:
         student_id: ID of the student
         course_id: ID of the course
-        grades_data: DataFrame or list of past grades and related information
+        grades_data: DataFrame or list of past grades (or a dict with a 'grades' list);
+            each grade has a 'percentage' (or 'score') and a 'timestamp' to order by
         
     Returns:
         dict: Prediction results
     """
     try:
-        # Convert to DataFrame if it's a list
-        if isinstance(grades_data, list):
-            if not grades_data:
-                return {
-                    'prediction': None,
-                    'confidence': 0.0,
-                    'explanation': "Insufficient data for prediction"
-                }
-            
-            grades_df = pd.DataFrame(grades_data)
-        else:
-            grades_df = grades_data
-        
-        # Check if we have enough data
-        if len(grades_df) < 2:
-            return {
-                'prediction': None,
-                'confidence': 0.0,
-                'explanation': "Insufficient data for prediction"
-            }
-        
-        # Analyze trend
-        grades_df = grades_df.sort_values('timestamp')
-        recent_grades = grades_df['score'].values[-3:]  # Get last 3 grades
-        
-        if len(recent_grades) >= 2:
-            # Calculate trend direction
-            trend = np.polyfit(range(len(recent_grades)), recent_grades, 1)[0]
-            
-            # Current average
-            current_avg = grades_df['score'].mean()
-            
-            # Predict future performance
-            if trend > 0:
-                prediction = min(100, current_avg + (trend * 2))  # Project forward with ceiling of 100
-                explanation = "Based on your improving grades trend, you're likely to continue improving."
-                confidence = min(0.8, 0.5 + (abs(trend) / 10))  # Higher confidence with stronger trend
-            elif trend < 0:
-                prediction = max(0, current_avg + (trend * 2))  # Project forward with floor of 0
-                explanation = "Based on your recent grades trend, you may need additional support to improve performance."
-                confidence = min(0.8, 0.5 + (abs(trend) / 10))
-            else:
-                prediction = current_avg
-                explanation = "Based on your consistent grades, your performance is likely to remain stable."
-                confidence = 0.6
-            
-            return {
-                'prediction': prediction,
-                'confidence': confidence,
-                'explanation': explanation,
-                'trend': trend,
-                'current_average': current_avg
-            }
-        else:
-            # Not enough grades for trend analysis
-            return {
-                'prediction': grades_df['score'].mean(),
-                'confidence': 0.4,
-                'explanation': "Limited grade history available. Prediction is based on current average."
-            }
+        if isinstance(grades_data, dict):
+            grades_data = grades_data.get('grades') or []
+        if isinstance(grades_data, pd.DataFrame):
+            grades_data = grades_data.to_dict('records')
+        
+        # Chronological order, when every grade has a timestamp
+        if all(grade.get('timestamp') is not None for grade in grades_data):
+            grades_data = sorted(grades_data, key=lambda grade: grade['timestamp'])
+        values = [grade['percentage'] if grade.get('percentage') is not None else grade['score']
+                  for grade in grades_data]
+        
+        cohort = predict_cohort_performance(np.array([values], dtype=np.float64).reshape(1, len(values)))
+        return prediction_result(cohort, 0)
             
     except Exception as e:
         logger.error(f"Error predicting student performance: {e}")
@@ -410,6 +580,104 @@ def generate_assignment_recommendations(student_id, course_id, student_data, cou
             'reason': f"An error occurred: {str(e)}"
         }]
 
+# Start hours that earn the preferred-time bonus
+PREFERRED_HOURS = {
+    'morning': range(5, 13),
+    'afternoon': range(13, 18),
+    'evening': range(18, 23),
+}
+
+def _as_datetime(value):
+    """Accept datetimes or ISO-8601 strings (as sent by the JSON API)."""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+class _FreeSlotIndex:
+    """
+    Free time slots, sorted by start, with a segment tree of slot lengths.
+    
+    Slots never overlap, and an allocation only moves a slot's start forward,
+    so the start order is fixed and a slot keeps its position. Each tree node
+    keeps the longest free length below it, separately for slots whose start
+    is in the preferred hours and for the others, so "earliest slot in a start
+    range that fits this event" and updating a slot are both O(log n).
+    """
+    
+    def __init__(self, slots, preferred_hours):
+        self.starts = [slot[0] for slot in slots]
+        self.ends = [slot[1] for slot in slots]
+        self.preferred_hours = preferred_hours
+        self.size = 1
+        while self.size < max(1, len(slots)):
+            self.size *= 2
+        # Tree per class: [preferred, other]; -1 marks an empty or used slot
+        self.trees = [[-1.0] * (2 * self.size), [-1.0] * (2 * self.size)]
+        for i in range(len(slots)):
+            self._set_leaf(i)
+        for tree in self.trees:
+            for node in range(self.size - 1, 0, -1):
+                tree[node] = max(tree[2 * node], tree[2 * node + 1])
+    
+    def _set_leaf(self, i, length=None):
+        if length is None:
+            length = (self.ends[i] - self.starts[i]).total_seconds() / 60
+        preferred = self.starts[i].hour in self.preferred_hours
+        self.trees[0][self.size + i] = length if preferred else -1.0
+        self.trees[1][self.size + i] = -1.0 if preferred else length
+    
+    def _update(self, i, length=None):
+        self._set_leaf(i, length)
+        for tree in self.trees:
+            node = (self.size + i) // 2
+            while node:
+                tree[node] = max(tree[2 * node], tree[2 * node + 1])
+                node //= 2
+    
+    def first_fit(self, lo, hi, minutes, preferred):
+        """Index of the earliest slot in positions [lo, hi) of the given class with room for `minutes`, or -1."""
+        tree = self.trees[0 if preferred else 1]
+        if lo >= hi or tree[1] < minutes:
+            return -1
+        stack = [(1, 0, self.size)]
+        while stack:
+            node, node_lo, node_hi = stack.pop()
+            if node_hi <= lo or hi <= node_lo or tree[node] < minutes:
+                continue
+            if node >= self.size:
+                return node - self.size
+            mid = (node_lo + node_hi) // 2
+            # Right child first so the left one is popped (and searched) first
+            stack.append((2 * node + 1, mid, node_hi))
+            stack.append((2 * node, node_lo, mid))
+        return -1
+    
+    def allocate(self, i, minutes, min_break):
+        """Place an event at the start of slot i; returns its (start, end)."""
+        start = self.starts[i]
+        end = start + timedelta(minutes=minutes)
+        if end + timedelta(minutes=min_break) < self.ends[i]:
+            # Time left after the event and a break stays free
+            self.starts[i] = end + timedelta(minutes=min_break)
+            self._update(i)
+        else:
+            self._update(i, -1.0)
+        return start, end
+
+def _deadline_score_ranges(deadline, priority):
+    """(score, earliest start exclusive, latest start inclusive) ranges of slot starts before a deadline."""
+    if not deadline:
+        return [(0, None, None)]
+    if priority <= 3:
+        # High priority tasks score when placed within a day or so of the deadline
+        near = deadline - timedelta(days=2)
+        return [(10, near, deadline), (0, None, near)]
+    # Lower priority tasks earlier if possible: min(5, whole days before the deadline)
+    ranges = [(5, None, deadline - timedelta(days=5))]
+    for days in range(4, -1, -1):
+        ranges.append((days, deadline - timedelta(days=days + 1), deadline - timedelta(days=days)))
+    return ranges
+
 def optimize_schedule(events, constraints, preferences):
     """
     Optimize a schedule based on events, constraints, and preferences.
@@ -424,17 +692,19 @@ def optimize_schedule(events, constraints, preferences):
     """
     try:
         optimized_schedule = []
+        now = datetime.now()
         
         # Sort events by priority and deadline
-        sorted_events = sorted(events, key=lambda x: (x.get('priority', 5), x.get('deadline', datetime.max)))
+        sorted_events = sorted(events, key=lambda x: (x.get('priority', 5), _as_datetime(x.get('deadline')) or datetime.max))
         
         # Extract available time slots from constraints
-        available_slots = constraints.get('available_slots', [])
+        available_slots = [(_as_datetime(slot['start']), _as_datetime(slot['end']))
+                           for slot in constraints.get('available_slots', [])]
         
         # If no available slots provided, create some reasonable defaults
         if not available_slots:
             # Create default availability (9 AM to 5 PM for the next 7 days)
-            start_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
             for day in range(7):
                 day_date = start_date + timedelta(days=day)
                 # Skip weekends if specified in constraints
@@ -442,96 +712,244 @@ def optimize_schedule(events, constraints, preferences):
                     continue
                     
                 # Add morning and afternoon slots
-                available_slots.append({
-                    'start': day_date.replace(hour=9, minute=0),
-                    'end': day_date.replace(hour=12, minute=0)
-                })
-                available_slots.append({
-                    'start': day_date.replace(hour=13, minute=0),
-                    'end': day_date.replace(hour=17, minute=0)
-                })
+                available_slots.append((day_date.replace(hour=9, minute=0), day_date.replace(hour=12, minute=0)))
+                available_slots.append((day_date.replace(hour=13, minute=0), day_date.replace(hour=17, minute=0)))
         
         # Get preferences
         min_break = preferences.get('min_break_minutes', 15)
         preferred_time = preferences.get('preferred_time', 'morning')
         
-        # Sort available slots
-        available_slots = sorted(available_slots, key=lambda x: x['start'])
+        # Sort available slots, skipping those in the past and merging overlaps
+        slots = []
+        for start, end in sorted(available_slots):
+            if end < now:
+                continue
+            if slots and start < slots[-1][1]:
+                slots[-1] = (slots[-1][0], max(slots[-1][1], end))
+            else:
+                slots.append((start, end))
+        free_slots = _FreeSlotIndex(slots, PREFERRED_HOURS.get(preferred_time, ()))
+        starts = free_slots.starts
         
-        # First pass: assign high priority events to preferred times
         for event in sorted_events:
             duration_minutes = event.get('duration_minutes', 60)
-            deadline = event.get('deadline')
+            deadline = _as_datetime(event.get('deadline'))
             priority = event.get('priority', 5)
             
-            # Find suitable slot
-            best_slot = None
-            best_slot_score = -1
+            # Only slots starting by the deadline
+            last = bisect_right(starts, deadline) if deadline else len(starts)
             
-            for slot in available_slots:
-                # Skip slots that are in the past
-                if slot['end'] < datetime.now():
-                    continue
-                    
-                # Skip slots that are after the deadline
-                if deadline and slot['start'] > deadline:
-                    continue
-                
-                # Calculate available duration in this slot
-                slot_duration = (slot['end'] - slot['start']).total_seconds() / 60
-                
-                # Skip if slot is too short
-                if slot_duration < duration_minutes:
-                    continue
-                
-                # Calculate score for this slot
-                score = 0
-                
-                # Prefer slots further from the deadline for higher priority tasks
-                if deadline:
-                    days_until_deadline = (deadline - slot['start']).days
-                    if priority <= 3:  # High priority
-                        score += 10 if days_until_deadline <= 1 else 0  # High priority tasks close to deadline
-                    else:
-                        score += min(5, days_until_deadline)  # Lower priority tasks earlier if possible
-                
-                # Prefer morning/afternoon according to preference
-                if preferred_time == 'morning' and 5 <= slot['start'].hour <= 12:
-                    score += 5
-                elif preferred_time == 'afternoon' and 12 < slot['start'].hour <= 17:
-                    score += 5
-                elif preferred_time == 'evening' and 17 < slot['start'].hour <= 22:
-                    score += 5
-                
-                # If this is the best slot so far, save it
-                if score > best_slot_score:
-                    best_slot_score = score
-                    best_slot = slot
+            # Best score first (deadline score plus 5 for a preferred start hour); the earliest slot wins ties
+            candidates = []
+            for score, after, until in _deadline_score_ranges(deadline, priority):
+                lo = bisect_right(starts, after) if after else 0
+                hi = min(last, bisect_right(starts, until)) if until else last
+                for preferred in (True, False):
+                    index = free_slots.first_fit(lo, hi, duration_minutes, preferred)
+                    if index != -1:
+                        candidates.append((-(score + 5 * preferred), index))
             
             # If a suitable slot was found, schedule the event
-            if best_slot:
-                event_end_time = best_slot['start'] + timedelta(minutes=duration_minutes)
-                
-                # Create scheduled event
-                scheduled_event = {
+            if candidates:
+                _, index = min(candidates)
+                start_time, end_time = free_slots.allocate(index, duration_minutes, min_break)
+                optimized_schedule.append({
                     'id': event.get('id'),
                     'title': event.get('title'),
-                    'start_time': best_slot['start'],
-                    'end_time': event_end_time,
+                    'start_time': start_time,
+                    'end_time': end_time,
                     'duration_minutes': duration_minutes
-                }
-                optimized_schedule.append(scheduled_event)
-                
-                # Update the slot
-                if event_end_time + timedelta(minutes=min_break) < best_slot['end']:
-                    # If there's still time in this slot after the event and a break, update the slot
-                    best_slot['start'] = event_end_time + timedelta(minutes=min_break)
-                else:
-                    # Otherwise, mark the slot as used by removing it
-                    available_slots.remove(best_slot)
+                })
         
         return optimized_schedule
         
     except Exception as e:
         logger.error(f"Error optimizing schedule: {e}")
         return []
+
+def build_conflict_graph(course_index, student_index, course_count):
+    """
+    Build the course conflict graph from enrollments.
+    
+    Args:
+        course_index: array of course positions (0..course_count-1), one per enrollment
+        student_index: array of student positions, aligned with course_index
+        course_count: number of courses
+        
+    Returns:
+        scipy.sparse.csr_matrix: course x course matrix of shared student counts (zero diagonal)
+    """
+    course_index = np.asarray(course_index, dtype=np.int64)
+    student_index = np.asarray(student_index, dtype=np.int64)
+    student_count = int(student_index.max()) + 1 if len(student_index) else 0
+    
+    # Student x course incidence; A.T @ A counts the students each pair of courses shares
+    incidence = sparse.csr_matrix(
+        (np.ones(len(course_index), dtype=np.int32), (student_index, course_index)),
+        shape=(student_count, course_count)
+    )
+    incidence.data[:] = 1  # duplicate enrollments count once
+    conflicts = (incidence.T @ incidence).tocsr()
+    conflicts.setdiag(0)
+    conflicts.eliminate_zeros()
+    return conflicts
+
+class _RoomPool:
+    """Free rooms of one time slot, sorted by capacity."""
+    
+    def __init__(self, capacities):
+        self.free = sorted((capacity, room) for room, capacity in enumerate(capacities))
+    
+    def take(self, size):
+        """Reserve the smallest room that fits, else the largest rooms that together fit; None if impossible."""
+        if not self.free:
+            return None
+        position = bisect_right(self.free, (size, -1))
+        if position < len(self.free):
+            return [self.free.pop(position)[1]]
+        taken = []
+        seats = 0
+        while self.free and seats < size:
+            capacity, room = self.free.pop()
+            taken.append((capacity, room))
+            seats += capacity
+        if seats < size:
+            self.free.extend(taken)
+            self.free.sort()
+            return None
+        return [room for _, room in taken]
+    
+    def release(self, rooms, capacities):
+        for room in rooms:
+            self.free.append((capacities[room], room))
+        self.free.sort()
+
+def color_timetable(conflicts, sizes, slot_count, room_capacities=None, adjacent_slots=None,
+                    local_search_passes=2):
+    """
+    Assign every course an exam slot so no student has two exams at once.
+    
+    Courses are coloured with DSatur (most constrained course first) into the
+    lowest slot that has no conflicting course and enough free room capacity.
+    A local search then moves courses between feasible slots to reduce the
+    number of students with exams in adjacent slots.
+    
+    Args:
+        conflicts: course x course sparse matrix of shared students (see build_conflict_graph)
+        sizes: enrolled students per course
+        slot_count: number of available time slots
+        room_capacities (list, optional): seat count of each room; rooms are unlimited if omitted
+        adjacent_slots (array, optional): adjacent_slots[t] is True when slot t+1 directly follows slot t
+        local_search_passes (int): improvement passes over the courses
+        
+    Returns:
+        dict: 'slots' (slot per course, -1 if it could not be placed), 'rooms'
+        (list of room indices per course), 'unplaced' (course positions) and
+        'adjacent_conflicts' (students with exams in adjacent slots)
+    """
+    conflicts = sparse.csr_matrix(conflicts)
+    course_count = conflicts.shape[0]
+    sizes = np.asarray(sizes)
+    indptr, indices, weights = conflicts.indptr, conflicts.indices, conflicts.data
+    degree = np.diff(indptr)
+    if adjacent_slots is None:
+        adjacent_slots = np.ones(max(0, slot_count - 1), dtype=bool)
+    adjacent_slots = np.asarray(adjacent_slots, dtype=bool)
+    
+    pools = [_RoomPool(room_capacities) for _ in range(slot_count)] if room_capacities else None
+    slots = np.full(course_count, -1, dtype=np.int64)
+    rooms = [[] for _ in range(course_count)]
+    neighbour_slots = [0] * course_count  # bitmask of slots used by coloured neighbours
+    
+    # DSatur: highest saturation, then highest degree, then largest course
+    heap = [(0, -int(degree[course]), -int(sizes[course]), course) for course in range(course_count)]
+    heapq.heapify(heap)
+    saturation = np.zeros(course_count, dtype=np.int64)
+    done = np.zeros(course_count, dtype=bool)
+    unplaced = []
+    
+    while heap:
+        negative_saturation, _, _, course = heapq.heappop(heap)
+        if done[course] or -negative_saturation != saturation[course]:
+            continue  # stale heap entry
+        done[course] = True
+        
+        taken = neighbour_slots[course]
+        for slot in range(slot_count):
+            if taken >> slot & 1:
+                continue
+            if pools is not None:
+                course_rooms = pools[slot].take(int(sizes[course]))
+                if course_rooms is None:
+                    continue
+                rooms[course] = course_rooms
+            slots[course] = slot
+            break
+        
+        if slots[course] == -1:
+            unplaced.append(course)
+            continue
+        
+        bit = 1 << int(slots[course])
+        for neighbour in indices[indptr[course]:indptr[course + 1]]:
+            if done[neighbour] or neighbour_slots[neighbour] & bit:
+                continue
+            neighbour_slots[neighbour] |= bit
+            saturation[neighbour] += 1
+            heapq.heappush(heap, (-int(saturation[neighbour]), -int(degree[neighbour]),
+                                  -int(sizes[neighbour]), int(neighbour)))
+    
+    # Local search: move courses to the feasible slot with the fewest adjacent-slot students
+    if slot_count > 1:
+        for _ in range(local_search_passes):
+            improved = False
+            for course in np.argsort(-degree, kind='stable'):
+                current = slots[course]
+                if current == -1:
+                    continue
+                neighbours = indices[indptr[course]:indptr[course + 1]]
+                neighbour_slot = slots[neighbours]
+                placed = neighbour_slot >= 0
+                # Students shared with courses in each slot
+                shared = np.bincount(neighbour_slot[placed], weights[indptr[course]:indptr[course + 1]][placed],
+                                     minlength=slot_count)
+                penalty = np.zeros(slot_count)
+                penalty[:-1] += shared[1:] * adjacent_slots
+                penalty[1:] += shared[:-1] * adjacent_slots
+                current_penalty = penalty[current]
+                if current_penalty == 0:
+                    continue
+                penalty[shared > 0] = np.inf  # conflicting slots
+                penalty[current] = np.inf
+                
+                for slot in np.argsort(penalty, kind='stable'):
+                    if penalty[slot] >= current_penalty:
+                        break
+                    if pools is not None:
+                        new_rooms = pools[slot].take(int(sizes[course]))
+                        if new_rooms is None:
+                            continue
+                        pools[current].release(rooms[course], room_capacities)
+                        rooms[course] = new_rooms
+                    slots[course] = slot
+                    improved = True
+                    break
+            if not improved:
+                break
+    
+    return {
+        'slots': slots,
+        'rooms': rooms,
+        'unplaced': unplaced,
+        'adjacent_conflicts': int(_adjacent_conflicts(conflicts, slots, adjacent_slots))
+    }
+
+def _adjacent_conflicts(conflicts, slots, adjacent_slots):
+    """Students with exams in two adjacent slots, counted per pair of courses."""
+    coo = sparse.triu(conflicts, k=1).tocoo()
+    first, second = slots[coo.row], slots[coo.col]
+    placed = (first >= 0) & (second >= 0)
+    low = np.minimum(first, second)[placed]
+    adjacent = np.abs(first - second)[placed] == 1
+    adjacent[adjacent] &= adjacent_slots[low[adjacent]]
+    return coo.data[placed][adjacent].sum()
@@ -0,0 +1,132 @@
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from config import Config
+from models import AnalysisCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# In-process tier: key -> JSON-encoded analysis, most recently used last
+_lru = OrderedDict()
+_lock = threading.Lock()
+_stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}
+_max_size = None  # read from the app config on first use inside the app
+
+
+def analysis_key(submission_text, assignment_instructions, rubric, reference_answer, analyzer_version,
+                 model_fingerprint=None):
+    """Return the cache key of an analysis: a SHA-256 of all of its inputs."""
+    inputs = [submission_text, assignment_instructions, rubric, reference_answer, analyzer_version]
+    if model_fingerprint is not None:
+        inputs.append(model_fingerprint)
+    payload = json.dumps(inputs)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _capacity():
+    """Return the in-process tier's size, ANALYSIS_CACHE_SIZE of the app config.
+
+    Outside an app context the default from config.Config applies until the
+    app's value has been read.
+    """
+    global _max_size
+    if _max_size is None:
+        if not has_app_context():
+            return Config.ANALYSIS_CACHE_SIZE
+        _max_size = current_app.config.get('ANALYSIS_CACHE_SIZE', Config.ANALYSIS_CACHE_SIZE)
+    return _max_size
+
+
+def _remember(key, encoded):
+    max_size = _capacity()
+    with _lock:
+        _lru[key] = encoded
+        _lru.move_to_end(key)
+        while len(_lru) > max_size:
+            _lru.popitem(last=False)
+
+
+def get_cached_analysis(key):
+    """Return a copy of the cached analysis for `key`, or None on a miss."""
+    with _lock:
+        encoded = _lru.get(key)
+        if encoded is not None:
+            _lru.move_to_end(key)
+            _stats['memory_hits'] += 1
+            return json.loads(encoded)
+
+    # The database tier is only available inside the application
+    if has_app_context():
+        try:
+            entry = db.session.get(AnalysisCacheEntry, key)
+        except Exception as e:
+            logger.warning(f"Error reading analysis cache: {e}")
+            entry = None
+        if entry is not None:
+            _remember(key, entry.result)
+            with _lock:
+                _stats['db_hits'] += 1
+            return json.loads(entry.result)
+
+    with _lock:
+        _stats['misses'] += 1
+    return None
+
+
+def store_analysis(key, analyzer_version, analysis):
+    """Cache an analysis in both tiers."""
+    encoded = json.dumps(analysis)
+    _remember(key, encoded)
+
+    if not has_app_context():
+        return
+    # Written on its own connection so the caller's transaction is left alone
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(insert(AnalysisCacheEntry).values(
+                key=key,
+                analyzer_version=analyzer_version,
+                result=encoded,
+                created_at=datetime.utcnow()
+            ))
+    except IntegrityError:
+        # Another process stored the same analysis first
+        pass
+    except Exception as e:
+        logger.warning(f"Error writing analysis cache: {e}")
+
+
+def purge_stale_entries(analyzer_version):
+    """Delete cached analyses made by other analyzer versions; returns the count."""
+    deleted = AnalysisCacheEntry.query.filter(
+        AnalysisCacheEntry.analyzer_version != analyzer_version
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def cache_stats():
+    """Return the hit/miss counters of this process."""
+    with _lock:
+        stats = dict(_stats)
+        stats['memory_size'] = len(_lru)
+    lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+    stats['hit_rate'] = (stats['memory_hits'] + stats['db_hits']) / lookups if lookups else 0.0
+    return stats
+
+
+def clear_memory_cache():
+    """Empty the in-process tier and reset the counters."""
+    with _lock:
+        _lru.clear()
+        for name in _stats:
+            _stats[name] = 0
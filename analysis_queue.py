@@ -0,0 +1,232 @@
+import json
+import time
+import logging
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from sqlalchemy import event, inspect, and_, or_
+
+from app import db
+from models import AnalysisJob, AnalysisJobStatus, Submission
+from ai_services import analyze_submissions_batch
+
+logger = logging.getLogger(__name__)
+
+# Failed jobs are retried until they reach this many attempts
+MAX_ATTEMPTS = 3
+
+# Running jobs not finished within this lease are assumed lost with their worker
+CLAIM_LEASE = timedelta(minutes=15)
+
+
+def enqueue_submission_analysis(submission):
+    """Queue (or re-queue) the AI analysis of a submission.
+
+    The job is added to the current session; it is committed together with
+    the submission by the caller.
+    """
+    job = submission.analysis_job
+    if job is None:
+        job = AnalysisJob(submission=submission)
+        db.session.add(job)
+    job.status = AnalysisJobStatus.PENDING
+    job.attempts = 0
+    job.result = None
+    job.error = None
+    job.requested_at = datetime.utcnow()
+    job.started_at = None
+    job.claimed_at = None
+    job.finished_at = None
+    return job
+
+
+def get_submission_analysis(submission_id):
+    """Return (status, analysis) of a submission's stored AI analysis.
+
+    status is one of the AnalysisJobStatus values, or None when the
+    submission was never queued; analysis is only set once the job is done.
+    """
+    job = AnalysisJob.query.filter_by(submission_id=submission_id).first()
+    if job is None:
+        return None, None
+    if job.status == AnalysisJobStatus.DONE and job.result:
+        return job.status.value, json.loads(job.result)
+    return job.status.value, None
+
+
+def get_or_enqueue_analysis(submission):
+    """Return (status, analysis) for a grading page, queueing the analysis if missing."""
+    if not submission.content:
+        return None, None
+    status, analysis = get_submission_analysis(submission.id)
+    if status is None:
+        # Submissions made before the queue existed are analyzed on first view
+        enqueue_submission_analysis(submission)
+        try:
+            db.session.commit()
+            status = AnalysisJobStatus.PENDING.value
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error queueing analysis for submission {submission.id}: {e}")
+    return status, analysis
+
+
+def apply_analysis_to_grade(grade, analysis, max_score):
+    """Copy an analysis result into the AI fields of a grade."""
+    if grade is None or not analysis or analysis.get('score_recommendation') is None:
+        return False
+    grade.ai_score = analysis['score_recommendation'] * (max_score or 100) / 100
+    grade.ai_feedback = analysis['feedback']
+    grade.ai_confidence = analysis['confidence']
+    return True
+
+
+def store_analysis_result(submission, analysis, job=None):
+    """Persist a finished analysis on the submission's job and grade."""
+    if job is None:
+        job = submission.analysis_job or AnalysisJob(submission=submission)
+        db.session.add(job)
+    job.status = AnalysisJobStatus.DONE
+    job.result = json.dumps(analysis)
+    job.error = None
+    job.finished_at = datetime.utcnow()
+    return apply_analysis_to_grade(submission.grade, analysis, submission.assignment.max_score)
+
+
+def claim_jobs(limit=50):
+    """Mark up to `limit` pending jobs as running and return (id, requested_at) pairs.
+
+    Running jobs whose lease expired are claimed again, or failed once they
+    used up their attempts.
+    """
+    now = datetime.utcnow()
+    jobs = AnalysisJob.query.filter(or_(
+        AnalysisJob.status == AnalysisJobStatus.PENDING,
+        and_(AnalysisJob.status == AnalysisJobStatus.RUNNING,
+             or_(AnalysisJob.claimed_at.is_(None), AnalysisJob.claimed_at < now - CLAIM_LEASE))
+    )).order_by(AnalysisJob.requested_at).limit(limit).with_for_update(skip_locked=True).all()
+
+    claimed = []
+    for job in jobs:
+        if job.status == AnalysisJobStatus.RUNNING and (job.attempts or 0) >= MAX_ATTEMPTS:
+            logger.error(f"Analysis job {job.id} timed out after {job.attempts} attempts")
+            job.status = AnalysisJobStatus.FAILED
+            job.error = 'Timed out'
+            job.finished_at = now
+            continue
+        job.status = AnalysisJobStatus.RUNNING
+        job.attempts = (job.attempts or 0) + 1
+        job.started_at = now
+        job.claimed_at = now
+        claimed.append(job)
+    db.session.commit()
+    return [(job.id, job.requested_at) for job in claimed]
+
+
+def _unchanged_job(job_id, requested_at):
+    """Query matching the job only while it still holds the request we claimed."""
+    return AnalysisJob.query.filter(AnalysisJob.id == job_id, AnalysisJob.requested_at == requested_at)
+
+
+def process_pending_jobs(limit=50):
+    """Analyze a batch of queued submissions, grouped per assignment.
+
+    Results are written with conditional updates, so a submission resubmitted
+    while it was being analyzed keeps its new request queued.
+
+    Returns the number of jobs that finished successfully.
+    """
+    claimed = dict(claim_jobs(limit))
+    if not claimed:
+        return 0
+
+    jobs = AnalysisJob.query.filter(AnalysisJob.id.in_(claimed)).all()
+    submissions = {
+        submission.id: submission for submission in Submission.query.options(
+            db.joinedload(Submission.assignment), db.joinedload(Submission.grade)
+        ).filter(Submission.id.in_([job.submission_id for job in jobs]))
+    }
+
+    # Jobs of deleted submissions can never run
+    for job in jobs:
+        if job.submission_id not in submissions:
+            logger.error(f"Analysis job {job.id}: submission {job.submission_id} no longer exists")
+            _unchanged_job(job.id, claimed[job.id]).update({
+                'status': AnalysisJobStatus.FAILED,
+                'error': 'Submission no longer exists',
+                'finished_at': datetime.utcnow()
+            }, synchronize_session=False)
+    jobs = [job for job in jobs if job.submission_id in submissions]
+
+    completed = 0
+    jobs.sort(key=lambda job: submissions[job.submission_id].assignment_id)
+    for assignment_id, assignment_jobs in groupby(jobs, key=lambda job: submissions[job.submission_id].assignment_id):
+        assignment_jobs = list(assignment_jobs)
+        assignment = submissions[assignment_jobs[0].submission_id].assignment
+        try:
+            analyses = analyze_submissions_batch(
+                [submissions[job.submission_id].content for job in assignment_jobs],
+                assignment.description,
+                course_id=assignment.course_id,
+                raise_errors=True
+            )
+        except Exception as e:
+            logger.error(f"Error analyzing submissions of assignment {assignment_id}: {e}")
+            for job in assignment_jobs:
+                _unchanged_job(job.id, claimed[job.id]).update({
+                    'error': str(e),
+                    'status': (AnalysisJobStatus.FAILED if job.attempts >= MAX_ATTEMPTS
+                               else AnalysisJobStatus.PENDING)
+                }, synchronize_session=False)
+            continue
+
+        for job, analysis in zip(assignment_jobs, analyses):
+            stored = _unchanged_job(job.id, claimed[job.id]).update({
+                'status': AnalysisJobStatus.DONE,
+                'result': json.dumps(analysis),
+                'error': None,
+                'finished_at': datetime.utcnow()
+            }, synchronize_session=False)
+            # The submission was resubmitted while we worked; leave the new request queued
+            if not stored:
+                continue
+            submission = submissions[job.submission_id]
+            apply_analysis_to_grade(submission.grade, analysis, submission.assignment.max_score)
+            completed += 1
+
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error saving analysis results: {e}")
+        return 0
+    return completed
+
+
+@event.listens_for(db.session, 'before_flush')
+def _enqueue_changed_submissions(session, flush_context, instances):
+    """Queue the AI analysis of submissions created or edited in this flush."""
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty):
+            if not isinstance(obj, Submission) or not obj.content:
+                continue
+            if obj in session.new or inspect(obj).attrs.content.history.has_changes():
+                enqueue_submission_analysis(obj)
+
+
+def run_worker(batch_size=50, poll_interval=2.0, once=False):
+    """Process the analysis queue until interrupted (or once, if requested)."""
+    logger.info("Analysis worker started")
+    while True:
+        try:
+            processed = process_pending_jobs(batch_size)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Analysis worker error: {e}")
+            processed = 0
+        if processed:
+            logger.info(f"Analyzed {processed} submissions")
+        if once:
+            return processed
+        if processed < batch_size:
+            time.sleep(poll_interval)
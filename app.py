@@ -45,10 +45,19 @@ login_manager.login_message_category = 'info'
 # Create database tables
 with app.app_context():
     # Import models here to avoid circular imports
-    from models import User, Role, Course, Assignment, Submission, Grade, Material, Schedule
+    from models import User, Role, Course, Assignment, Submission, Grade, Material, Schedule, Analytics, AnalysisJob, AnalysisCacheEntry
+    from models import SubmissionSignature, SubmissionLshBucket, SchemaMigration, AdminSnapshot
     db.create_all()
     logger.debug("Database tables created successfully")
     
+    # Bring tables created by older versions up to date
+    from migrations import run_migrations
+    try:
+        run_migrations()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error running migrations: {e}")
+    
     # Create default roles if they don't exist
     from models import create_default_roles, create_admin_user
     create_default_roles()
@@ -75,6 +84,19 @@ app.register_blueprint(analytics_bp, url_prefix='/analytics')
 app.register_blueprint(schedule_bp, url_prefix='/schedule')
 app.register_blueprint(materials_bp, url_prefix='/materials')
 
+# Keep the materialized analytics in step with grade and submission changes
+import metric_store
+
+# Queue AI analysis whenever a submission is created or its content changes
+import analysis_queue
+
+# Count SQL statements per request and flag N+1 query patterns
+import sql_profiler
+sql_profiler.init_app(app)
+
+# Register flask CLI commands
+import cli
+
 # User loader for Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
@@ -90,5 +112,14 @@ def page_not_found(e):
 def internal_server_error(e):
     return render_template('500.html'), 500
 
+# Make current user role and date available in templates (layout.html needs `now`)
+@app.context_processor
+def inject_context():
+    from datetime import datetime
+    from flask_login import current_user
+    context = {'now': datetime.utcnow()}
+    context['user_role'] = current_user.role.name.value if current_user.is_authenticated else None
+    return context
+
 # Import at the end to avoid circular imports
 from flask import render_template
@@ -0,0 +1,54 @@
+"""Cold-start benchmark: time to import the AI services and run a first analysis.
+
+Each measurement runs in a fresh interpreter, the way a new worker starts.
+
+    python benchmarks/cold_start.py [--runs 5]
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = {
+    'import ai_services': "import ai_services",
+    'import + first analysis': (
+        "import ai_services\n"
+        "ai_services.preprocess_text('Students submitted their essays on sorting algorithms.')"
+    ),
+}
+
+SCRIPT = """
+import time
+start = time.perf_counter()
+{code}
+print(time.perf_counter() - start)
+"""
+
+
+def measure(code, runs):
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', SCRIPT.format(code=code)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    for stage, code in STAGES.items():
+        timings = measure(code, args.runs)
+        print(f"{stage:<25} median {statistics.median(timings) * 1000:8.1f} ms  "
+              f"min {min(timings) * 1000:8.1f} ms  ({args.runs} runs)")
+
+
+if __name__ == '__main__':
+    main()
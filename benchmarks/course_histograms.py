@@ -0,0 +1,210 @@
+"""Benchmark: grade and submission-timing histograms of one large course, three ways.
+
+Creates a course with --students students and --assignments assignments,
+every student submitting every assignment (50,000 submissions by default,
+90% graded), in a scratch SQLite database unless DATABASE_URL is set, then
+compares latency and peak traced memory of:
+
+    orm     loading Grade and Submission objects and walking
+            grade.submission.assignment lazily (the original dashboards)
+    arrays  fetching only the needed columns and bucketing with np.digitize
+    sql     CASE-bucketed GROUP BY queries returning five and three counts
+
+    python benchmarks/course_histograms.py [--students 2500] [--assignments 20] [--repeat 3]
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'histograms.db')
+
+from sqlalchemy import insert
+
+from app import app, db
+from models import (User, Role, RoleType, Course, Assignment, Submission, Grade, SubmissionStatus,
+                    AssignmentStatus, course_students)
+from metric_store import submission_timing
+from course_analytics import (grade_histogram, timing_histogram, GRADE_BUCKETS, GRADE_EDGES, TIMING_EDGES,
+                              TIMING_BUCKETS)
+
+
+def _next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+def create_course(students, assignments, seed=7):
+    """Insert a course where every student submits every assignment; returns its id."""
+    rng = np.random.default_rng(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    roles = {role.name: role.id for role in Role.query.all()}
+
+    first_user = _next_id(User)
+    user_ids = np.arange(first_user, first_user + students + 1)
+    db.session.execute(insert(User), [{
+        'id': int(user_id),
+        'username': f"histogram{user_id}",
+        'email': f"histogram{user_id}@campus.example.edu",
+        'password_hash': '-',
+        'first_name': 'Bench',
+        'last_name': f"User{user_id}",
+        'role_id': roles[RoleType.FACULTY if i == 0 else RoleType.STUDENT],
+        'is_active': True
+    } for i, user_id in enumerate(user_ids)])
+    faculty_id, student_ids = int(user_ids[0]), user_ids[1:]
+
+    course_id = _next_id(Course)
+    db.session.execute(insert(Course), [{
+        'id': course_id, 'code': f"BENCH{course_id}", 'title': 'Histogram benchmark',
+        'faculty_id': faculty_id, 'is_active': True, 'credits': 3
+    }])
+    db.session.execute(insert(course_students), [{'user_id': int(student_id), 'course_id': course_id}
+                                                 for student_id in student_ids])
+
+    first_assignment = _next_id(Assignment)
+    assignment_ids = np.arange(first_assignment, first_assignment + assignments)
+    due_dates = [now - timedelta(days=7 * (assignments - i)) for i in range(assignments)]
+    db.session.execute(insert(Assignment), [{
+        'id': int(assignment_id), 'title': f"Assignment {i + 1}", 'course_id': course_id,
+        'due_date': due_dates[i], 'max_score': 100.0, 'weight': 1.0, 'status': AssignmentStatus.PUBLISHED
+    } for i, assignment_id in enumerate(assignment_ids)])
+
+    submission_id = _next_id(Submission)
+    grade_id = _next_id(Grade)
+    for i, assignment_id in enumerate(assignment_ids):
+        hours_early = rng.normal(30, 36, students)
+        graded = rng.random(students) < 0.9
+        scores = np.clip(rng.normal(75, 14, students), 0, 100).round(1)
+        ids = np.arange(submission_id, submission_id + students)
+        submission_id += students
+        db.session.execute(insert(Submission), [{
+            'id': int(ids[k]), 'assignment_id': int(assignment_id), 'student_id': int(student_ids[k]),
+            'content': '', 'submission_date': due_dates[i] - timedelta(hours=float(hours_early[k])),
+            'status': SubmissionStatus.GRADED if graded[k] else SubmissionStatus.SUBMITTED
+        } for k in range(students)])
+        graded_ids = ids[graded]
+        db.session.execute(insert(Grade), [{
+            'id': grade_id + k, 'submission_id': int(graded_ids[k]), 'score': float(scores[graded][k]),
+            'graded_by': faculty_id, 'graded_at': now
+        } for k in range(len(graded_ids))])
+        grade_id += len(graded_ids)
+    db.session.commit()
+    return course_id
+
+
+def grade_bucket(percentage):
+    """Letter grade of a percentage, as the original dashboards computed it."""
+    if percentage >= 90:
+        return 'A'
+    elif percentage >= 80:
+        return 'B'
+    elif percentage >= 70:
+        return 'C'
+    elif percentage >= 60:
+        return 'D'
+    return 'F'
+
+
+def histograms_orm(course_id):
+    """The original dashboards: hydrate every object and touch relationships lazily."""
+    distribution = {bucket: 0 for bucket in GRADE_BUCKETS}
+    grades = Grade.query.join(Submission).join(Assignment).filter(Assignment.course_id == course_id).all()
+    for grade in grades:
+        max_score = grade.submission.assignment.max_score
+        if max_score:
+            distribution[grade_bucket(grade.score / max_score * 100)] += 1
+
+    timing = {'early': 0, 'ontime': 0, 'late': 0}
+    submissions = Submission.query.join(Assignment).filter(Assignment.course_id == course_id).all()
+    for submission in submissions:
+        timing[submission_timing(submission.submission_date, submission.assignment.due_date)] += 1
+    return distribution, timing
+
+
+def histograms_arrays(course_id):
+    """Fetch only the columns and bucket them with NumPy."""
+    rows = db.session.query(Grade.score, Assignment.max_score).join(
+        Submission, Grade.submission_id == Submission.id
+    ).join(Assignment, Submission.assignment_id == Assignment.id).filter(
+        Assignment.course_id == course_id, Assignment.max_score > 0
+    ).all()
+    percentages = np.array([score / max_score * 100 for score, max_score in rows])
+    buckets = np.bincount(np.digitize(percentages, GRADE_EDGES), minlength=len(GRADE_BUCKETS))
+    distribution = {bucket: int(buckets[len(GRADE_BUCKETS) - 1 - i]) for i, bucket in enumerate(GRADE_BUCKETS)}
+
+    rows = db.session.query(Submission.submission_date, Assignment.due_date).join(
+        Assignment, Submission.assignment_id == Assignment.id
+    ).filter(Assignment.course_id == course_id).all()
+    seconds = np.array([(due_date - submitted).total_seconds() for submitted, due_date in rows])
+    counts = np.bincount(np.digitize(seconds, TIMING_EDGES, right=True), minlength=len(TIMING_BUCKETS))
+    timing = {bucket: int(counts[i]) for i, bucket in reversed(list(enumerate(TIMING_BUCKETS)))}
+    return distribution, timing
+
+
+def histograms_sql(course_id):
+    """Let the database count the buckets."""
+    return grade_histogram(course_id), timing_histogram(course_id)
+
+
+def measure(function, course_id, repeat):
+    """Return (result, median milliseconds, peak KiB), each run on an empty session."""
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        result = function(course_id)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    function(course_id)
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    db.session.expunge_all()
+    return result, float(np.median(timings)), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=2500)
+    parser.add_argument('--assignments', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    with app.app_context():
+        start = time.perf_counter()
+        course_id = create_course(args.students, args.assignments)
+        submissions = Submission.query.join(Assignment).filter(Assignment.course_id == course_id).count()
+        print(f"course {course_id}: {submissions} submissions, created in {time.perf_counter() - start:.1f} s")
+        print(f"database: {db.engine.url.render_as_string(hide_password=True)}")
+
+        results = {}
+        for name, function in [('orm', histograms_orm), ('arrays', histograms_arrays), ('sql', histograms_sql)]:
+            result, median_ms, peak = measure(function, course_id, args.repeat)
+            results[name] = (result, median_ms, peak)
+            print(f"{name:7s} {median_ms:9.1f} ms  {peak:10.1f} KiB peak")
+
+        orm_ms, orm_peak = results['orm'][1], results['orm'][2]
+        sql_ms, sql_peak = results['sql'][1], results['sql'][2]
+        print(f"sql vs orm: {orm_ms / sql_ms:.1f}x faster, {orm_peak / sql_peak:.0f}x less memory")
+        print(f"distribution {results['sql'][0][0]}, timing {results['sql'][0][1]}")
+
+        if not results['orm'][0] == results['arrays'][0] == results['sql'][0]:
+            print("MISMATCH between methods:")
+            for name, (result, _, _) in results.items():
+                print(f"  {name}: {result}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Micro-benchmark: ai_services text preprocessing throughput on essay-length inputs.
+
+Compares the previous preprocess_text implementation (punctuation regex built
+per call, NLTK word_tokenize, uncached lemmatization) with preprocess_many.
+Lemmatization dominates the legacy cost, so the benchmark refuses to run
+without WordNet (`flask nlp-download`); --allow-fallback measures both sides
+with the no-op fallback lemmatizer instead, which understates the speedup.
+
+    python benchmarks/preprocess_throughput.py [--essays 200] [--words 800] [--allow-fallback]
+"""
+import os
+import re
+import sys
+import time
+import string
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nlp_resources
+from ai_services import preprocess_many
+
+
+def legacy_pipeline():
+    """Return the previous preprocess_text, bound to the installed NLTK resources."""
+    nltk = nlp_resources._nltk()
+    try:
+        nltk.data.find('tokenizers/punkt_tab/english')
+        from nltk.tokenize import word_tokenize as tokenize
+    except LookupError:
+        # word_tokenize without its sentence splitter (needs punkt_tab); a lower bound of its cost
+        from nltk.tokenize import NLTKWordTokenizer
+        tokenize = NLTKWordTokenizer().tokenize
+    stop_words = nlp_resources.get_stop_words()
+    lemmatize = nlp_resources.get_lemmatizer()
+
+    def preprocess_text(text):
+        text = text.lower()
+        text = re.sub(f'[{string.punctuation}]', ' ', text)
+        tokens = [token for token in tokenize(text) if token not in stop_words]
+        return ' '.join(lemmatize(token) for token in tokens)
+    return preprocess_text
+
+
+def make_essays(count, words, seed=42):
+    """Build essays from a Zipf-distributed vocabulary, with sentence punctuation."""
+    rng = random.Random(seed)
+    stop_words = sorted(nlp_resources.FALLBACK_STOP_WORDS)
+    vocabulary = stop_words + [f"{rng.choice(['data', 'model', 'graph', 'cell', 'theory'])}{i}s"
+                               for i in range(5000)]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    essays = []
+    for _ in range(count):
+        tokens = rng.choices(vocabulary, weights, k=words)
+        for i in range(12, words, 12):
+            tokens[i] += rng.choice(['.', ',', '!', '?', ';'])
+        essays.append(' '.join(tokens).capitalize())
+    return essays
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--essays', type=int, default=200)
+    parser.add_argument('--words', type=int, default=800)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--allow-fallback', action='store_true',
+                        help="run without WordNet; the results are not comparable to production")
+    args = parser.parse_args()
+
+    try:
+        nlp_resources._nltk().data.find(nlp_resources.RESOURCES['wordnet'][0])
+        wordnet = True
+    except LookupError:
+        wordnet = False
+    if not wordnet:
+        message = (f"WordNet is not installed in {nlp_resources.data_dir()} (run 'flask nlp-download'); "
+                   f"lemmatization would be a no-op on both sides")
+        if not args.allow_fallback:
+            sys.exit(f"error: {message}. Pass --allow-fallback to measure anyway.")
+        print(f"WARNING: {message}. These numbers do NOT reflect production.", file=sys.stderr)
+
+    essays = make_essays(args.essays, args.words)
+    legacy = legacy_pipeline()
+    nlp_resources.warm_up()
+
+    if [legacy(essay) for essay in essays[:20]] != preprocess_many(essays[:20]):
+        print("warning: outputs differ from the previous implementation")
+
+    results = {
+        'legacy preprocess_text': best_of(lambda: [legacy(essay) for essay in essays], args.repeat),
+        'preprocess_many': best_of(lambda: preprocess_many(essays), args.repeat),
+        'preprocess_many (ids)': best_of(lambda: preprocess_many(essays, as_ids=True), args.repeat),
+    }
+    baseline = results['legacy preprocess_text']
+    for name, seconds in results.items():
+        print(f"{name:<24} {args.essays / seconds:10.0f} essays/s  {baseline / seconds:5.1f}x")
+    print(f"lemmatizer: {'WordNet' if wordnet else 'no-op fallback (results not representative)'}")
+
+
+if __name__ == '__main__':
+    main()
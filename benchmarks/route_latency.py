@@ -0,0 +1,231 @@
+"""Benchmark: latency, SQL statements and peak memory of the hot routes, per role.
+
+Logs in as an admin, a faculty member and a student of the configured
+database (seed one with `flask seed-campus`) and drives each route with the
+Flask test client. Writes a JSON report and, given a baseline report,
+exits non-zero if any route regressed.
+
+    DATABASE_URL=sqlite:///campus.db python benchmarks/route_latency.py \\
+        [--repeat 20] [--report report.json] [--baseline baseline.json] [--save-baseline baseline.json]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import app, db
+from models import User, Course, Assignment, course_students
+from campus_seed import SEED_PASSWORD
+from calendar_feed import feed_token
+
+# A route regresses when its p95 latency or peak memory grows by more than
+# the tolerance (and the latency by more than the noise floor), or when it
+# issues more SQL statements than the baseline
+DEFAULT_TOLERANCE = 0.25
+LATENCY_NOISE_MS = 5.0
+
+
+def pick_users():
+    """Return (admin, faculty, student, course_id, assignment_id) to drive the routes with."""
+    from models import Role, RoleType
+    admin = User.query.join(Role).filter(Role.name == RoleType.ADMIN).order_by(User.id).first()
+    course = Course.query.filter(Course.faculty_id.isnot(None)).order_by(Course.id).first()
+    student_id = db.session.query(course_students.c.user_id).filter(
+        course_students.c.course_id == course.id
+    ).order_by(course_students.c.user_id).limit(1).scalar()
+    assignment_id = db.session.query(Assignment.id).filter(Assignment.course_id == course.id).limit(1).scalar()
+    return admin, db.session.get(User, course.faculty_id), db.session.get(User, student_id), course.id, assignment_id
+
+
+def route_catalog(faculty, student, course_id, assignment_id):
+    """Return {role: [(name, method, url)]}."""
+    return {
+        'admin': [
+            ('analytics admin', 'GET', '/analytics/admin'),
+            ('admin system', 'GET', '/admin/system'),
+            ('schedule', 'GET', '/schedule/'),
+            ('materials', 'GET', '/materials/'),
+        ],
+        'faculty': [
+            ('faculty dashboard', 'GET', '/faculty/dashboard'),
+            ('faculty analytics', 'GET', '/faculty/analytics'),
+            ('faculty submissions', 'GET', '/faculty/submissions'),
+            ('analytics faculty', 'GET', '/analytics/faculty'),
+            ('schedule', 'GET', '/schedule/'),
+            ('materials', 'GET', '/materials/'),
+            ('api course analytics', 'GET', f'/analytics/api/course/{course_id}'),
+            ('api at-risk students', 'GET', f'/faculty/api/courses/{course_id}/at-risk'),
+            ('api course free/busy', 'GET', f'/schedule/api/free-busy?course_id={course_id}'),
+            ('api schedule suggestions', 'GET', '/schedule/api/get-suggestions'),
+        ],
+        'student': [
+            ('student dashboard', 'GET', '/student/dashboard'),
+            ('student assignments', 'GET', '/student/assignments'),
+            ('student grades', 'GET', '/student/grades'),
+            ('analytics student', 'GET', '/analytics/student'),
+            ('schedule', 'GET', '/schedule/'),
+            ('materials', 'GET', '/materials/'),
+            ('api student analytics', 'GET', f'/analytics/api/student/{student.id}'),
+            ('api schedule suggestions', 'GET', '/schedule/api/get-suggestions'),
+            ('calendar feed', 'GET', f'/schedule/feed/{feed_token(student)}.ics'),
+        ],
+    }
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(db.engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def fetch(client, method, url):
+    """Request a route and drain its body; returns the status code, 500 if the app raised."""
+    try:
+        response = client.open(url, method=method)
+        response.get_data()  # drain streamed bodies
+        return response.status_code
+    except Exception:
+        return 500
+
+
+def measure(client, counter, method, url, repeat):
+    """Time a route; returns its result dict."""
+    fetch(client, method, url)  # warm up caches and lazy imports
+
+    timings = []
+    counter.count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        status = fetch(client, method, url)
+        timings.append((time.perf_counter() - start) * 1000)
+    queries = counter.count / repeat
+
+    # Memory is traced in a separate pass so tracing does not skew the timings
+    tracemalloc.start()
+    fetch(client, method, url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = np.array(timings)
+    return {
+        'url': url,
+        'status': status,
+        'p50_ms': round(float(np.percentile(timings, 50)), 2),
+        'p95_ms': round(float(np.percentile(timings, 95)), 2),
+        'p99_ms': round(float(np.percentile(timings, 99)), 2),
+        'mean_ms': round(float(timings.mean()), 2),
+        'queries': queries,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Return a list of regression messages of report against baseline."""
+    regressions = []
+    for key, result in report['routes'].items():
+        before = baseline['routes'].get(key)
+        if before is None:
+            continue
+        # A route that used to fail has no meaningful baseline; one that starts failing regressed
+        if before['status'] >= 400:
+            continue
+        if result['status'] >= 400:
+            regressions.append(f"{key}: status {before['status']} -> {result['status']}")
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + tolerance) and \
+                result['p95_ms'] - before['p95_ms'] > LATENCY_NOISE_MS:
+            regressions.append(f"{key}: p95 {before['p95_ms']} -> {result['p95_ms']} ms")
+        if result['queries'] > before['queries']:
+            regressions.append(f"{key}: SQL statements {before['queries']} -> {result['queries']}")
+        if result['peak_kib'] > before['peak_kib'] * (1 + tolerance):
+            regressions.append(f"{key}: peak memory {before['peak_kib']} -> {result['peak_kib']} KiB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--admin-password', default='admin123')
+    parser.add_argument('--password', default=SEED_PASSWORD, help='Password of the faculty and student accounts.')
+    parser.add_argument('--only', help='Only run routes whose name contains this text.')
+    parser.add_argument('--report', help='Write the JSON report to this file.')
+    parser.add_argument('--baseline', help='Compare against this earlier report.')
+    parser.add_argument('--save-baseline', help='Also write the report here, as the new baseline.')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    # Failing routes are reported with a 500 status rather than aborting the run
+    logging.disable(logging.CRITICAL)
+
+    with app.app_context():
+        admin, faculty, student, course_id, assignment_id = pick_users()
+        catalog = route_catalog(faculty, student, course_id, assignment_id)
+        credentials = {
+            'admin': (admin.username, args.admin_password),
+            'faculty': (faculty.username, args.password),
+            'student': (student.username, args.password),
+        }
+        counter = StatementCounter()
+
+        report = {
+            'meta': {
+                'created_at': datetime.utcnow().isoformat(),
+                'database': db.engine.url.render_as_string(hide_password=True),
+                'python': platform.python_version(),
+                'repeat': args.repeat,
+                'rows': {
+                    'user': User.query.count(),
+                    'course': Course.query.count(),
+                    'assignment': Assignment.query.count(),
+                },
+            },
+            'routes': {},
+        }
+
+    for role, routes in catalog.items():
+        client = app.test_client()
+        username, password = credentials[role]
+        login = client.post('/login', data={'username': username, 'password': password})
+        if login.status_code != 302:
+            print(f"{role}: login as {username} failed ({login.status_code}); skipping")
+            continue
+        for name, method, url in routes:
+            if args.only and args.only not in name:
+                continue
+            result = measure(client, counter, method, url, args.repeat)
+            report['routes'][f"{role}: {name}"] = result
+            print(f"{role + ': ' + name:<40} {result['status']}  p50 {result['p50_ms']:8.1f} ms  "
+                  f"p95 {result['p95_ms']:8.1f} ms  {result['queries']:6.1f} SQL  {result['peak_kib']:9.1f} KiB")
+
+    for path in (args.report, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == '__main__':
+    main()
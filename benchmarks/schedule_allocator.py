@@ -0,0 +1,120 @@
+"""Benchmark: ai_services.optimize_schedule on a semester of free slots.
+
+Schedules --events events (10k by default) into an 18-week semester of
+free slots, with the interval-indexed allocator and with the
+previous linear-scan allocator, and checks that both give the same schedule.
+
+    python benchmarks/schedule_allocator.py [--events 10000] [--skip-legacy]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_services import optimize_schedule
+
+
+def legacy_optimize_schedule(events, constraints, preferences):
+    """The previous allocator: scans every slot for every event."""
+    optimized_schedule = []
+    sorted_events = sorted(events, key=lambda x: (x.get('priority', 5), x.get('deadline', datetime.max)))
+    available_slots = sorted(constraints.get('available_slots', []), key=lambda x: x['start'])
+    min_break = preferences.get('min_break_minutes', 15)
+    preferred_time = preferences.get('preferred_time', 'morning')
+
+    for event in sorted_events:
+        duration_minutes = event.get('duration_minutes', 60)
+        deadline = event.get('deadline')
+        priority = event.get('priority', 5)
+        best_slot = None
+        best_slot_score = -1
+        for slot in available_slots:
+            if slot['end'] < datetime.now():
+                continue
+            if deadline and slot['start'] > deadline:
+                continue
+            if (slot['end'] - slot['start']).total_seconds() / 60 < duration_minutes:
+                continue
+            score = 0
+            if deadline:
+                days_until_deadline = (deadline - slot['start']).days
+                if priority <= 3:
+                    score += 10 if days_until_deadline <= 1 else 0
+                else:
+                    score += min(5, days_until_deadline)
+            if preferred_time == 'morning' and 5 <= slot['start'].hour <= 12:
+                score += 5
+            elif preferred_time == 'afternoon' and 12 < slot['start'].hour <= 17:
+                score += 5
+            elif preferred_time == 'evening' and 17 < slot['start'].hour <= 22:
+                score += 5
+            if score > best_slot_score:
+                best_slot_score = score
+                best_slot = slot
+        if best_slot:
+            event_end_time = best_slot['start'] + timedelta(minutes=duration_minutes)
+            optimized_schedule.append({
+                'id': event.get('id'),
+                'title': event.get('title'),
+                'start_time': best_slot['start'],
+                'end_time': event_end_time,
+                'duration_minutes': duration_minutes
+            })
+            if event_end_time + timedelta(minutes=min_break) < best_slot['end']:
+                best_slot['start'] = event_end_time + timedelta(minutes=min_break)
+            else:
+                available_slots.remove(best_slot)
+    return optimized_schedule
+
+
+def make_workload(event_count, weeks=18, seed=7):
+    """Free slots of 30-90 minutes, 5 minutes apart, from 6:00 to midnight every day; short bookings."""
+    rng = random.Random(seed)
+    semester_start = (datetime.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    slots = []
+    for day in range(weeks * 7):
+        cursor = semester_start + timedelta(days=day, hours=6)
+        day_end = semester_start + timedelta(days=day, hours=24)
+        while cursor < day_end:
+            end = min(day_end, cursor + timedelta(minutes=rng.choice([30, 45, 60, 90])))
+            slots.append({'start': cursor, 'end': end})
+            cursor = end + timedelta(minutes=5)
+    events = [{
+        'id': i,
+        'title': f"Event {i}",
+        'duration_minutes': rng.choice([5, 10, 15]),
+        'priority': rng.randint(1, 5),
+        'deadline': semester_start + timedelta(days=rng.randint(1, weeks * 7), hours=rng.randint(0, 23))
+    } for i in range(event_count)]
+    return events, slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--skip-legacy', action='store_true', help='Only time the new allocator.')
+    args = parser.parse_args()
+
+    events, slots = make_workload(args.events)
+    preferences = {'min_break_minutes': 5, 'preferred_time': 'morning'}
+    print(f"{len(events)} events, {len(slots)} free slots")
+
+    start = time.perf_counter()
+    schedule = optimize_schedule(events, {'available_slots': slots}, preferences)
+    elapsed = time.perf_counter() - start
+    print(f"interval index  {elapsed:8.2f} s  ({len(schedule)} scheduled)")
+
+    if not args.skip_legacy:
+        start = time.perf_counter()
+        legacy = legacy_optimize_schedule(events, {'available_slots': [dict(slot) for slot in slots]}, preferences)
+        legacy_elapsed = time.perf_counter() - start
+        print(f"linear scan     {legacy_elapsed:8.2f} s  ({len(legacy)} scheduled)  "
+              f"{legacy_elapsed / elapsed:.0f}x slower, same schedule: {legacy == schedule}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import hashlib
+import logging
+from datetime import datetime
+
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import select, func
+
+from app import db
+from models import User, Schedule, Assignment, Course, AssignmentStatus, course_students
+from recurrence import parse_recurrence, NAMED_RULES
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip while streaming a feed
+FEED_BATCH_SIZE = 500
+
+_WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.secret_key, salt='calendar-feed')
+
+
+def feed_token(user):
+    """Return the signed token identifying a user's calendar feed.
+
+    The user's calendar_feed_version is signed in, so bumping it (see
+    revoke_feed_tokens) invalidates every URL handed out before.
+    """
+    return _serializer().dumps([user.id, user.calendar_feed_version or 0])
+
+
+def read_feed_token(token):
+    """Return (user_id, version) of a signed feed token, or (None, None) if the signature is invalid.
+
+    Whether the version is still current is checked by feed_version.
+    """
+    try:
+        payload = _serializer().loads(token)
+    except BadSignature:
+        return None, None
+    # Tokens issued before versioning carry the bare user id
+    return tuple(payload) if isinstance(payload, list) else (payload, 0)
+
+
+def revoke_feed_tokens(user):
+    """Invalidate every feed URL of a user; the caller commits."""
+    user.calendar_feed_version = (user.calendar_feed_version or 0) + 1
+
+
+def _feed_filters(user_id):
+    """Return the Schedule and Assignment filters of a user's feed."""
+    enrolled = select(course_students.c.course_id).where(course_students.c.user_id == user_id)
+    taught = select(Course.id).where(Course.faculty_id == user_id)
+    schedules = ((Schedule.course_id.is_(None)) & (Schedule.owner_id == user_id)) | \
+        Schedule.course_id.in_(enrolled) | Schedule.course_id.in_(taught)
+    # Students see published assignments, instructors all of theirs
+    assignments = (Assignment.course_id.in_(enrolled) & (Assignment.status == AssignmentStatus.PUBLISHED)) | \
+        Assignment.course_id.in_(taught)
+    return schedules, assignments
+
+
+def feed_version(user_id, token_version):
+    """Return (last_modified, etag) of a user's feed from a single aggregate query.
+
+    Returns None instead when the token version was revoked or the user is
+    inactive.
+
+    Row counts are part of the ETag so deletions change it too. Course
+    changes count as well: codes title the events and end dates bound
+    recurring ones.
+    """
+    schedule_filter, assignment_filter = _feed_filters(user_id)
+    course_filter = Course.id.in_(select(course_students.c.course_id).where(course_students.c.user_id == user_id)) | \
+        (Course.faculty_id == user_id)
+    row = db.session.query(
+        select(func.max(Schedule.updated_at)).where(schedule_filter).scalar_subquery(),
+        select(func.count(Schedule.id)).where(schedule_filter).scalar_subquery(),
+        select(func.max(Assignment.updated_at)).where(assignment_filter).scalar_subquery(),
+        select(func.count(Assignment.id)).where(assignment_filter).scalar_subquery(),
+        select(func.max(Course.updated_at)).where(course_filter).scalar_subquery(),
+        select(func.coalesce(User.calendar_feed_version, 0)).where(
+            User.id == user_id, User.is_active.is_(True)
+        ).scalar_subquery()
+    ).one()
+    schedule_modified, schedule_count, assignment_modified, assignment_count, course_modified, version = row
+    if version is None or version != token_version:
+        return None
+
+    last_modified = max((value for value in (schedule_modified, assignment_modified, course_modified)
+                         if value is not None), default=None)
+    if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0)
+    etag = hashlib.sha1(f"{user_id}:{row}".encode('utf-8')).hexdigest()
+    return last_modified, etag
+
+
+def _escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n') \
+        .replace('\n', '\\n')
+
+
+def _format_time(value):
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def _fold(line):
+    """Fold a content line at 75 octets, as RFC 5545 requires."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        # Never split a multi-byte character
+        while limit < len(encoded) and (encoded[limit] & 0xC0) == 0x80:
+            limit -= 1
+        parts.append(encoded[:limit].decode('utf-8'))
+        encoded = encoded[limit:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _rrule(recurrence_pattern, until):
+    """Return the RRULE of a recurring event's pattern, or None if it is not understood."""
+    rule = parse_recurrence(recurrence_pattern) if recurrence_pattern else NAMED_RULES['weekly']
+    if rule is None:
+        return None
+    parts = [f"FREQ={rule.freq.upper()}"]
+    if rule.interval != 1:
+        parts.append(f"INTERVAL={rule.interval}")
+    if rule.weekdays:
+        parts.append("BYDAY=" + ','.join(_WEEKDAYS[day] for day in rule.weekdays))
+    if until is not None:
+        parts.append("UNTIL=" + _format_time(datetime.combine(until, datetime.max.time()).replace(microsecond=0)))
+    return 'RRULE:' + ';'.join(parts)
+
+
+def generate_feed(user_id, host='campusiq'):
+    """Yield a user's iCalendar feed line by line: their events and assignment deadlines.
+
+    Rows are streamed from the database in batches, so the whole document
+    is never held in memory. Times are stored in UTC and emitted as such.
+    """
+    schedule_filter, assignment_filter = _feed_filters(user_id)
+    stamp = _format_time(datetime.utcnow())
+
+    yield 'BEGIN:VCALENDAR\r\n'
+    yield 'VERSION:2.0\r\n'
+    yield 'PRODID:-//CampusIQ//Schedule Feed//EN\r\n'
+    yield 'CALSCALE:GREGORIAN\r\n'
+    yield 'X-WR-CALNAME:CampusIQ\r\n'
+
+    schedules = db.session.query(
+        Schedule.id, Schedule.title, Schedule.description, Schedule.start_time, Schedule.end_time,
+        Schedule.location, Schedule.updated_at, Schedule.is_recurring, Schedule.recurrence_pattern,
+        Course.code, Course.end_date
+    ).outerjoin(Course, Course.id == Schedule.course_id).filter(schedule_filter).order_by(
+        Schedule.id
+    ).execution_options(yield_per=FEED_BATCH_SIZE)
+    for schedule in schedules:
+        title = f"{schedule.code}: {schedule.title}" if schedule.code else schedule.title
+        lines = [
+            'BEGIN:VEVENT',
+            f"UID:schedule-{schedule.id}@{host}",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{_format_time(schedule.start_time)}",
+            f"DTEND:{_format_time(schedule.end_time)}",
+            f"SUMMARY:{_escape(title)}",
+        ]
+        if schedule.description:
+            lines.append(f"DESCRIPTION:{_escape(schedule.description)}")
+        if schedule.location:
+            lines.append(f"LOCATION:{_escape(schedule.location)}")
+        if schedule.updated_at:
+            lines.append(f"LAST-MODIFIED:{_format_time(schedule.updated_at)}")
+        if schedule.is_recurring:
+            rrule = _rrule(schedule.recurrence_pattern, schedule.end_date)
+            if rrule:
+                lines.append(rrule)
+        lines.append('END:VEVENT')
+        yield ''.join(_fold(line) for line in lines)
+
+    assignments = db.session.query(
+        Assignment.id, Assignment.title, Assignment.description, Assignment.due_date, Assignment.updated_at,
+        Course.code
+    ).join(Course, Course.id == Assignment.course_id).filter(assignment_filter).order_by(
+        Assignment.id
+    ).execution_options(yield_per=FEED_BATCH_SIZE)
+    for assignment_id, title, description, due_date, updated_at, course_code in assignments:
+        lines = [
+            'BEGIN:VEVENT',
+            f"UID:assignment-{assignment_id}@{host}",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{_format_time(due_date)}",
+            f"DTEND:{_format_time(due_date)}",
+            f"SUMMARY:{_escape(f'{course_code}: {title} due')}",
+            'TRANSP:TRANSPARENT',
+        ]
+        if description:
+            lines.append(f"DESCRIPTION:{_escape(description)}")
+        if updated_at:
+            lines.append(f"LAST-MODIFIED:{_format_time(updated_at)}")
+        lines.append('END:VEVENT')
+        yield ''.join(_fold(line) for line in lines)
+
+    yield 'END:VCALENDAR\r\n'
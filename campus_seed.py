@@ -0,0 +1,265 @@
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, text
+from werkzeug.security import generate_password_hash
+
+from app import db
+from models import (User, Role, RoleType, Course, Assignment, Submission, Grade, Material, Schedule,
+                    AssignmentStatus, SubmissionStatus, course_students)
+
+logger = logging.getLogger(__name__)
+
+# Rows sent per executemany round trip
+INSERT_BATCH_SIZE = 20000
+
+# Every seeded account gets this password
+SEED_PASSWORD = 'campus123'
+
+FIRST_NAMES = ['Aarav', 'Ana', 'Ben', 'Chen', 'Diya', 'Elena', 'Farah', 'Gabriel', 'Hana', 'Ivan', 'Jia',
+               'Kofi', 'Lena', 'Mateo', 'Nia', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sam', 'Tariq', 'Uma',
+               'Victor', 'Wei', 'Yara', 'Zane']
+LAST_NAMES = ['Adams', 'Bose', 'Cruz', 'Dubois', 'Eze', 'Fischer', 'Garcia', 'Hughes', 'Ito', 'Joshi',
+              'Kim', 'Lopez', 'Mensah', 'Nakamura', 'Okafor', 'Patel', 'Rossi', 'Singh', 'Tanaka', 'Usman',
+              'Volkov', 'Wang', 'Xu', 'Yilmaz', 'Zhou']
+
+# Each department has its own subject vocabulary, mixed with common academic words in essays
+DEPARTMENTS = {
+    'CS': 'algorithm data structure graph tree recursion complexity compiler memory process thread network '
+          'protocol database query index cache function variable loop array hash pointer',
+    'BIO': 'cell protein enzyme gene membrane photosynthesis chlorophyll mitochondria organism species '
+           'evolution ecosystem nutrient respiration tissue molecule dna rna mutation population',
+    'PHY': 'force energy momentum velocity acceleration mass field charge current voltage wave frequency '
+           'quantum particle gravity friction pressure temperature entropy oscillation',
+    'ECO': 'market demand supply price elasticity inflation interest capital labor trade tariff growth '
+           'recession policy fiscal monetary equilibrium utility cost revenue',
+    'HIS': 'empire revolution treaty war dynasty colony trade reform parliament monarchy republic '
+           'constitution migration industry culture religion archive source chronicle era',
+    'MAT': 'theorem proof lemma matrix vector integral derivative limit series function set group ring '
+           'field topology probability variance estimate equation polynomial',
+}
+COMMON_WORDS = ('the of and to in is that for this with as by on are an be which it from at results '
+                'analysis approach evidence example however therefore because shows important model '
+                'explain describe compare discuss argue study method process effect cause').split()
+
+
+def _insert(model_or_table, rows):
+    """Bulk insert rows in batches with executemany, bypassing the ORM unit of work."""
+    table = getattr(model_or_table, '__table__', model_or_table)
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        db.session.execute(table.insert(), rows[start:start + INSERT_BATCH_SIZE])
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _reset_sequences(models):
+    """Move id sequences past rows inserted with explicit ids.
+
+    PostgreSQL sequences do not advance on explicit inserts, so the next ORM
+    insert would reuse a seeded id; SQLite and MySQL derive it from max(id).
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model in models:
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{model.__tablename__}\"', 'id'), "
+            f"(SELECT coalesce(max(id), 1) FROM \"{model.__tablename__}\"))"
+        ))
+
+
+def _essays(rng, vocabulary, count, words):
+    """Return `count` essays of about `words` words drawn from a Zipf-weighted vocabulary."""
+    vocabulary = np.array(vocabulary, dtype=object)
+    ended = np.array([word + '.' for word in vocabulary], dtype=object)
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    indices = rng.choice(len(vocabulary), size=(count, words), p=weights)
+    tokens = vocabulary[indices]
+    # Sentences of twelve words
+    tokens[:, 11::12] = ended[indices[:, 11::12]]
+    tokens[:, -1] = ended[indices[:, -1]]
+    return [' '.join(row).capitalize() for row in tokens]
+
+
+def seed_campus(students=50000, courses=2000, courses_per_student=5, assignments_per_course=6,
+                materials_per_course=3, submission_rate=0.85, essay_words=80, seed=42, today=None):
+    """Bulk-generate a synthetic institution for load and scale testing.
+
+    Students enrol in courses of one department, so rosters and schedules
+    overlap the way a real campus does. Dates are laid out around today
+    (midnight UTC unless given), so the same seed and the same today always
+    produce the same data; new rows are numbered after the existing ones, so
+    seeding can be repeated. Every seeded account's password is SEED_PASSWORD.
+
+    Returns:
+        dict: number of rows inserted per table
+    """
+    rng = np.random.default_rng(seed)
+    today = today or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    semester_start = today - timedelta(days=60)
+    semester_end = today + timedelta(days=60)
+    roles = {role.name: role.id for role in Role.query.all()}
+    password_hash = generate_password_hash(SEED_PASSWORD)  # hashed once; hashing per user would take hours
+    counts = {}
+
+    # Faculty and students
+    faculty_count = max(1, courses // 2)
+    first_user_id = _next_id(User)
+    faculty_ids = np.arange(first_user_id, first_user_id + faculty_count)
+    student_ids = np.arange(faculty_ids[-1] + 1, faculty_ids[-1] + 1 + students)
+    users = []
+    for user_id, role in [(int(i), RoleType.FACULTY) for i in faculty_ids] + \
+                         [(int(i), RoleType.STUDENT) for i in student_ids]:
+        prefix = 'faculty' if role == RoleType.FACULTY else 'student'
+        users.append({
+            'id': user_id,
+            'username': f"{prefix}{user_id}",
+            'email': f"{prefix}{user_id}@campus.example.edu",
+            'password_hash': password_hash,
+            'first_name': FIRST_NAMES[user_id % len(FIRST_NAMES)],
+            'last_name': LAST_NAMES[(user_id // len(FIRST_NAMES)) % len(LAST_NAMES)],
+            'role_id': roles[role],
+            'is_active': True
+        })
+    _insert(User, users)
+    counts['user'] = len(users)
+    logger.info(f"Seeded {len(users)} users")
+
+    # Courses, grouped into departments; each faculty member teaches two
+    departments = list(DEPARTMENTS)
+    first_course_id = _next_id(Course)
+    course_ids = np.arange(first_course_id, first_course_id + courses)
+    course_department = np.arange(courses) % len(departments)
+    course_faculty = faculty_ids[np.arange(courses) % faculty_count]
+    _insert(Course, [{
+        'id': int(course_id),
+        'code': f"{departments[course_department[i]]}{int(course_id):05d}",
+        'title': f"{departments[course_department[i]]} Topics {i + 1}",
+        'description': f"Seeded course in {departments[course_department[i]]}.",
+        'faculty_id': int(course_faculty[i]),
+        'start_date': semester_start.date(),
+        'end_date': semester_end.date(),
+        'is_active': True,
+        'credits': 3
+    } for i, course_id in enumerate(course_ids)])
+    counts['course'] = courses
+
+    # Enrollments: each student takes distinct courses of one department
+    department_courses = [np.flatnonzero(course_department == d) for d in range(len(departments))]
+    student_department = rng.integers(0, len(departments), students)
+    enrollments = []
+    for d, members in enumerate(department_courses):
+        department_students = np.flatnonzero(student_department == d)
+        take = min(courses_per_student, len(members))
+        if not take or not len(department_students):
+            continue
+        # A random permutation per student, truncated, gives distinct courses
+        picks = np.argsort(rng.random((len(department_students), len(members))), axis=1)[:, :take]
+        enrollments.append(np.column_stack((
+            np.repeat(department_students, take), members[picks].ravel()
+        )))
+    enrollments = np.concatenate(enrollments) if enrollments else np.zeros((0, 2), dtype=np.int64)
+    _insert(course_students, [{'user_id': int(student_ids[s]), 'course_id': int(course_ids[c])}
+                              for s, c in enrollments])
+    counts['course_students'] = len(enrollments)
+    logger.info(f"Seeded {len(enrollments)} enrollments")
+
+    # Assignments spread over the semester; those due more than a week from today are still drafts
+    first_assignment_id = _next_id(Assignment)
+    assignment_course = np.repeat(np.arange(courses), assignments_per_course)
+    offsets = rng.integers(7, 120, len(assignment_course))
+    assignment_due = [semester_start + timedelta(days=int(days), hours=23, minutes=59) for days in offsets]
+    assignment_ids = np.arange(first_assignment_id, first_assignment_id + len(assignment_course))
+    _insert(Assignment, [{
+        'id': int(assignment_id),
+        'title': f"Assignment {i % assignments_per_course + 1}",
+        'description': f"Write an essay on {' '.join(DEPARTMENTS[departments[course_department[c]]].split()[:3])}.",
+        'course_id': int(course_ids[c]),
+        'due_date': assignment_due[i],
+        'max_score': 100.0,
+        'weight': 1.0,
+        'status': AssignmentStatus.DRAFT if assignment_due[i] > today + timedelta(days=7)
+        else AssignmentStatus.PUBLISHED
+    } for i, (assignment_id, c) in enumerate(zip(assignment_ids, assignment_course))])
+    counts['assignment'] = len(assignment_ids)
+
+    # Submissions and grades for published assignments, by roster
+    roster_order = np.argsort(enrollments[:, 1], kind='stable')
+    roster_bounds = np.searchsorted(enrollments[roster_order, 1], np.arange(courses + 1))
+    ability = rng.normal(75, 12, students)
+    submission_id = _next_id(Submission)
+    grade_id = _next_id(Grade)
+    counts['submission'] = counts['grade'] = 0
+    for i, c in enumerate(assignment_course):
+        due = assignment_due[i]
+        if due > today + timedelta(days=7):
+            continue
+        roster = enrollments[roster_order[roster_bounds[c]:roster_bounds[c + 1]], 0]
+        roster = roster[rng.random(len(roster)) < submission_rate]
+        if not len(roster):
+            continue
+        vocabulary = DEPARTMENTS[departments[course_department[c]]].split() + COMMON_WORDS
+        essays = _essays(rng, vocabulary, len(roster), essay_words)
+        # Mostly on time, some late
+        submitted = [due - timedelta(hours=float(hours)) for hours in rng.normal(30, 36, len(roster))]
+        graded = np.array([due < today] * len(roster)) & (rng.random(len(roster)) < 0.9)
+        scores = np.clip(ability[roster] + rng.normal(0, 8, len(roster)), 0, 100).round(1)
+
+        ids = np.arange(submission_id, submission_id + len(roster))
+        submission_id += len(roster)
+        _insert(Submission, [{
+            'id': int(ids[k]),
+            'assignment_id': int(assignment_ids[i]),
+            'student_id': int(student_ids[s]),
+            'content': essays[k],
+            'status': SubmissionStatus.GRADED if graded[k] else
+            (SubmissionStatus.LATE if submitted[k] > due else SubmissionStatus.SUBMITTED),
+            'submission_date': submitted[k],
+        } for k, s in enumerate(roster)])
+        _insert(Grade, [{
+            'id': grade_id + n,
+            'submission_id': int(ids[k]),
+            'score': float(scores[k]),
+            'feedback': 'Seeded grade.',
+            'graded_by': int(course_faculty[c]),
+            'graded_at': due + timedelta(days=int(rng.integers(1, 7)))
+        } for n, k in enumerate(np.flatnonzero(graded))])
+        grade_id += int(graded.sum())
+        counts['submission'] += len(roster)
+        counts['grade'] += int(graded.sum())
+    logger.info(f"Seeded {counts['submission']} submissions and {counts['grade']} grades")
+
+    # Materials
+    _insert(Material, [{
+        'title': f"Lecture notes {m + 1}",
+        'description': f"Notes on {DEPARTMENTS[departments[course_department[c]]].split()[m % 20]}.",
+        'url': f"https://campus.example.edu/courses/{int(course_ids[c])}/notes/{m + 1}",
+        'course_id': int(course_ids[c]),
+        'created_by_id': int(course_faculty[c]),
+        'created_at': semester_start + timedelta(days=7 * m),
+        'is_visible': True
+    } for c in range(courses) for m in range(materials_per_course)])
+    counts['material'] = courses * materials_per_course
+
+    # A recurring lecture per course; a faculty member's two courses meet on different days
+    lecture_hours = rng.integers(8, 18, courses)
+    first_monday = semester_start - timedelta(days=semester_start.weekday())
+    tuesday_thursday = (np.arange(courses) // faculty_count) % 2 == 1
+    _insert(Schedule, [{
+        'title': 'Lecture',
+        'start_time': first_monday + timedelta(days=int(tuesday_thursday[c]), hours=int(lecture_hours[c])),
+        'end_time': first_monday + timedelta(days=int(tuesday_thursday[c]), hours=int(lecture_hours[c]) + 1),
+        'course_id': int(course_ids[c]),
+        'owner_id': int(course_faculty[c]),
+        'location': f"Room {100 + c % 300}",
+        'is_recurring': True,
+        'recurrence_pattern': 'TR' if tuesday_thursday[c] else 'MWF'
+    } for c in range(courses)])
+    counts['schedule'] = courses
+
+    _reset_sequences([User, Course, Assignment, Submission, Grade])
+    db.session.commit()
+    return counts
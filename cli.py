@@ -0,0 +1,140 @@
+import click
+
+from app import app
+
+
+@app.cli.command('analysis-worker')
+@click.option('--batch-size', default=50, show_default=True, help='Jobs claimed per batch.')
+@click.option('--poll-interval', default=2.0, show_default=True, help='Seconds to wait when the queue is empty.')
+@click.option('--once', is_flag=True, help='Process a single batch and exit.')
+def analysis_worker(batch_size, poll_interval, once):
+    """Run the background AI-analysis worker."""
+    from analysis_queue import run_worker
+    processed = run_worker(batch_size=batch_size, poll_interval=poll_interval, once=once)
+    if once:
+        click.echo(f"Analyzed {processed} submissions.")
+
+
+@app.cli.command('admin-snapshot')
+@click.option('--interval', default=300, show_default=True, help='Seconds between refreshes.')
+@click.option('--once', is_flag=True, help='Refresh once and exit (e.g. from cron).')
+def admin_snapshot(interval, once):
+    """Recompute the admin dashboard metrics periodically."""
+    from admin_snapshot import run_refresher
+    snapshot = run_refresher(interval=interval, once=once)
+    if once:
+        if snapshot is None:
+            raise click.ClickException("Refreshing the admin snapshot failed; see the log.")
+        click.echo(f"Admin snapshot refreshed in {snapshot.duration_ms:.0f} ms.")
+
+
+@app.cli.command('analysis-cache-purge')
+def analysis_cache_purge():
+    """Delete cached analyses made by older analyzer versions."""
+    from ai_services import ANALYZER_VERSION
+    from analysis_cache import purge_stale_entries
+    deleted = purge_stale_entries(ANALYZER_VERSION)
+    click.echo(f"Deleted {deleted} stale cached analyses.")
+
+
+@app.cli.command('nlp-download')
+def nlp_download():
+    """Download the NLTK corpora into the local data directory."""
+    from nlp_resources import data_dir, download_resources
+    for package, ok in download_resources().items():
+        click.echo(f"{package}: {'ok' if ok else 'FAILED'}")
+    click.echo(f"Data directory: {data_dir()}")
+
+
+@app.cli.command('refit-text-models')
+@click.option('--course-id', type=int, help='Refit a single course (default: every course).')
+def refit_text_models(course_id):
+    """Refit the per-course TF-IDF models used for similarity scoring."""
+    from models import Course
+    from text_models import fit_course_model
+    course_ids = [course_id] if course_id else [course.id for course in Course.query.order_by(Course.id)]
+    for cid in course_ids:
+        documents = fit_course_model(cid)
+        click.echo(f"Course {cid}: " + (f"fitted on {documents} documents" if documents else "no text to fit"))
+
+
+@app.cli.command('index-submissions')
+def index_submissions_command():
+    """Compute MinHash signatures for every submission not yet indexed."""
+    from models import Submission
+    from similarity_index import index_submissions
+    indexed = 0
+    for assignment_id, in Submission.query.with_entities(Submission.assignment_id).distinct():
+        indexed += index_submissions(Submission.query.filter_by(assignment_id=assignment_id).all())
+    click.echo(f"Indexed {indexed} submissions.")
+
+
+@app.cli.command('exam-timetable')
+@click.option('--start-date', required=True, type=click.DateTime(formats=['%Y-%m-%d']), help='First exam day.')
+@click.option('--days', default=10, show_default=True, help='Exam days (weekdays).')
+@click.option('--slots-per-day', default=3, show_default=True)
+@click.option('--duration', default=120, show_default=True, help='Exam length in minutes.')
+@click.option('--first-start', default='09:00', show_default=True, help='Start of the first sitting (HH:MM).')
+@click.option('--room', 'rooms', multiple=True, help='Exam room as NAME:CAPACITY; repeat for each room.')
+@click.option('--owner-id', type=int, help='Owner of exams for courses without a faculty member.')
+@click.option('--replace', is_flag=True, help='Delete previously generated exams first.')
+def exam_timetable(start_date, days, slots_per_day, duration, first_start, rooms, owner_id, replace):
+    """Generate a conflict-free exam timetable from course enrollments."""
+    from utils import exam_slots, generate_exam_timetable
+    try:
+        room_list = [(name, int(capacity)) for name, capacity in (room.rsplit(':', 1) for room in rooms)]
+    except ValueError:
+        raise click.BadParameter('rooms must be given as NAME:CAPACITY', param_hint='--room')
+    slots = exam_slots(start_date.date(), days, slots_per_day, duration, first_start)
+    result = generate_exam_timetable(slots, room_list or None, owner_id=owner_id, replace=replace)
+    click.echo(f"Scheduled {len(result['scheduled'])} exams in {len(slots)} slots; "
+               f"{result['adjacent_conflicts']} back-to-back sittings.")
+    if result['unplaced']:
+        click.echo(f"Could not place courses: {', '.join(map(str, result['unplaced']))}")
+
+
+@app.cli.command('db-migrate')
+def db_migrate():
+    """Apply pending schema migrations."""
+    from migrations import run_migrations
+    applied = run_migrations()
+    click.echo(f"Applied {len(applied)} migrations" + (f": {', '.join(applied)}" if applied else "."))
+
+
+@app.cli.command('explain-check')
+@click.option('--min-rows', default=1000, show_default=True, help='Ignore full scans of smaller tables.')
+def explain_check(min_rows):
+    """EXPLAIN the app's hot queries and fail if any of them full-scans a large table."""
+    from query_plans import check_query_plans
+    failures = 0
+    for name, scans in check_query_plans(min_rows):
+        if scans:
+            failures += 1
+            click.echo(f"FULL SCAN  {name}: {', '.join(scans)}")
+        else:
+            click.echo(f"ok         {name}")
+    if failures:
+        raise click.ClickException(f"{failures} hot queries full-scan a large table.")
+
+
+@app.cli.command('seed-campus')
+@click.option('--students', default=50000, show_default=True)
+@click.option('--courses', default=2000, show_default=True)
+@click.option('--courses-per-student', default=5, show_default=True)
+@click.option('--assignments-per-course', default=6, show_default=True)
+@click.option('--materials-per-course', default=3, show_default=True)
+@click.option('--submission-rate', default=0.85, show_default=True, help='Share of students submitting each assignment.')
+@click.option('--essay-words', default=80, show_default=True, help='Words per submitted essay.')
+@click.option('--seed', default=42, show_default=True,
+              help='Random seed; the same seed and --today give the same campus.')
+@click.option('--today', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Date the semester is laid out around (default: the current UTC date).')
+def seed_campus_command(**options):
+    """Bulk-generate a synthetic campus for load and scale testing."""
+    import time
+    from campus_seed import seed_campus, SEED_PASSWORD
+    start = time.perf_counter()
+    counts = seed_campus(**options)
+    for table, count in counts.items():
+        click.echo(f"{table:<16} {count:>10}")
+    click.echo(f"Seeded in {time.perf_counter() - start:.1f} s; every account's password is '{SEED_PASSWORD}'.")
@@ -24,6 +24,17 @@ class Config:
     # AI service configuration
     AI_SERVICE_ENABLED = True
     NLP_MODEL_PATH = os.environ.get('NLP_MODEL_PATH', 'models/nlp_model')
+    NLTK_DATA_DIR = os.environ.get('NLTK_DATA', 'nltk_data')  # local corpora, see `flask nlp-download`
+    TEXT_MODEL_DIR = os.environ.get('TEXT_MODEL_DIR', 'instance/text_models')  # per-course TF-IDF models
+    ANALYSIS_CACHE_SIZE = int(os.environ.get('ANALYSIS_CACHE_SIZE', 1024))  # in-process analysis results
+    ADMIN_SNAPSHOT_MAX_AGE = int(os.environ.get('ADMIN_SNAPSHOT_MAX_AGE', 900))  # seconds before shown as stale
+    COURSE_ANALYTICS_CACHE_SECONDS = int(os.environ.get('COURSE_ANALYTICS_CACHE_SECONDS', 60))  # 0 disables
+    
+    # SQL profiling: statements and DB time per request, N+1 detection (see sql_profiler.py)
+    SQL_PROFILING = os.environ.get('SQL_PROFILING', 'False') == 'True'  # on in DevelopmentConfig
+    SQL_PROFILE_HEADERS = DEBUG  # X-SQL-* response headers, development only
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))  # repeats of one query shape
+    SQL_PROFILE_HISTORY = 200  # recent requests kept for /admin/system
     
     # Email configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -40,6 +51,7 @@ class Config:
 class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
+    SQL_PROFILING = True
     
 
 class TestingConfig(Config):
@@ -53,3 +65,4 @@ class ProductionConfig(Config):
     """Production configuration."""
     DEBUG = False
     TESTING = False
+    SQL_PROFILE_HEADERS = False
@@ -0,0 +1,222 @@
+import time
+import logging
+import threading
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import event
+
+from app import db
+from models import User, Course, Assignment, Submission, Grade, SubmissionStatus, course_students
+from metric_store import seconds_before_due_expression
+
+logger = logging.getLogger(__name__)
+
+GRADE_BUCKETS = ['A', 'B', 'C', 'D', 'F']
+
+# Lower edges of the D, C, B and A buckets (percent); below the first is an F
+GRADE_EDGES = [60, 70, 80, 90]
+
+# Seconds before the deadline: at or after it is late, within a day on time, earlier is early
+TIMING_EDGES = [0, 86400]
+TIMING_BUCKETS = ['late', 'ontime', 'early']
+
+_GRADED_STATUSES = [SubmissionStatus.GRADED, SubmissionStatus.RETURNED]
+
+# Per-course results: course_id -> (expires_at, analytics)
+_cache = {}
+_lock = threading.Lock()
+
+
+def _fetch(course_id):
+    """Fetch every assignment of a course with its submissions and grades, and the roster.
+
+    Returns:
+        tuple: (assignment rows, submission arrays, roster rows)
+    """
+    rows = db.session.query(
+        Assignment.id, Assignment.title, Assignment.max_score,
+        Submission.student_id, Submission.status, Grade.score
+    ).outerjoin(
+        Submission, Submission.assignment_id == Assignment.id
+    ).outerjoin(
+        Grade, Grade.submission_id == Submission.id
+    ).filter(
+        Assignment.course_id == course_id
+    ).order_by(Assignment.id).all()
+
+    roster = db.session.query(User.id, User.first_name, User.last_name).join(
+        course_students, course_students.c.user_id == User.id
+    ).filter(
+        course_students.c.course_id == course_id
+    ).order_by(User.id).all()
+
+    assignments = []
+    positions = {}
+    for row in rows:
+        if row[0] not in positions:
+            positions[row[0]] = len(assignments)
+            assignments.append((row[0], row[1]))
+
+    submitted = [row for row in rows if row.student_id is not None]
+    count = len(submitted)
+    arrays = {
+        'assignment': np.fromiter((positions[row[0]] for row in submitted), dtype=np.int64, count=count),
+        'student': np.fromiter((row.student_id for row in submitted), dtype=np.int64, count=count),
+        'graded_status': np.fromiter((row.status in _GRADED_STATUSES for row in submitted), dtype=bool, count=count),
+        'max_score': np.fromiter((row.max_score or 0 for row in submitted), dtype=float, count=count),
+        # NaN marks ungraded submissions
+        'score': np.fromiter((np.nan if row.score is None else row.score for row in submitted),
+                             dtype=float, count=count),
+    }
+    return assignments, arrays, roster
+
+
+def _bucket_case(value, edges, labels):
+    """CASE expression putting value into labels[i] for edges[i - 1] <= value < edges[i].
+
+    Bucketing in a subquery and grouping on its column keeps the GROUP BY
+    valid on databases that compare it to the select list textually.
+    """
+    return db.case(*[(value < edge, label) for edge, label in zip(edges, labels)], else_=labels[-1])
+
+
+def grade_histogram(course_id):
+    """Count the graded submissions of a course per letter grade, in the database.
+
+    Returns:
+        dict: {'A': n, ..., 'F': n}; assignments without a max score have no percentage and are skipped
+    """
+    percentage = Grade.score * 100.0 / db.func.nullif(Assignment.max_score, 0)
+    bucket = _bucket_case(percentage, GRADE_EDGES, list(reversed(GRADE_BUCKETS))).label('bucket')
+    buckets = db.session.query(bucket).select_from(Grade).join(
+        Submission, Grade.submission_id == Submission.id
+    ).join(
+        Assignment, Submission.assignment_id == Assignment.id
+    ).filter(
+        Assignment.course_id == course_id,
+        percentage.isnot(None)
+    ).subquery()
+    counts = dict(db.session.query(buckets.c.bucket, db.func.count()).group_by(buckets.c.bucket).all())
+    return {name: int(counts.get(name, 0)) for name in GRADE_BUCKETS}
+
+
+def timing_histogram(course_id):
+    """Count the submissions of a course made early, on time and late, in the database.
+
+    Returns:
+        dict: {'early': n, 'ontime': n, 'late': n}
+    """
+    seconds = seconds_before_due_expression()
+    # Same buckets as metric_store.submission_timing; late: seconds <= 0, ontime: 0 < seconds <= a day, early: more than a day before
+    bucket = db.case((seconds <= TIMING_EDGES[0], TIMING_BUCKETS[0]),
+                     (seconds <= TIMING_EDGES[1], TIMING_BUCKETS[1]),
+                     else_=TIMING_BUCKETS[2]).label('bucket')
+    buckets = db.session.query(bucket).select_from(Submission).join(
+        Assignment, Submission.assignment_id == Assignment.id
+    ).filter(
+        Assignment.course_id == course_id,
+        seconds.isnot(None)
+    ).subquery()
+    counts = dict(db.session.query(buckets.c.bucket, db.func.count()).group_by(buckets.c.bucket).all())
+    return {name: int(counts.get(name, 0)) for name in reversed(TIMING_BUCKETS)}
+
+
+def build_course_analytics(course_id):
+    """Build the faculty analytics panels of a course.
+
+    Completion and student averages come from one bulk fetch into NumPy
+    arrays; the two histograms are counted by the database.
+
+    Returns:
+        dict: 'assignment_completion' (per assignment: submissions, graded
+        submissions and completion rate over the roster), 'grade_distribution'
+        (A-F counts of graded submissions), 'student_performance' (average
+        percentage of every enrolled student, weighted by max score) and
+        'submission_timing' (early/ontime/late counts)
+    """
+    assignments, arrays, roster = _fetch(course_id)
+    student_count = len(roster)
+
+    # Completion per assignment
+    submissions = np.bincount(arrays['assignment'], minlength=len(assignments))
+    graded_submissions = np.bincount(arrays['assignment'], weights=arrays['graded_status'],
+                                     minlength=len(assignments))
+    completion = submissions / student_count * 100 if student_count else np.zeros(len(assignments))
+    assignment_completion = [{
+        'id': assignment_id,
+        'name': title,
+        'completion_rate': float(completion[i]),
+        'total_submissions': int(submissions[i]),
+        'graded_count': int(graded_submissions[i])
+    } for i, (assignment_id, title) in enumerate(assignments)]
+
+    # Per-student averages: total score over total max score of their graded submissions
+    # (the roster is sorted by id; submissions of students no longer enrolled are skipped)
+    student_ids = np.array([student.id for student in roster], dtype=np.int64)
+    rows = np.searchsorted(student_ids, arrays['student'])
+    enrolled = ~np.isnan(arrays['score']) & (rows < student_count)
+    enrolled[enrolled] &= student_ids[rows[enrolled]] == arrays['student'][enrolled]
+    score_sums = np.bincount(rows[enrolled], weights=arrays['score'][enrolled], minlength=student_count)
+    max_sums = np.bincount(rows[enrolled], weights=arrays['max_score'][enrolled], minlength=student_count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.where(max_sums > 0, score_sums / max_sums * 100, 0.0)
+    student_performance = [{
+        'id': student.id,
+        'name': f"{student.first_name} {student.last_name}",
+        'average': float(averages[i])
+    } for i, student in enumerate(roster)]
+
+    return {
+        'student_count': student_count,
+        'assignment_completion': assignment_completion,
+        'grade_distribution': grade_histogram(course_id),
+        'student_performance': student_performance,
+        'submission_timing': timing_histogram(course_id)
+    }
+
+
+def get_course_analytics(course_id, use_cache=True):
+    """Return the faculty analytics panels of a course, from the per-course cache when fresh.
+
+    Cached results live COURSE_ANALYTICS_CACHE_SECONDS (0 disables the cache)
+    and are dropped in this process whenever courses, assignments, submissions
+    or grades are committed.
+    """
+    ttl = current_app.config['COURSE_ANALYTICS_CACHE_SECONDS']
+    if use_cache and ttl > 0:
+        with _lock:
+            cached = _cache.get(course_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+    analytics = build_course_analytics(course_id)
+    if use_cache and ttl > 0:
+        with _lock:
+            _cache[course_id] = (time.monotonic() + ttl, analytics)
+    return analytics
+
+
+def clear_course_analytics_cache():
+    """Drop every cached course result."""
+    with _lock:
+        _cache.clear()
+
+
+@event.listens_for(db.session, 'before_flush')
+def _mark_changes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Course, Assignment, Submission, Grade)):
+            session.info['course_analytics_changed'] = True
+            return
+
+
+@event.listens_for(db.session, 'after_commit')
+def _clear_after_commit(session):
+    if session.info.pop('course_analytics_changed', False):
+        clear_course_analytics_cache()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_changes(session):
+    session.info.pop('course_analytics_changed', None)
@@ -0,0 +1,193 @@
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app import db
+from models import Course, Schedule, course_students
+from recurrence import schedule_occurrences
+
+logger = logging.getLogger(__name__)
+
+# Busy time is kept as one bit per 15-minute slot of a Monday-to-Sunday week:
+# SLOTS_PER_WEEK bits, packed into WEEK_BYTES bytes per user
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY
+WEEK_BYTES = SLOTS_PER_WEEK // 8
+
+# Hours (start inclusive, end exclusive) in which meetings are suggested
+WORKING_HOURS = (8, 20)
+
+_SLOT = timedelta(minutes=SLOT_MINUTES)
+
+
+def week_start_of(value):
+    """Return midnight of the Monday of the week containing `value`."""
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    return (value - timedelta(days=value.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _paint(row, start, end, week_start):
+    """Mark the slots of row covered by [start, end), clipped to the week."""
+    first = max(0, (start - week_start) // _SLOT)
+    last = min(SLOTS_PER_WEEK, -((week_start - end) // _SLOT))  # ceiling division
+    if first < last:
+        row[first:last] = True
+
+
+def week_starts_between(start_date, end_date):
+    """Return the Monday of every week overlapping [start_date, end_date)."""
+    weeks = []
+    week_start = week_start_of(start_date)
+    while week_start < end_date:
+        weeks.append(week_start)
+        week_start += timedelta(days=7)
+    return weeks
+
+
+def busy_bitmaps_by_week(user_ids, week_starts):
+    """Return the busy bitsets of users for several weeks, from one set of queries.
+
+    A user is busy during their personal events and the events of every
+    course they take or teach. Course calendars are painted once and shared
+    by all their members.
+
+    Returns:
+        dict: week start -> numpy uint8 array of shape (len(user_ids), WEEK_BYTES),
+        one packed bitset per user in the order given (see np.unpackbits)
+    """
+    user_ids = list(user_ids)
+    week_starts = sorted({week_start_of(week_start) for week_start in week_starts})
+    if not week_starts:
+        return {}
+    rows = {user_id: i for i, user_id in enumerate(user_ids)}
+
+    # Course memberships of every user, as students or as faculty
+    memberships = db.session.query(course_students.c.user_id, course_students.c.course_id).filter(
+        course_students.c.user_id.in_(user_ids)
+    ).all()
+    memberships += db.session.query(Course.faculty_id, Course.id).filter(Course.faculty_id.in_(user_ids)).all()
+    course_ids = sorted({course_id for _, course_id in memberships})
+    columns = {course_id: j for j, course_id in enumerate(course_ids)}
+
+    schedules = Schedule.query.filter(
+        ((Schedule.course_id.is_(None)) & (Schedule.owner_id.in_(user_ids))) |
+        (Schedule.course_id.in_(course_ids)),
+        Schedule.overlapping(week_starts[0], week_starts[-1] + timedelta(days=7))
+    ).all()
+    course_end_dates = dict(db.session.query(Course.id, Course.end_date).filter(
+        Course.id.in_({schedule.course_id for schedule in schedules if schedule.is_recurring and schedule.course_id})
+    ).all())
+
+    # Users x courses membership, used to OR course calendars into personal ones in a single product
+    membership = np.zeros((len(user_ids), len(course_ids)), dtype=np.uint16)
+    for user_id, course_id in memberships:
+        membership[rows[user_id], columns[course_id]] = 1
+
+    bitmaps = {}
+    for week_start in week_starts:
+        week_end = week_start + timedelta(days=7)
+        personal = np.zeros((len(user_ids), SLOTS_PER_WEEK), dtype=bool)
+        course_busy = np.zeros((len(course_ids), SLOTS_PER_WEEK), dtype=bool)
+        for schedule in schedules:
+            row = course_busy[columns[schedule.course_id]] if schedule.course_id else personal[rows[schedule.owner_id]]
+            for start, end in schedule_occurrences(schedule, week_start, week_end,
+                                                   course_end_dates.get(schedule.course_id)):
+                _paint(row, start, end, week_start)
+        busy = personal | ((membership @ course_busy.astype(np.uint16)) > 0)
+        bitmaps[week_start] = np.packbits(busy, axis=1)
+    return bitmaps
+
+
+def busy_bitmaps(user_ids, week_start):
+    """Return the busy bitsets of users for one week (see busy_bitmaps_by_week).
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (len(user_ids), WEEK_BYTES)
+    """
+    week_start = week_start_of(week_start)
+    return busy_bitmaps_by_week(user_ids, [week_start])[week_start]
+
+
+def working_mask(hours=WORKING_HOURS, weekdays_only=False):
+    """Return a boolean mask of the week's slots inside working hours."""
+    day = np.zeros(SLOTS_PER_DAY, dtype=bool)
+    day[hours[0] * 60 // SLOT_MINUTES:hours[1] * 60 // SLOT_MINUTES] = True
+    days = [day if not weekdays_only or weekday < 5 else np.zeros_like(day) for weekday in range(7)]
+    return np.concatenate(days)
+
+
+def common_free_slots(bitmaps, week_start, min_minutes=60, hours=WORKING_HOURS, weekdays_only=False):
+    """Return the (start, end) intervals of a week in which every bitset is free.
+
+    Only intervals of at least `min_minutes` inside working hours are returned.
+    """
+    week_start = week_start_of(week_start)
+    busy = np.unpackbits(np.bitwise_or.reduce(bitmaps, axis=0), count=SLOTS_PER_WEEK).astype(bool) \
+        if len(bitmaps) else np.zeros(SLOTS_PER_WEEK, dtype=bool)
+    free = ~busy & working_mask(hours, weekdays_only)
+
+    # Run boundaries of the free mask
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], free.view(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2]
+    keep = (ends - starts) * SLOT_MINUTES >= min_minutes
+    return [(week_start + int(start) * _SLOT, week_start + int(end) * _SLOT)
+            for start, end in zip(starts[keep], ends[keep])]
+
+
+def find_meeting_times(user_ids, start_date, end_date, duration_minutes=60, limit=3,
+                       hours=WORKING_HOURS, weekdays_only=False, one_per_day=True, bitmaps=None):
+    """Suggest meeting times for a group of users between two dates.
+
+    Every start time is scored by how many users are free for the whole
+    meeting; the best, earliest and non-overlapping ones are returned.
+    `bitmaps` may hold the users' busy_bitmaps_by_week for the range, so
+    callers ranking several groups load them only once.
+
+    Returns:
+        list: dicts with 'start', 'end', 'free' (users free throughout) and 'total'
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return []
+    start_date = start_date if isinstance(start_date, datetime) else datetime.combine(start_date, datetime.min.time())
+    end_date = end_date if isinstance(end_date, datetime) else datetime.combine(end_date, datetime.min.time())
+    length = max(1, -(-duration_minutes // SLOT_MINUTES))
+
+    week_starts = week_starts_between(start_date, end_date)
+    if bitmaps is None:
+        bitmaps = busy_bitmaps_by_week(user_ids, week_starts)
+
+    candidates = []
+    for week_start in week_starts:
+        busy = np.unpackbits(bitmaps[week_start], axis=1, count=SLOTS_PER_WEEK)
+        # Outside working hours counts as busy for everyone
+        busy |= ~working_mask(hours, weekdays_only)
+
+        # Busy slots of each user in every window of `length` slots, from a running sum
+        running = np.concatenate((np.zeros((len(user_ids), 1), dtype=np.int32),
+                                  np.cumsum(busy, axis=1, dtype=np.int32)), axis=1)
+        free = ((running[:, length:] - running[:, :-length]) == 0).sum(axis=0)
+
+        for slot in np.flatnonzero(free):
+            start = week_start + int(slot) * _SLOT
+            end = start + timedelta(minutes=duration_minutes)
+            if start < start_date or end > end_date or start.date() != (end - _SLOT).date():
+                continue
+            candidates.append((-int(free[slot]), start, end))
+
+    suggestions = []
+    days = set()
+    for negative_free, start, end in sorted(candidates):
+        if one_per_day and start.date() in days:
+            continue
+        if any(start < other['end'] and end > other['start'] for other in suggestions):
+            continue
+        suggestions.append({'start': start, 'end': end, 'free': -negative_free, 'total': len(user_ids)})
+        days.add(start.date())
+        if len(suggestions) == limit:
+            break
+    suggestions.sort(key=lambda suggestion: suggestion['start'])
+    return suggestions
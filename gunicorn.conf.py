@@ -0,0 +1,24 @@
+# Gunicorn configuration, e.g. `gunicorn main:app`
+bind = "0.0.0.0:5000"
+
+# Import the app once in the master process; forked workers then share its
+# memory (including the NLP corpora loaded below) copy-on-write
+preload_app = True
+
+
+def when_ready(server):
+    """Load the NLP resources in the master, before the workers are forked."""
+    import nlp_resources
+    nlp_resources.warm_up()
+    server.log.info("NLP resources preloaded")
+
+
+def post_fork(server, worker):
+    """Give each worker its own database connections.
+
+    Connections opened in the master (e.g. by migrations at import) must not
+    be shared across processes; close=False leaves the master's sockets alone.
+    """
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,344 @@
+import logging
+from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm.base import NO_VALUE
+
+from app import db
+from models import Analytics, Assignment, Submission, Grade
+
+logger = logging.getLogger(__name__)
+
+# Marker row stored per course once its metrics have been materialized
+MATERIALIZED_MARKER = '_materialized'
+
+# Running sums/counts kept for every (course, student) pair
+COUNTER_METRICS = [
+    'submission_count',
+    'graded_count',
+    'score_sum',
+    'max_score_sum',
+    'score_pct_sum',
+    'timing_early',
+    'timing_ontime',
+    'timing_late',
+]
+
+def submission_timing(submission_date, due_date):
+    """Classify a submission as early (>24h before due), ontime or late."""
+    seconds_before_due = (due_date - submission_date).total_seconds()
+    if seconds_before_due > 86400:
+        return 'early'
+    elif seconds_before_due > 0:
+        return 'ontime'
+    return 'late'
+
+
+def _empty_metrics():
+    return {name: 0.0 for name in COUNTER_METRICS}
+
+
+def _derive(metrics):
+    """Add the averages and timing counts derived from the stored sums."""
+    graded = metrics.get('graded_count', 0)
+    max_total = metrics.get('max_score_sum', 0)
+    metrics['average_percentage'] = (metrics['score_sum'] / max_total) * 100 if max_total else 0
+    metrics['mean_percentage'] = metrics['score_pct_sum'] / graded if graded else None
+    metrics['submission_timing'] = {
+        'early': int(metrics['timing_early']),
+        'ontime': int(metrics['timing_ontime']),
+        'late': int(metrics['timing_late'])
+    }
+    return metrics
+
+
+def seconds_before_due_expression():
+    """SQL expression of the seconds between a submission and its assignment's deadline.
+
+    SQLite has no interval type, so timestamps are compared as Julian days there.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return (db.func.julianday(Assignment.due_date) - db.func.julianday(Submission.submission_date)) * 86400
+    if dialect in ('mysql', 'mariadb'):
+        return db.func.timestampdiff(db.text('SECOND'), Submission.submission_date, Assignment.due_date)
+    return db.func.extract('epoch', Assignment.due_date - Submission.submission_date)
+
+
+def _upsert(session, rows, accumulate=False):
+    """Insert metric rows; where one exists, replace its value (or add to it, with accumulate).
+
+    Relies on the unique Analytics indexes, so concurrent writers never
+    duplicate a row.
+    """
+    table = Analytics.__table__
+    dialect = session.get_bind().dialect.name
+    for course_level in (False, True):
+        group = [row for row in rows if (row['user_id'] is None) == course_level]
+        if not group:
+            continue
+        if dialect in ('mysql', 'mariadb'):
+            from sqlalchemy.dialects.mysql import insert as mysql_insert
+            statement = mysql_insert(table)
+            value = statement.inserted.metric_value
+            if accumulate:
+                value = table.c.metric_value + value
+            statement = statement.on_duplicate_key_update(metric_value=value,
+                                                          computed_at=statement.inserted.computed_at)
+        else:
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            statement = dialect_insert(table)
+            value = statement.excluded.metric_value
+            if accumulate:
+                value = db.func.coalesce(table.c.metric_value, 0.0) + value
+            if course_level:
+                target = {'index_elements': ['course_id', 'metric_name'],
+                          'index_where': table.c.user_id.is_(None)}
+            else:
+                target = {'index_elements': ['course_id', 'user_id', 'metric_name']}
+            statement = statement.on_conflict_do_update(
+                set_={'metric_value': value, 'computed_at': statement.excluded.computed_at}, **target
+            )
+        session.execute(statement, group)
+
+
+def rebuild_course_metrics(course_id, commit=True):
+    """Recompute and persist all aggregates of a course from the raw rows."""
+    percentage = Grade.score * 100.0 / db.func.nullif(Assignment.max_score, 0)
+    seconds_before_due = seconds_before_due_expression()
+
+    def count_when(condition):
+        return db.func.sum(db.case((condition, 1), else_=0))
+
+    rows = db.session.query(
+        Submission.student_id,
+        db.func.count(Submission.id).label('submission_count'),
+        db.func.count(Grade.id).label('graded_count'),
+        db.func.sum(Grade.score).label('score_sum'),
+        db.func.sum(db.case((Grade.id.isnot(None), Assignment.max_score), else_=0)).label('max_score_sum'),
+        db.func.sum(percentage).label('score_pct_sum'),
+        count_when(seconds_before_due > 86400).label('timing_early'),
+        count_when((seconds_before_due > 0) & (seconds_before_due <= 86400)).label('timing_ontime'),
+        count_when(seconds_before_due <= 0).label('timing_late')
+    ).join(Assignment, Submission.assignment_id == Assignment.id).outerjoin(
+        Grade, Grade.submission_id == Submission.id
+    ).filter(
+        Assignment.course_id == course_id
+    ).group_by(Submission.student_id).all()
+
+    Analytics.query.filter_by(course_id=course_id).delete(synchronize_session=False)
+
+    now = datetime.utcnow()
+    records = [{'user_id': row.student_id, 'course_id': course_id, 'metric_name': name,
+                'metric_value': float(getattr(row, name) or 0), 'computed_at': now}
+               for row in rows for name in COUNTER_METRICS]
+    records.append({'user_id': None, 'course_id': course_id,
+                    'metric_name': MATERIALIZED_MARKER, 'metric_value': 1.0, 'computed_at': now})
+
+    # One executemany instead of an INSERT per metric row; a concurrent rebuild's rows are overwritten
+    _upsert(db.session, records)
+
+    if commit:
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error materializing metrics for course {course_id}: {e}")
+
+
+def ensure_materialized(course_ids):
+    """Materialize the metrics of any of the given courses not yet in the store."""
+    course_ids = list(course_ids)
+    if not course_ids:
+        return
+    materialized = {
+        row.course_id for row in db.session.query(Analytics.course_id).filter(
+            Analytics.course_id.in_(course_ids),
+            Analytics.user_id.is_(None),
+            Analytics.metric_name == MATERIALIZED_MARKER
+        )
+    }
+    missing = [course_id for course_id in course_ids if course_id not in materialized]
+    for course_id in missing:
+        rebuild_course_metrics(course_id, commit=False)
+    if missing:
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error materializing course metrics: {e}")
+
+
+def get_student_course_metrics(student_id, course_ids):
+    """Return {course_id: aggregates} of one student for the given courses."""
+    course_ids = list(course_ids)
+    ensure_materialized(course_ids)
+    per_course = {course_id: _empty_metrics() for course_id in course_ids}
+    if course_ids:
+        for row in Analytics.query.filter(
+            Analytics.user_id == student_id,
+            Analytics.course_id.in_(course_ids)
+        ):
+            per_course[row.course_id][row.metric_name] = row.metric_value
+    return {course_id: _derive(metrics) for course_id, metrics in per_course.items()}
+
+
+# Incremental maintenance on grade and submission events
+
+def _add(deltas, course_id, student_id, name, value):
+    if value:
+        deltas.setdefault((course_id, student_id), {}).setdefault(name, 0.0)
+        deltas[(course_id, student_id)][name] += value
+
+
+def _add_grade(deltas, course_id, student_id, score, max_score, sign):
+    _add(deltas, course_id, student_id, 'graded_count', sign)
+    _add(deltas, course_id, student_id, 'score_sum', sign * score)
+    _add(deltas, course_id, student_id, 'max_score_sum', sign * (max_score or 0))
+    if max_score:
+        _add(deltas, course_id, student_id, 'score_pct_sum', sign * (score / max_score * 100))
+
+
+def _add_submission(deltas, course_id, student_id, submission_date, due_date, sign):
+    _add(deltas, course_id, student_id, 'submission_count', sign)
+    if submission_date and due_date:
+        _add(deltas, course_id, student_id, f'timing_{submission_timing(submission_date, due_date)}', sign)
+
+
+def _assignment_of(session, submission):
+    if submission.assignment_id is not None:
+        return session.get(Assignment, submission.assignment_id)
+    return submission.assignment
+
+
+def _submission_of(session, grade):
+    if grade.submission_id is not None:
+        return session.get(Submission, grade.submission_id)
+    return grade.submission
+
+
+def _changed(obj, attribute):
+    return inspect(obj).attrs[attribute].history.has_changes()
+
+
+def _old_value(obj, attribute):
+    """Return the pre-change value of an attribute, or NO_VALUE if it was never loaded."""
+    history = inspect(obj).attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        return NO_VALUE
+    return getattr(obj, attribute)
+
+
+def _collect_deltas(session):
+    deltas = {}
+    invalidated = set()
+
+    for obj in session.new:
+        if isinstance(obj, Submission):
+            assignment = _assignment_of(session, obj)
+            if assignment:
+                _add_submission(deltas, assignment.course_id, obj.student_id,
+                                obj.submission_date or datetime.utcnow(), assignment.due_date, 1)
+        elif isinstance(obj, Grade):
+            submission = _submission_of(session, obj)
+            if submission:
+                assignment = _assignment_of(session, submission)
+                _add_grade(deltas, assignment.course_id, submission.student_id,
+                           obj.score, assignment.max_score, 1)
+
+    for obj in session.dirty:
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        if isinstance(obj, Submission):
+            if _changed(obj, 'submission_date'):
+                assignment = _assignment_of(session, obj)
+                old_date = _old_value(obj, 'submission_date')
+                if old_date is NO_VALUE:
+                    invalidated.add(assignment.course_id)
+                    continue
+                _add_submission(deltas, assignment.course_id, obj.student_id, old_date, assignment.due_date, -1)
+                _add_submission(deltas, assignment.course_id, obj.student_id, obj.submission_date, assignment.due_date, 1)
+        elif isinstance(obj, Grade):
+            if _changed(obj, 'score'):
+                submission = _submission_of(session, obj)
+                assignment = _assignment_of(session, submission)
+                old_score = _old_value(obj, 'score')
+                if old_score is NO_VALUE:
+                    invalidated.add(assignment.course_id)
+                    continue
+                _add_grade(deltas, assignment.course_id, submission.student_id,
+                           old_score, assignment.max_score, -1)
+                _add_grade(deltas, assignment.course_id, submission.student_id,
+                           obj.score, assignment.max_score, 1)
+        elif isinstance(obj, Assignment):
+            # Structural changes are cheaper to recompute than to patch
+            if any(_changed(obj, attribute) for attribute in ('max_score', 'due_date', 'course_id')):
+                invalidated.add(obj.course_id)
+                old_course_id = _old_value(obj, 'course_id')
+                if old_course_id is not NO_VALUE:
+                    invalidated.add(old_course_id)
+
+    for obj in session.deleted:
+        if isinstance(obj, Submission):
+            assignment = _assignment_of(session, obj)
+            if assignment:
+                _add_submission(deltas, assignment.course_id, obj.student_id,
+                                obj.submission_date, assignment.due_date, -1)
+        elif isinstance(obj, Grade):
+            submission = _submission_of(session, obj)
+            if submission:
+                assignment = _assignment_of(session, submission)
+                _add_grade(deltas, assignment.course_id, submission.student_id,
+                           obj.score, assignment.max_score, -1)
+        elif isinstance(obj, Assignment):
+            invalidated.add(obj.course_id)
+
+    return deltas, invalidated
+
+
+def _apply_deltas(session, deltas, invalidated):
+    course_ids = {course_id for course_id, _ in deltas} - invalidated
+    if invalidated:
+        session.query(Analytics).filter(
+            Analytics.course_id.in_(invalidated)
+        ).delete(synchronize_session=False)
+    if not course_ids:
+        return
+
+    # Only courses already in the store are patched; others materialize on first read
+    materialized = {
+        row.course_id for row in session.query(Analytics.course_id).filter(
+            Analytics.course_id.in_(course_ids),
+            Analytics.user_id.is_(None),
+            Analytics.metric_name == MATERIALIZED_MARKER
+        )
+    }
+    if not materialized:
+        return
+
+    # Each counter is bumped in place by one upsert, so concurrent flushes cannot lose
+    # increments or insert the same row twice
+    now = datetime.utcnow()
+    _upsert(session, [
+        {'user_id': student_id, 'course_id': course_id, 'metric_name': name,
+         'metric_value': value, 'computed_at': now}
+        for (course_id, student_id), metrics in deltas.items() if course_id in materialized
+        for name, value in metrics.items()
+    ], accumulate=True)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _update_metrics_before_flush(session, flush_context, instances):
+    """Keep the materialized metrics in step with grade and submission changes.
+
+    Errors propagate and fail the flush, so the metrics never drift from the
+    rows they summarize.
+    """
+    with session.no_autoflush:
+        deltas, invalidated = _collect_deltas(session)
+        if deltas or invalidated:
+            _apply_deltas(session, deltas, invalidated)
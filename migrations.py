@@ -0,0 +1,139 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import inspect, insert, text
+
+from app import db
+from models import SchemaMigration
+
+logger = logging.getLogger(__name__)
+
+
+def _create_indexes(connection, names):
+    """Create the named indexes declared on the models, skipping existing ones."""
+    existing = set()
+    inspector = inspect(connection)
+    for table in db.metadata.sorted_tables:
+        if inspector.has_table(table.name):
+            existing.update(index['name'] for index in inspector.get_indexes(table.name))
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in names and index.name not in existing:
+                index.create(connection)
+                logger.info(f"Created index {index.name}")
+
+
+def add_schedule_and_analytics_indexes(connection):
+    """Indexes added to tables that existed before migrations were introduced."""
+    _create_indexes(connection, {
+        'ix_analytics_course_user_metric',
+        'ix_analytics_user_course',
+        'ix_schedule_start_end',
+        'ix_schedule_course_start',
+        'ix_schedule_owner_start',
+        'ix_schedule_recurring_start',
+    })
+
+
+def add_hot_query_indexes(connection):
+    """Foreign-key and filter indexes matched to the route queries (see query_plans.py)."""
+    _create_indexes(connection, {
+        'ix_user_role_id',
+        'ix_course_faculty_id',
+        'ix_course_students_user',
+        'ix_assignment_course_due',
+        'ix_assignment_course_status_due',
+        'ix_submission_assignment_student',
+        'ix_submission_assignment_status',
+        'ix_submission_student_date',
+        'ix_grade_graded_at',
+        'ix_material_course_created',
+    })
+
+
+def _add_column(connection, table, column, definition):
+    """Add a column to an existing table, skipping it if already there."""
+    inspector = inspect(connection)
+    if not inspector.has_table(table):
+        return
+    if column not in {existing['name'] for existing in inspector.get_columns(table)}:
+        connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {definition}'))
+        logger.info(f"Added column {table}.{column}")
+
+
+def add_analysis_job_claimed_at(connection):
+    """Lease column that lets workers reclaim jobs left running by a dead worker."""
+    _add_column(connection, 'analysis_job', 'claimed_at', 'TIMESTAMP')
+
+
+def add_user_calendar_feed_version(connection):
+    """Per-user version signed into calendar feed tokens, so leaked URLs can be revoked."""
+    _add_column(connection, 'user', 'calendar_feed_version', 'INTEGER NOT NULL DEFAULT 0')
+
+
+def make_analytics_metrics_unique(connection):
+    """Unique metric indexes, so concurrent materializations cannot duplicate counters."""
+    inspector = inspect(connection)
+    if not inspector.has_table('analytics'):
+        return
+    # Courses holding duplicate rows are dropped whole; metric_store rebuilds them on next read
+    duplicated = text(
+        'SELECT course_id FROM analytics GROUP BY course_id, user_id, metric_name HAVING COUNT(*) > 1 '
+        'UNION SELECT course_id FROM analytics WHERE user_id IS NULL '
+        'GROUP BY course_id, metric_name HAVING COUNT(*) > 1'
+    )
+    connection.execute(text(f'DELETE FROM analytics WHERE course_id IN ({duplicated.text})'))
+
+    for index in inspector.get_indexes('analytics'):
+        if index['name'] == 'ix_analytics_course_user_metric' and not index['unique']:
+            connection.execute(text('DROP INDEX ix_analytics_course_user_metric'
+                                    + (' ON analytics' if connection.dialect.name in ('mysql', 'mariadb') else '')))
+            logger.info("Dropped non-unique index ix_analytics_course_user_metric")
+    _create_indexes(connection, {'ix_analytics_course_user_metric', 'uq_analytics_course_metric'})
+
+
+# Applied in order; ids must never change once released
+MIGRATIONS = [
+    ('0001_schedule_and_analytics_indexes', add_schedule_and_analytics_indexes),
+    ('0002_hot_query_indexes', add_hot_query_indexes),
+    ('0003_analysis_job_claimed_at', add_analysis_job_claimed_at),
+    ('0004_user_calendar_feed_version', add_user_calendar_feed_version),
+    ('0005_unique_analytics_metrics', make_analytics_metrics_unique),
+]
+
+
+def applied_migrations():
+    """Return the ids of the migrations already applied."""
+    return {migration_id for migration_id, in db.session.query(SchemaMigration.id)}
+
+
+def pending_migrations():
+    """Return the ids of the migrations not yet applied, in order."""
+    applied = applied_migrations()
+    return [migration_id for migration_id, _ in MIGRATIONS if migration_id not in applied]
+
+
+def run_migrations():
+    """Apply pending migrations, each in its own transaction; returns the ids applied.
+
+    db.create_all() creates new tables with all their indexes, so migrations
+    only need to bring existing tables up to date and must be idempotent.
+    """
+    applied = applied_migrations()
+    db.session.commit()  # release the read before DDL runs on other connections
+
+    done = []
+    for migration_id, migrate in MIGRATIONS:
+        if migration_id in applied:
+            continue
+        try:
+            with db.engine.begin() as connection:
+                migrate(connection)
+                connection.execute(insert(SchemaMigration).values(id=migration_id, applied_at=datetime.utcnow()))
+        except Exception as e:
+            logger.error(f"Error applying migration {migration_id}: {e}")
+            raise
+        logger.info(f"Applied migration {migration_id}")
+        done.append(migration_id)
+    return done
@@ -25,10 +25,18 @@ class SubmissionStatus(enum.Enum):
     GRADED = "graded"
     RETURNED = "returned"
 
+class AnalysisJobStatus(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
 # Association tables for many-to-many relationships
 course_students = db.Table('course_students',
     db.Column('course_id', db.Integer, db.ForeignKey('course.id'), primary_key=True),
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    # The primary key serves rosters; this serves a student's courses
+    db.Index('ix_course_students_user', 'user_id', 'course_id')
 )
 
 # Role model
@@ -50,10 +58,11 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(256), nullable=False)
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
-    role_id = db.Column(db.Integer, db.ForeignKey('role.id'), nullable=False)
+    role_id = db.Column(db.Integer, db.ForeignKey('role.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    calendar_feed_version = db.Column(db.Integer, default=0, nullable=False)  # bumped to revoke feed URLs
     
     # Relationships
     taught_courses = db.relationship('Course', backref='faculty', lazy=True, 
@@ -91,7 +100,7 @@ class Course(db.Model):
     code = db.Column(db.String(20), unique=True, nullable=False)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    faculty_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    faculty_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     start_date = db.Column(db.Date)
     end_date = db.Column(db.Date)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -123,6 +132,11 @@ class Assignment(db.Model):
     # Relationships
     submissions = db.relationship('Submission', backref='assignment', lazy=True)
     
+    __table_args__ = (
+        db.Index('ix_assignment_course_due', 'course_id', 'due_date'),
+        db.Index('ix_assignment_course_status_due', 'course_id', 'status', 'due_date'),
+    )
+    
     def __repr__(self):
         return f'<Assignment {self.title} for {self.course.code}>'
 
@@ -140,6 +154,12 @@ class Submission(db.Model):
     # Relationships
     grade = db.relationship('Grade', backref='submission', uselist=False, lazy=True)
     
+    __table_args__ = (
+        db.Index('ix_submission_assignment_student', 'assignment_id', 'student_id'),
+        db.Index('ix_submission_assignment_status', 'assignment_id', 'status'),
+        db.Index('ix_submission_student_date', 'student_id', 'submission_date'),
+    )
+    
     def is_late(self):
         return self.submission_date > self.assignment.due_date
     
@@ -153,7 +173,7 @@ class Grade(db.Model):
     score = db.Column(db.Float, nullable=False)
     feedback = db.Column(db.Text)
     graded_by = db.Column(db.Integer, db.ForeignKey('user.id'))
-    graded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    graded_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # AI-related fields
@@ -184,6 +204,10 @@ class Material(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_visible = db.Column(db.Boolean, default=True)
     
+    __table_args__ = (
+        db.Index('ix_material_course_created', 'course_id', 'created_at'),
+    )
+    
     def __repr__(self):
         return f'<Material {self.title} for {self.course.code}>'
 
@@ -202,6 +226,23 @@ class Schedule(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_schedule_start_end', 'start_time', 'end_time'),
+        db.Index('ix_schedule_course_start', 'course_id', 'start_time'),
+        db.Index('ix_schedule_owner_start', 'owner_id', 'start_time'),
+        db.Index('ix_schedule_recurring_start', 'is_recurring', 'start_time'),
+    )
+    
+    @classmethod
+    def overlapping(cls, window_start, window_end):
+        """Filter for rows overlapping the half-open window [window_start, window_end).
+        
+        Recurring rows that start before the window end are included too, as
+        their later occurrences may fall inside it (see recurrence.py).
+        """
+        return ((cls.start_time < window_end) & (cls.end_time > window_start)) | \
+               ((cls.is_recurring == True) & (cls.start_time < window_end))
+    
     def __repr__(self):
         return f'<Schedule {self.title} at {self.start_time}>'
 
@@ -217,9 +258,92 @@ class Analytics(db.Model):
     user = db.relationship('User')
     course = db.relationship('Course')
     
+    __table_args__ = (
+        # Unique, so concurrent materializations upsert instead of duplicating counters
+        db.Index('ix_analytics_course_user_metric', 'course_id', 'user_id', 'metric_name', unique=True),
+        db.Index('ix_analytics_user_course', 'user_id', 'course_id'),
+        # NULLs never collide in the index above; course-level rows (user_id NULL) get
+        # a partial one where the database supports it
+        db.Index('uq_analytics_course_metric', 'course_id', 'metric_name', unique=True,
+                 postgresql_where=db.text('user_id IS NULL'),
+                 sqlite_where=db.text('user_id IS NULL')).ddl_if(dialect=('postgresql', 'sqlite')),
+    )
+    
     def __repr__(self):
         return f'<Analytics {self.metric_name}={self.metric_value} for user {self.user_id}>'
 
+# Queued AI analysis of a submission, processed by the background worker
+class AnalysisJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), nullable=False, unique=True)
+    status = db.Column(Enum(AnalysisJobStatus), default=AnalysisJobStatus.PENDING, nullable=False, index=True)
+    attempts = db.Column(db.Integer, default=0)
+    result = db.Column(db.Text)  # JSON-encoded analyze_submission result
+    error = db.Column(db.Text)
+    requested_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    claimed_at = db.Column(db.DateTime)  # start of the running worker's lease
+    finished_at = db.Column(db.DateTime)
+    
+    submission = db.relationship('Submission', backref=db.backref('analysis_job', uselist=False))
+    
+    def __repr__(self):
+        return f'<AnalysisJob {self.status.value} for {self.submission_id}>'
+
+# Cached analyze_submission result, keyed on a hash of its inputs and the analyzer version
+class AnalysisCacheEntry(db.Model):
+    key = db.Column(db.String(64), primary_key=True)
+    analyzer_version = db.Column(db.String(20), nullable=False, index=True)
+    result = db.Column(db.Text, nullable=False)  # JSON-encoded analysis
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AnalysisCacheEntry {self.key[:12]} v{self.analyzer_version}>'
+
+# MinHash signature of a submission's content, used to find near-duplicate submissions
+class SubmissionSignature(db.Model):
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), primary_key=True)
+    content_hash = db.Column(db.String(40), nullable=False)  # SHA-1 of the signed content
+    signature = db.Column(db.LargeBinary, nullable=False)  # uint32 MinHash values
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    submission = db.relationship('Submission', backref=db.backref('signature', uselist=False))
+    
+    def __repr__(self):
+        return f'<SubmissionSignature for {self.submission_id}>'
+
+# LSH band buckets of the signatures; submissions sharing a bucket are candidate near-duplicates
+class SubmissionLshBucket(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), nullable=False, index=True)
+    band = db.Column(db.Integer, nullable=False)
+    bucket = db.Column(db.BigInteger, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_lsh_band_bucket', 'band', 'bucket'),
+    )
+    
+    def __repr__(self):
+        return f'<SubmissionLshBucket {self.band}:{self.bucket} for {self.submission_id}>'
+
+# Schema migrations applied to this database (see migrations.py)
+class SchemaMigration(db.Model):
+    id = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SchemaMigration {self.id}>'
+
+# Precomputed admin dashboard metrics, refreshed periodically (see admin_snapshot.py)
+class AdminSnapshot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    duration_ms = db.Column(db.Float)  # time taken to compute the metrics
+    data = db.Column(db.Text, nullable=False)  # JSON-encoded metrics
+    
+    def __repr__(self):
+        return f'<AdminSnapshot {self.computed_at}>'
+
 # Functions to create default data
 def create_default_roles():
     """Create default roles if they don't exist."""
@@ -0,0 +1,152 @@
+import os
+import logging
+import threading
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# NLTK resources used by ai_services: name -> (nltk.data path, download package)
+RESOURCES = {
+    'stopwords': ('corpora/stopwords', 'stopwords'),
+    'wordnet': ('corpora/wordnet', 'wordnet'),
+}
+
+# Used when the stopwords corpus is not installed
+FALLBACK_STOP_WORDS = frozenset([
+    'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', 'your', 'yours',
+    'yourself', 'yourselves', 'he', 'him', 'his', 'himself', 'she', 'her', 'hers',
+    'herself', 'it', 'its', 'itself', 'they', 'them', 'their', 'theirs', 'themselves',
+    'what', 'which', 'who', 'whom', 'this', 'that', 'these', 'those', 'am', 'is', 'are',
+    'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having', 'do', 'does',
+    'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if', 'or', 'because', 'as', 'until',
+    'while', 'of', 'at', 'by', 'for', 'with', 'about', 'against', 'between', 'into',
+    'through', 'during', 'before', 'after', 'above', 'below', 'to', 'from', 'up', 'down',
+    'in', 'out', 'on', 'off', 'over', 'under', 'again', 'further', 'then', 'once', 'here',
+    'there', 'when', 'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more',
+    'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so',
+    'than', 'too', 'very', 's', 't', 'can', 'will', 'just', 'don', 'should', 'now'
+])
+
+# Distinct tokens whose normalized form is memoized; vocabulary is Zipfian,
+# so a bounded cache covers almost every token of a typical submission
+TOKEN_CACHE_SIZE = 50000
+
+_lock = threading.RLock()
+_loaded = {}
+
+
+def data_dir():
+    """Return the absolute path of the local NLTK data directory."""
+    path = Config.NLTK_DATA_DIR
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    return path
+
+
+def _nltk():
+    """Import nltk (slow) and point it at the local data directory."""
+    import nltk
+    path = data_dir()
+    if path not in nltk.data.path:
+        nltk.data.path.insert(0, path)
+    return nltk
+
+
+def _available(nltk, name):
+    try:
+        nltk.data.find(RESOURCES[name][0])
+        return True
+    except LookupError:
+        logger.warning(f"NLTK resource '{RESOURCES[name][1]}' not found in {data_dir()}; "
+                       f"using a fallback (run 'flask nlp-download' to install it)")
+        return False
+
+
+def _get(name, loader):
+    # Loaded once per process, on first use
+    value = _loaded.get(name)
+    if value is None:
+        with _lock:
+            if name not in _loaded:
+                _loaded[name] = loader()
+            value = _loaded[name]
+    return value
+
+
+def _load_stop_words():
+    nltk = _nltk()
+    if _available(nltk, 'stopwords'):
+        from nltk.corpus import stopwords
+        return frozenset(stopwords.words('english'))
+    return FALLBACK_STOP_WORDS
+
+
+def _load_lemmatizer():
+    nltk = _nltk()
+    if _available(nltk, 'wordnet'):
+        from nltk.stem import WordNetLemmatizer
+        lemmatizer = WordNetLemmatizer()
+        try:
+            # WordNet is itself loaded lazily; force it now
+            lemmatizer.lemmatize('warmup')
+            return lemmatizer.lemmatize
+        except Exception as e:
+            logger.warning(f"Could not load WordNet: {e}")
+    return lambda token: token
+
+
+def get_stop_words():
+    """Return the set of English stop words."""
+    return _get('stopwords', _load_stop_words)
+
+
+def get_lemmatizer():
+    """Return the token lemmatizer function."""
+    return _get('lemmatizer', _load_lemmatizer)
+
+
+def _load_token_normalizer():
+    stop_words = get_stop_words()
+    lemmatize = get_lemmatizer()
+    cache = {}
+
+    def normalize(tokens):
+        lemmas = list(map(cache.get, tokens))
+        if None in lemmas:
+            # Crude bound; the frequent tokens are back in the cache within a few texts
+            if len(cache) > TOKEN_CACHE_SIZE:
+                cache.clear()
+            for i, lemma in enumerate(lemmas):
+                if lemma is None:
+                    token = tokens[i]
+                    lemmas[i] = cache[token] = '' if token in stop_words else lemmatize(token)
+        return [lemma for lemma in lemmas if lemma]
+    return normalize
+
+
+def get_token_normalizer():
+    """Return a memoized function mapping lowercase tokens to their lemmas, dropping stop words."""
+    return _get('normalizer', _load_token_normalizer)
+
+
+def warm_up():
+    """Load every NLP resource now, e.g. in the gunicorn master before forking."""
+    get_stop_words()
+    get_lemmatizer()
+    get_token_normalizer()
+    logger.info("NLP resources loaded")
+
+
+def download_resources():
+    """Download the NLTK resources into the local data directory (needs network)."""
+    nltk = _nltk()
+    path = data_dir()
+    os.makedirs(path, exist_ok=True)
+    results = {}
+    for resource, package in RESOURCES.values():
+        results[package] = nltk.download(package, download_dir=path, quiet=True)
+    # Pick up the new data on next use
+    with _lock:
+        _loaded.clear()
+    return results
@@ -0,0 +1,129 @@
+import json
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import select, func, text
+
+from app import db
+from models import (User, Role, RoleType, Course, Assignment, Submission, Grade, Material, Schedule,
+                    AssignmentStatus, SubmissionStatus, course_students)
+
+# Scanning a table this small is the planner's right call, not a missing index
+MIN_SCAN_ROWS = 1000
+
+
+def _sample_ids():
+    """Pick a faculty member, a student, a course and an assignment to bind the catalog's parameters."""
+    faculty = db.session.query(Course.faculty_id).filter(Course.faculty_id.isnot(None)).limit(1).scalar()
+    student = db.session.query(course_students.c.user_id).limit(1).scalar()
+    course = db.session.query(Course.id).limit(1).scalar()
+    assignment = db.session.query(Assignment.id).limit(1).scalar()
+    return faculty or 0, student or 0, course or 0, assignment or 0
+
+
+def hot_queries():
+    """Return (name, statement) pairs shaped like the route modules' hottest queries."""
+    faculty_id, student_id, course_id, assignment_id = _sample_ids()
+    now = datetime.utcnow()
+    enrolled = select(course_students.c.course_id).where(course_students.c.user_id == student_id)
+
+    return [
+        ('faculty courses',
+         select(Course).where(Course.faculty_id == faculty_id)),
+        ('faculty published assignments',
+         select(Assignment).join(Course).where(Course.faculty_id == faculty_id,
+                                               Assignment.status == AssignmentStatus.PUBLISHED)
+         .order_by(Assignment.due_date.desc()).limit(5)),
+        ('faculty submissions to grade',
+         select(Submission).join(Assignment).join(Course).where(Course.faculty_id == faculty_id,
+                                                                Submission.status == SubmissionStatus.SUBMITTED)
+         .order_by(Submission.submission_date.desc()).limit(10)),
+        ('course assignments by due date',
+         select(Assignment).where(Assignment.course_id == course_id).order_by(Assignment.due_date)),
+        ('course submission counts',
+         select(Submission.status, func.count(Submission.id)).join(Assignment)
+         .where(Assignment.course_id == course_id).group_by(Submission.status)),
+        ('course roster',
+         select(User).join(course_students, course_students.c.user_id == User.id)
+         .where(course_students.c.course_id == course_id)),
+        ('course materials',
+         select(Material).where(Material.course_id == course_id).order_by(Material.created_at.desc())),
+        ('student courses',
+         select(Course).join(course_students, course_students.c.course_id == Course.id)
+         .where(course_students.c.user_id == student_id)),
+        ('student upcoming assignments',
+         select(Assignment).where(Assignment.course_id.in_(enrolled), Assignment.due_date > now,
+                                  Assignment.status == AssignmentStatus.PUBLISHED)
+         .order_by(Assignment.due_date).limit(5)),
+        ('student recent submissions',
+         select(Submission).where(Submission.student_id == student_id)
+         .order_by(Submission.submission_date.desc()).limit(5)),
+        ('student submission for assignment',
+         select(Submission).where(Submission.assignment_id == assignment_id, Submission.student_id == student_id)),
+        ('student recent grades',
+         select(Grade).join(Submission).where(Submission.student_id == student_id)
+         .order_by(Grade.graded_at.desc()).limit(5)),
+        ('ungraded submissions of assignment',
+         select(func.count(Submission.id)).outerjoin(Grade).where(Submission.assignment_id == assignment_id,
+                                                                  Grade.id.is_(None))),
+        ('users by role',
+         select(User).join(Role).where(Role.name == RoleType.FACULTY)),
+        ('owner calendar window',
+         select(Schedule).where(Schedule.owner_id == faculty_id,
+                                Schedule.overlapping(now, now + timedelta(days=30)))),
+        ('course calendar window',
+         select(Schedule).where(Schedule.course_id.in_(enrolled),
+                                Schedule.overlapping(now, now + timedelta(days=30)))),
+    ]
+
+
+def _compile(statement):
+    return str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+
+
+def full_scans(statement):
+    """Return the tables a statement reads with a full table scan, per the database's plan."""
+    sql = _compile(statement)
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        scans = set()
+        for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + sql)):
+            detail = row[-1]
+            # "SCAN table" is a full scan; "SCAN table USING [COVERING] INDEX" walks an index
+            if detail.startswith('SCAN ') and 'USING' not in detail:
+                scans.add(detail.split()[1])
+        return scans
+
+    if dialect == 'postgresql':
+        plan = db.session.execute(text('EXPLAIN (FORMAT JSON) ' + sql)).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans = set()
+        nodes = [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node.get('Node Type') == 'Seq Scan':
+                scans.add(node['Relation Name'])
+            nodes.extend(node.get('Plans', []))
+        return scans
+
+    raise click.ClickException(f"Query plans are not supported for {dialect}; "
+                               f"run explain-check against SQLite or PostgreSQL.")
+
+
+def check_query_plans(min_rows=MIN_SCAN_ROWS):
+    """Explain every hot query; returns a list of (name, large tables fully scanned)."""
+    # Fresh statistics, so the planner sees the real table sizes
+    if db.engine.dialect.name in ('sqlite', 'postgresql'):
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+
+    sizes = {}
+    results = []
+    for name, statement in hot_queries():
+        scans = full_scans(statement)
+        for table in scans - sizes.keys():
+            sizes[table] = db.session.execute(select(func.count()).select_from(text(f'"{table}"'))).scalar()
+        results.append((name, sorted(table for table in scans if sizes[table] >= min_rows)))
+    return results
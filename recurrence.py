@@ -0,0 +1,135 @@
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# A parsed recurrence_pattern. freq is 'daily', 'weekly' or 'monthly';
+# weekdays (Monday=0) restricts weekly rules to those days, None meaning the
+# weekday of the first occurrence; interval repeats every N days/weeks/months.
+RecurrenceRule = namedtuple('RecurrenceRule', ['freq', 'interval', 'weekdays'])
+
+# Named patterns, as offered by the schedule forms
+NAMED_RULES = {
+    'daily': RecurrenceRule('daily', 1, None),
+    'weekdays': RecurrenceRule('weekly', 1, (0, 1, 2, 3, 4)),
+    'weekly': RecurrenceRule('weekly', 1, None),
+    'biweekly': RecurrenceRule('weekly', 2, None),
+    'monthly': RecurrenceRule('monthly', 1, None),
+}
+
+# Day letters of patterns such as "MWF" or "TTh"; R and Th are Thursday, U and Su Sunday
+_DAY_CODES = re.compile(r'Th|Sa|Su|[MTWRFSU]')
+_DAY_NUMBERS = {'M': 0, 'T': 1, 'W': 2, 'Th': 3, 'R': 3, 'F': 4, 'S': 5, 'Sa': 5, 'U': 6, 'Su': 6}
+
+
+def parse_recurrence(pattern):
+    """Parse a recurrence_pattern into a RecurrenceRule, or None if it is not understood."""
+    if not pattern:
+        return None
+    pattern = pattern.strip()
+    rule = NAMED_RULES.get(pattern.lower().replace('-', '').replace(' ', ''))
+    if rule is not None:
+        return rule
+
+    codes = _DAY_CODES.findall(pattern)
+    if not codes or ''.join(codes) != pattern:
+        return None
+    return RecurrenceRule('weekly', 1, tuple(sorted({_DAY_NUMBERS[code] for code in codes})))
+
+
+def _add_months(value, months):
+    """Same day `months` later, or None when that month is too short (e.g. the 31st)."""
+    month = value.month - 1 + months
+    try:
+        return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+    except ValueError:
+        return None
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.combine(value, datetime.min.time())
+
+
+def expand_occurrences(start_time, end_time, rule, window_start, window_end, until=None):
+    """Yield the (start, end) occurrences of an event that overlap a window.
+
+    Expansion starts at the first period that can reach the window rather
+    than at the first occurrence, so long-running series cost no more than
+    the occurrences returned. Without a rule the event occurs once.
+
+    Args:
+        start_time, end_time: the first occurrence
+        rule (RecurrenceRule): see parse_recurrence
+        window_start, window_end: datetimes or dates; the window is half-open
+        until (date, optional): no occurrence starts after this day
+    """
+    window_start = _as_datetime(window_start)
+    window_end = _as_datetime(window_end)
+    duration = end_time - start_time
+    last_start = window_end
+    if until is not None:
+        last_start = min(last_start, _as_datetime(until) + timedelta(days=1))
+
+    if rule is None:
+        if start_time < window_end and end_time > window_start:
+            yield start_time, end_time
+        return
+
+    # Occurrences starting before this cannot end inside the window
+    earliest = max(start_time, window_start - duration)
+
+    if rule.freq == 'monthly':
+        months = (earliest.year - start_time.year) * 12 + earliest.month - start_time.month
+        index = max(0, months // rule.interval - 1)
+        while True:
+            month_start = _add_months(start_time.replace(day=1), index * rule.interval)
+            if month_start >= last_start:
+                return
+            occurrence = _add_months(start_time, index * rule.interval)
+            index += 1
+            # Months without the day (e.g. the 31st) are skipped
+            if occurrence is None:
+                continue
+            if occurrence >= last_start:
+                return
+            if occurrence + duration > window_start:
+                yield occurrence, occurrence + duration
+
+    if rule.freq == 'daily':
+        anchor = start_time
+        step = timedelta(days=rule.interval)
+        offsets = [timedelta(0)]
+    else:
+        # Weekly rules count periods from the Monday of the first occurrence's week
+        anchor = start_time - timedelta(days=start_time.weekday())
+        step = timedelta(weeks=rule.interval)
+        offsets = [timedelta(days=day) for day in (rule.weekdays or (start_time.weekday(),))]
+
+    # Jump straight to the period containing `earliest`
+    period = max(0, (earliest - anchor) // step - 1)
+    while True:
+        base = anchor + period * step
+        if base >= last_start:
+            return
+        for offset in offsets:
+            occurrence = base + offset
+            if occurrence < start_time:
+                continue  # days of the first week before the first occurrence
+            if occurrence >= last_start:
+                return
+            if occurrence + duration > window_start:
+                yield occurrence, occurrence + duration
+        period += 1
+
+
+def schedule_occurrences(schedule, window_start, window_end, until=None):
+    """Yield the (start, end) occurrences of a Schedule row overlapping a window.
+
+    Rows that are not recurring, or whose pattern is not understood, occur once.
+    A recurring row without a pattern repeats weekly.
+    """
+    rule = None
+    if schedule.is_recurring:
+        rule = parse_recurrence(schedule.recurrence_pattern) if schedule.recurrence_pattern else NAMED_RULES['weekly']
+    return expand_occurrences(schedule.start_time, schedule.end_time, rule, window_start, window_end, until)
@@ -9,6 +9,8 @@ from io import TextIOWrapper
 
 from app import db
 from models import User, Role, RoleType, Course
+from analysis_cache import cache_stats
+from sql_profiler import sql_report, reset_sql_report
 
 admin_bp = Blueprint('admin_bp', __name__)
 
@@ -392,6 +394,24 @@ def system():
         'courses': Course.query.count(),
     }
     
+    # Hit/miss counters of the submission analysis cache in this process
+    analysis_cache = cache_stats()
+    
+    # Statements per request and suspected N+1 patterns seen by this process
+    sql_profile = sql_report()
+    
     return render_template('admin/system.html',
                           config=config,
-                          db_stats=db_stats)
\ No newline at end of file
+                          db_stats=db_stats,
+                          analysis_cache=analysis_cache,
+                          sql_profile=sql_profile)
+
+
+@admin_bp.route('/system/sql-profile/reset', methods=['POST'])
+@login_required
+@admin_required
+def reset_sql_profile():
+    """Clear the rolling SQL report."""
+    reset_sql_report()
+    flash('SQL profile cleared.', 'success')
+    return redirect(url_for('admin_bp.system'))
\ No newline at end of file
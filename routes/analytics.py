@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from sqlalchemy.exc import IntegrityError
 from functools import wraps
@@ -8,6 +8,9 @@ from app import db
 from models import User, Course, Assignment, Submission, Grade, RoleType, Analytics
 from utils import get_user_courses, calculate_course_analytics, calculate_student_analytics
 from ai_services import predict_student_performance
+from metric_store import get_student_course_metrics
+from course_analytics import get_course_analytics
+from admin_snapshot import latest_admin_snapshot, refresh_admin_snapshot, snapshot_metrics
 
 analytics_bp = Blueprint('analytics', __name__)
 
@@ -36,86 +39,34 @@ def index():
 @login_required
 @admin_or_faculty_required
 def admin_dashboard():
-    """Analytics dashboard for admins."""
-    # Get system-wide statistics
-    total_users = User.query.count()
-    total_faculty = User.query.join(User.role).filter(User.role.has(name=RoleType.FACULTY)).count()
-    total_students = User.query.join(User.role).filter(User.role.has(name=RoleType.STUDENT)).count()
-    total_courses = Course.query.count()
-    total_assignments = Assignment.query.count()
-    total_submissions = Submission.query.count()
+    """Analytics dashboard for admins, served from the latest KPI snapshot."""
+    snapshot = latest_admin_snapshot()
     
-    # Get active courses
-    active_courses = Course.query.filter_by(is_active=True).count()
-    
-    # Get user registration trends
-    today = datetime.utcnow()
-    month_ago = today - timedelta(days=30)
-    
-    new_users = User.query.filter(User.created_at >= month_ago).count()
-    
-    # Get course activity
-    course_activity = db.session.query(
-        Course.id, Course.code, Course.title,
-        db.func.count(Submission.id).label('submission_count')
-    ).outerjoin(Assignment, Assignment.course_id == Course.id).outerjoin(
-        Submission, Submission.assignment_id == Assignment.id
-    ).group_by(Course.id).order_by(db.desc('submission_count')).limit(5).all()
-    
-    # Get faculty with most active courses
-    faculty_activity = db.session.query(
-        User.id, User.first_name, User.last_name,
-        db.func.count(Course.id).label('course_count')
-    ).join(Course, Course.faculty_id == User.id).group_by(User.id).order_by(db.desc('course_count')).limit(5).all()
-    
-    # Get assignment completion rates
-    completion_rates = db.session.query(
-        Course.id, Course.code,
-        db.func.count(Assignment.id).label('total_assignments'),
-        db.func.count(Submission.id).label('total_submissions')
-    ).join(Assignment, Assignment.course_id == Course.id).outerjoin(
-        Submission, Submission.assignment_id == Assignment.id
-    ).group_by(Course.id).all()
-    
-    # Calculate completion percentages
-    course_completion = []
-    for rate in completion_rates:
-        # Skip courses with no assignments
-        if rate.total_assignments == 0:
-            continue
-            
-        # Get number of students in course
-        course = Course.query.get(rate.id)
-        student_count = len(course.students)
-        
-        if student_count > 0 and rate.total_assignments > 0:
-            # Potential total submissions if all students submitted all assignments
-            potential_submissions = student_count * rate.total_assignments
-            
-            # Actual percentage
-            percentage = (rate.total_submissions / potential_submissions) * 100
-            
-            course_completion.append({
-                'course_code': rate.code,
-                'completion_rate': percentage
-            })
+    # First visit: compute one now rather than show an empty dashboard
+    if snapshot is None:
+        snapshot = refresh_admin_snapshot()
+        if snapshot is None:
+            flash('Dashboard metrics could not be computed. Please try again later.', 'danger')
+            return redirect(url_for('auth.index'))
     
-    # Sort by completion rate descending
-    course_completion.sort(key=lambda x: x['completion_rate'], reverse=True)
-    course_completion = course_completion[:5]  # Get top 5
+    snapshot_age = datetime.utcnow() - snapshot.computed_at
     
     return render_template('analytics/admin_dashboard.html',
-                          total_users=total_users,
-                          total_faculty=total_faculty,
-                          total_students=total_students,
-                          total_courses=total_courses,
-                          total_assignments=total_assignments,
-                          total_submissions=total_submissions,
-                          active_courses=active_courses,
-                          new_users=new_users,
-                          course_activity=course_activity,
-                          faculty_activity=faculty_activity,
-                          course_completion=course_completion)
+                          snapshot=snapshot,
+                          snapshot_age_minutes=int(snapshot_age.total_seconds() // 60),
+                          snapshot_stale=snapshot_age.total_seconds() > current_app.config['ADMIN_SNAPSHOT_MAX_AGE'],
+                          **snapshot_metrics(snapshot))
+
+@analytics_bp.route('/admin/refresh', methods=['POST'])
+@login_required
+@admin_or_faculty_required
+def refresh_admin_dashboard():
+    """Recompute the admin dashboard metrics now."""
+    if refresh_admin_snapshot() is None:
+        flash('An error occurred while refreshing the dashboard metrics.', 'danger')
+    else:
+        flash('Dashboard metrics refreshed.', 'success')
+    return redirect(url_for('analytics.admin_dashboard'))
 
 @analytics_bp.route('/faculty')
 @login_required
@@ -136,122 +87,16 @@ def faculty_dashboard():
     
     # Initialize analytics data
     analytics_data = {
-        'assignment_stats': None,
+        'assignment_completion': None,
         'grade_distribution': None,
         'student_performance': None,
         'submission_timing': None
     }
     
     if course:
-        # Get assignments for this course
-        assignments = Assignment.query.filter_by(course_id=course.id).all()
-        
-        # Get students for this course
-        students = course.students
-        
-        # Assignment statistics
-        assignment_stats = []
-        for assignment in assignments:
-            total_students = len(students)
-            submissions = Submission.query.filter_by(assignment_id=assignment.id).count()
-            graded = Submission.query.filter_by(
-                assignment_id=assignment.id,
-                status='GRADED'
-            ).count()
-            
-            if total_students > 0:
-                submission_rate = (submissions / total_students) * 100
-            else:
-                submission_rate = 0
-                
-            assignment_stats.append({
-                'assignment': assignment.title,
-                'submission_rate': submission_rate,
-                'graded_count': graded,
-                'total_submissions': submissions
-            })
-        
-        analytics_data['assignment_stats'] = assignment_stats
-        
-        # Grade distribution
-        grades = Grade.query.join(Submission).join(Assignment).filter(
-            Assignment.course_id == course.id
-        ).all()
-        
-        grade_distribution = {
-            'A': 0,  # 90-100%
-            'B': 0,  # 80-89%
-            'C': 0,  # 70-79%
-            'D': 0,  # 60-69%
-            'F': 0   # <60%
-        }
-        
-        for grade in grades:
-            percentage = (grade.score / grade.submission.assignment.max_score) * 100
-            
-            if percentage >= 90:
-                grade_distribution['A'] += 1
-            elif percentage >= 80:
-                grade_distribution['B'] += 1
-            elif percentage >= 70:
-                grade_distribution['C'] += 1
-            elif percentage >= 60:
-                grade_distribution['D'] += 1
-            else:
-                grade_distribution['F'] += 1
-        
-        analytics_data['grade_distribution'] = grade_distribution
-        
-        # Student performance
-        student_performance = []
-        for student in students:
-            student_grades = Grade.query.join(Submission).join(Assignment).filter(
-                Assignment.course_id == course.id,
-                Submission.student_id == student.id
-            ).all()
-            
-            total_score = 0
-            total_max = 0
-            
-            for grade in student_grades:
-                total_score += grade.score
-                total_max += grade.submission.assignment.max_score
-            
-            if total_max > 0:
-                average_percentage = (total_score / total_max) * 100
-            else:
-                average_percentage = 0
-                
-            student_performance.append({
-                'name': f"{student.first_name} {student.last_name}",
-                'average': average_percentage
-            })
-        
-        analytics_data['student_performance'] = student_performance
-        
-        # Submission timing analysis
-        submission_timing = {
-            'early': 0,    # >24 hours before due date
-            'ontime': 0,   # <24 hours before due date
-            'late': 0      # after due date
-        }
-        
-        submissions = Submission.query.join(Assignment).filter(
-            Assignment.course_id == course.id
-        ).all()
-        
-        for submission in submissions:
-            time_diff = submission.assignment.due_date - submission.submission_date
-            
-            if time_diff.total_seconds() > 86400:  # More than 24 hours before
-                submission_timing['early'] += 1
-            elif time_diff.total_seconds() > 0:    # Before due date but <24 hours
-                submission_timing['ontime'] += 1
-            else:                                  # After due date
-                submission_timing['late'] += 1
-        
-        analytics_data['submission_timing'] = submission_timing
-    
+        # Completion, grade distribution, student averages and timing panels
+        analytics_data.update(get_course_analytics(course.id))
+
     return render_template('analytics/faculty_dashboard.html',
                           courses=courses,
                           current_course=course,
@@ -332,54 +177,16 @@ def student_dashboard():
         analytics_data['performance_trend'] = trend_data
         
         # Course comparison (compare performance across all courses)
-        comparison_data = []
-        
-        for enrolled_course in courses:
-            course_grades = Grade.query.join(Submission).join(Assignment).filter(
-                Assignment.course_id == enrolled_course.id,
-                Submission.student_id == current_user.id
-            ).all()
-            
-            total_score = 0
-            total_max = 0
-            
-            for grade in course_grades:
-                total_score += grade.score
-                total_max += grade.submission.assignment.max_score
-            
-            if total_max > 0:
-                average_percentage = (total_score / total_max) * 100
-            else:
-                average_percentage = 0
-                
-            comparison_data.append({
-                'course': enrolled_course.code,
-                'average': average_percentage
-            })
+        course_metrics = get_student_course_metrics(current_user.id, [c.id for c in courses])
+        comparison_data = [{
+            'course': enrolled_course.code,
+            'average': course_metrics[enrolled_course.id]['average_percentage']
+        } for enrolled_course in courses]
         
         analytics_data['course_comparison'] = comparison_data
         
         # Time management analysis
-        time_management = {
-            'early': 0,    # >24 hours before due date
-            'ontime': 0,   # <24 hours before due date
-            'late': 0      # after due date
-        }
-        
-        submissions = Submission.query.join(Assignment).filter(
-            Assignment.course_id == course.id,
-            Submission.student_id == current_user.id
-        ).all()
-        
-        for submission in submissions:
-            time_diff = submission.assignment.due_date - submission.submission_date
-            
-            if time_diff.total_seconds() > 86400:  # More than 24 hours before
-                time_management['early'] += 1
-            elif time_diff.total_seconds() > 0:    # Before due date but <24 hours
-                time_management['ontime'] += 1
-            else:                                  # After due date
-                time_management['late'] += 1
+        time_management = course_metrics[course.id]['submission_timing']
         
         analytics_data['time_management'] = time_management
     
@@ -466,7 +273,8 @@ def api_predict_performance(course_id):
             'score': grade.score,
             'max_score': assignment.max_score,
             'percentage': (grade.score / assignment.max_score) * 100,
-            'weight': assignment.weight
+            'weight': assignment.weight,
+            'timestamp': assignment.due_date
         })
     
     try:
@@ -7,6 +7,7 @@ from app import db
 from models import Assignment, Course, Submission, Grade, SubmissionStatus, AssignmentStatus
 from utils import get_user_courses
 from ai_services import analyze_submission
+from analysis_queue import get_or_enqueue_analysis, get_submission_analysis, apply_analysis_to_grade
 
 assignments_bp = Blueprint('assignments', __name__)
 
@@ -144,6 +145,10 @@ def grade(assignment_id, submission_id):
                 feedback=feedback,
                 graded_by=current_user.id
             )
+            
+            # Keep the AI recommendation alongside the grade if it is ready
+            ai_status, ai_analysis = get_submission_analysis(submission_id)
+            apply_analysis_to_grade(new_grade, ai_analysis, assignment.max_score)
             db.session.add(new_grade)
         
         # Update submission status
@@ -160,22 +165,26 @@ def grade(assignment_id, submission_id):
     # Get existing grade
     grade = Grade.query.filter_by(submission_id=submission_id).first()
     
-    # Get AI analysis if available
-    ai_analysis = None
-    if submission.content:
-        try:
-            ai_analysis = analyze_submission(
-                submission.content,
-                assignment.description
-            )
-        except Exception as e:
-            flash(f'AI analysis error: {str(e)}', 'warning')
+    # Get the stored AI analysis; it is computed by the background worker
+    ai_status, ai_analysis = get_or_enqueue_analysis(submission)
+    
+    ai_suggestion = None
+    if ai_analysis and ai_analysis.get('score_recommendation') is not None:
+        ai_suggestion = {
+            'score': ai_analysis['score_recommendation'] * assignment.max_score / 100,
+            'confidence': ai_analysis['confidence'],
+            'feedback': ai_analysis['feedback'],
+            'key_points': ai_analysis['key_points'],
+            'improvement_areas': ai_analysis['improvement_areas']
+        }
     
     return render_template('assignments/grade.html',
                           assignment=assignment,
                           submission=submission,
                           grade=grade,
-                          ai_analysis=ai_analysis)
+                          ai_analysis=ai_analysis,
+                          ai_suggestion=ai_suggestion,
+                          ai_status=ai_status)
 
 @assignments_bp.route('/api/analyze', methods=['POST'])
 @login_required
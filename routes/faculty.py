@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from functools import wraps
 from datetime import datetime, timedelta
 import os
@@ -9,8 +10,13 @@ import json
 
 from app import db
 from models import User, RoleType, Course, Assignment, Submission, Grade, SubmissionStatus, AssignmentStatus
-from utils import allowed_file, save_file, parse_date
-from ai_services import analyze_submission, predict_student_performance
+from utils import (allowed_file, save_file, parse_date, get_at_risk_students, get_faculty_course_stats,
+                   AT_RISK_THRESHOLD)
+from ai_services import analyze_submission, analyze_submissions_batch, predict_student_performance
+from course_analytics import get_course_analytics
+from analysis_queue import (get_or_enqueue_analysis, get_submission_analysis,
+                            apply_analysis_to_grade, store_analysis_result)
+from similarity_index import find_similar_submissions, DEFAULT_THRESHOLD
 
 faculty_bp = Blueprint('faculty', __name__)
 
@@ -28,8 +34,9 @@ def faculty_required(f):
 @faculty_required
 def dashboard():
     """Faculty dashboard page."""
-    # Get current faculty's courses
-    courses = Course.query.filter_by(faculty_id=current_user.id).all()
+    # Get current faculty's courses with their statistics, in a single query
+    course_stats = get_faculty_course_stats(current_user.id)
+    courses = [stat['course'] for stat in course_stats]
     
     # Get recent assignments
     assignments = Assignment.query.join(Course).filter(
@@ -43,39 +50,6 @@ def dashboard():
         Submission.status == SubmissionStatus.SUBMITTED
     ).order_by(Submission.submission_date.desc()).limit(10).all()
     
-    # Get course statistics
-    course_stats = []
-    for course in courses:
-        # Get number of students
-        student_count = len(course.students)
-        
-        # Get assignment count
-        assignment_count = Assignment.query.filter_by(course_id=course.id).count()
-        
-        # Get submission statistics
-        total_submissions = Submission.query.join(Assignment).filter(
-            Assignment.course_id == course.id
-        ).count()
-        
-        graded_submissions = Submission.query.join(Assignment).filter(
-            Assignment.course_id == course.id,
-            Submission.status.in_([SubmissionStatus.GRADED, SubmissionStatus.RETURNED])
-        ).count()
-        
-        pending_submissions = Submission.query.join(Assignment).filter(
-            Assignment.course_id == course.id,
-            Submission.status == SubmissionStatus.SUBMITTED
-        ).count()
-        
-        course_stats.append({
-            'course': course,
-            'student_count': student_count,
-            'assignment_count': assignment_count,
-            'total_submissions': total_submissions,
-            'graded_submissions': graded_submissions,
-            'pending_submissions': pending_submissions
-        })
-    
     # Get upcoming deadlines
     today = datetime.utcnow()
     upcoming_deadlines = Assignment.query.join(Course).filter(
@@ -353,6 +327,10 @@ def grade_submission(submission_id):
                 feedback=feedback,
                 graded_by=current_user.id
             )
+            
+            # Keep the AI recommendation alongside the grade if it is ready
+            ai_status, ai_analysis = get_submission_analysis(submission_id)
+            apply_analysis_to_grade(new_grade, ai_analysis, submission.assignment.max_score)
             db.session.add(new_grade)
         
         # Update submission status
@@ -366,21 +344,14 @@ def grade_submission(submission_id):
             db.session.rollback()
             flash('An error occurred while grading the submission.', 'danger')
     
-    # Get AI analysis if available
-    ai_analysis = None
-    if submission.content:
-        try:
-            ai_analysis = analyze_submission(
-                submission.content, 
-                submission.assignment.description
-            )
-        except Exception as e:
-            flash(f'AI analysis error: {str(e)}', 'warning')
+    # Get the stored AI analysis; it is computed by the background worker
+    ai_status, ai_analysis = get_or_enqueue_analysis(submission)
             
     return render_template('faculty/grade_submission.html', 
                           submission=submission,
                           existing_grade=existing_grade,
-                          ai_analysis=ai_analysis)
+                          ai_analysis=ai_analysis,
+                          ai_status=ai_status)
 
 @faculty_bp.route('/analytics')
 @login_required
@@ -404,115 +375,64 @@ def analytics():
         'assignment_completion': None,
         'grade_distribution': None,
         'student_performance': None,
-        'submission_timing': None
+        'submission_timing': None,
+        'at_risk': None
     }
     
     if course:
-        # Get assignments for this course
-        assignments = Assignment.query.filter_by(course_id=course.id).all()
-        
-        # Assignment completion rate
-        assignment_data = []
-        for assignment in assignments:
-            total_students = len(course.students)
-            submitted = Submission.query.filter_by(assignment_id=assignment.id).count()
-            
-            if total_students > 0:
-                completion_rate = (submitted / total_students) * 100
-            else:
-                completion_rate = 0
-                
-            assignment_data.append({
-                'name': assignment.title,
-                'completion_rate': completion_rate
-            })
-        
-        analytics_data['assignment_completion'] = assignment_data
-        
-        # Grade distribution
-        grade_distribution = {
-            'A': 0,  # 90-100%
-            'B': 0,  # 80-89%
-            'C': 0,  # 70-79%
-            'D': 0,  # 60-69%
-            'F': 0   # <60%
-        }
-        
-        grades = Grade.query.join(Submission).join(Assignment).filter(
-            Assignment.course_id == course.id
-        ).all()
-        
-        for grade in grades:
-            percentage = (grade.score / grade.submission.assignment.max_score) * 100
-            
-            if percentage >= 90:
-                grade_distribution['A'] += 1
-            elif percentage >= 80:
-                grade_distribution['B'] += 1
-            elif percentage >= 70:
-                grade_distribution['C'] += 1
-            elif percentage >= 60:
-                grade_distribution['D'] += 1
-            else:
-                grade_distribution['F'] += 1
-        
-        analytics_data['grade_distribution'] = grade_distribution
+        # Completion, grade distribution, student averages and timing panels
+        analytics_data.update(get_course_analytics(course.id))
         
-        # Student performance
-        student_performance = []
-        for student in course.students:
-            student_grades = Grade.query.join(Submission).join(Assignment).filter(
-                Assignment.course_id == course.id,
-                Submission.student_id == student.id
-            ).all()
-            
-            total_score = 0
-            total_max = 0
-            
-            for grade in student_grades:
-                total_score += grade.score
-                total_max += grade.submission.assignment.max_score
-            
-            if total_max > 0:
-                average_percentage = (total_score / total_max) * 100
-            else:
-                average_percentage = 0
-                
-            student_performance.append({
-                'name': f"{student.first_name} {student.last_name}",
-                'average': average_percentage
-            })
-        
-        analytics_data['student_performance'] = student_performance
-        
-        # Submission timing analysis
-        submission_timing = {
-            'early': 0,    # >24 hours before due date
-            'ontime': 0,   # <24 hours before due date
-            'late': 0      # after due date
-        }
-        
-        submissions = Submission.query.join(Assignment).filter(
-            Assignment.course_id == course.id
-        ).all()
-        
-        for submission in submissions:
-            time_diff = submission.assignment.due_date - submission.submission_date
-            
-            if time_diff.total_seconds() > 86400:  # More than 24 hours before
-                submission_timing['early'] += 1
-            elif time_diff.total_seconds() > 0:    # Before due date but <24 hours
-                submission_timing['ontime'] += 1
-            else:                                  # After due date
-                submission_timing['late'] += 1
-        
-        analytics_data['submission_timing'] = submission_timing
+        # Students predicted to fall below the passing range
+        analytics_data['at_risk'] = get_at_risk_students(course.id)
     
     return render_template('faculty/analytics.html', 
                           courses=courses, 
                           current_course=course,
                           analytics_data=analytics_data)
 
+@faculty_bp.route('/api/course-stats')
+@login_required
+@faculty_required
+def api_course_stats():
+    """API endpoint with the roster and submission statistics of the faculty's courses."""
+    try:
+        course_stats = get_faculty_course_stats(current_user.id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'courses': [{
+            'course_id': stat['course'].id,
+            'code': stat['course'].code,
+            'title': stat['course'].title,
+            'student_count': stat['student_count'],
+            'assignment_count': stat['assignment_count'],
+            'total_submissions': stat['total_submissions'],
+            'graded_submissions': stat['graded_submissions'],
+            'pending_submissions': stat['pending_submissions']
+        } for stat in course_stats]
+    })
+
+@faculty_bp.route('/api/courses/<int:course_id>/at-risk')
+@login_required
+@faculty_required
+def api_at_risk_students(course_id):
+    """API endpoint listing the students of a course predicted to be at risk."""
+    course = Course.query.filter_by(id=course_id, faculty_id=current_user.id).first_or_404()
+    threshold = request.args.get('threshold', AT_RISK_THRESHOLD, type=float)
+    
+    try:
+        students = get_at_risk_students(course.id, threshold)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'course_id': course.id,
+        'threshold': threshold,
+        'students': students
+    })
+
 @faculty_bp.route('/api/analyze-submission', methods=['POST'])
 @login_required
 @faculty_required
@@ -533,4 +453,106 @@ def api_analyze_submission():
         analysis = analyze_submission(submission_text, instructions)
         return jsonify(analysis)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@faculty_bp.route('/api/assignments/<int:assignment_id>/analyze-submissions', methods=['POST'])
+@login_required
+@faculty_required
+def api_analyze_assignment_submissions(assignment_id):
+    """API endpoint to analyze every submission of an assignment in one batch."""
+    assignment = Assignment.query.join(Course).filter(
+        Assignment.id == assignment_id,
+        Course.faculty_id == current_user.id
+    ).first_or_404()
+    
+    data = request.get_json(silent=True) or {}
+    
+    # Load submissions together with their grades and jobs in one query
+    submissions = Submission.query.options(
+        joinedload(Submission.grade),
+        joinedload(Submission.analysis_job)
+    ).filter(
+        Submission.assignment_id == assignment.id
+    ).order_by(Submission.id).all()
+    
+    analyses = analyze_submissions_batch(
+        [submission.content for submission in submissions],
+        assignment.description,
+        rubric=data.get('rubric'),
+        reference_answer=data.get('reference_answer'),
+        course_id=assignment.course_id
+    )
+    
+    # Store every result for the grading pages, and on the grade where one exists
+    results = []
+    for submission, analysis in zip(submissions, analyses):
+        stored_on_grade = store_analysis_result(submission, analysis)
+        
+        results.append({
+            'submission_id': submission.id,
+            'student_id': submission.student_id,
+            'stored': stored_on_grade,
+            'analysis': analysis
+        })
+    
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'An error occurred while saving the analysis results.'}), 500
+    
+    return jsonify({
+        'assignment_id': assignment.id,
+        'analyzed_count': len(results),
+        'results': results
+    })
+
+@faculty_bp.route('/assignments/<int:assignment_id>/similarity')
+@login_required
+@faculty_required
+def similarity_report(assignment_id):
+    """Report of near-duplicate submissions for an assignment."""
+    assignment = Assignment.query.join(Course).filter(
+        Assignment.id == assignment_id,
+        Course.faculty_id == current_user.id
+    ).first_or_404()
+    
+    threshold = request.args.get('threshold', DEFAULT_THRESHOLD, type=float)
+    include_past = request.args.get('include_past', type=int) == 1
+    
+    try:
+        pairs = find_similar_submissions(assignment, threshold, include_past)
+    except Exception as e:
+        flash(f'Similarity check error: {str(e)}', 'danger')
+        pairs = []
+    
+    return render_template('faculty/similarity_report.html',
+                          assignment=assignment,
+                          pairs=pairs,
+                          threshold=threshold,
+                          include_past=include_past)
+
+@faculty_bp.route('/api/assignments/<int:assignment_id>/similarity')
+@login_required
+@faculty_required
+def api_similarity_report(assignment_id):
+    """API endpoint listing near-duplicate submission pairs for an assignment."""
+    assignment = Assignment.query.join(Course).filter(
+        Assignment.id == assignment_id,
+        Course.faculty_id == current_user.id
+    ).first_or_404()
+    
+    threshold = request.args.get('threshold', DEFAULT_THRESHOLD, type=float)
+    include_past = request.args.get('include_past', type=int) == 1
+    
+    try:
+        pairs = find_similar_submissions(assignment, threshold, include_past)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'assignment_id': assignment.id,
+        'threshold': threshold,
+        'include_past': include_past,
+        'pairs': pairs
+    })
@@ -1,12 +1,17 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort, Response, stream_with_context
 from flask_login import login_required, current_user
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
+import base64
+import numpy as np
 
 from app import db
-from models import Schedule, Course
+from models import Schedule, Course, course_students
 from utils import parse_date, get_user_courses
 from ai_services import optimize_schedule
+from recurrence import schedule_occurrences
+from freebusy import SLOT_MINUTES, week_start_of, busy_bitmaps, common_free_slots
+from calendar_feed import feed_token, read_feed_token, revoke_feed_tokens, feed_version, generate_feed
 
 schedule_bp = Blueprint('schedule', __name__)
 
@@ -46,18 +51,28 @@ def index():
     if course_id:
         query = query.filter(Schedule.course_id == course_id)
     
-    # Filter by date range
-    query = query.filter(
-        ((Schedule.start_time >= start_date) & (Schedule.start_time <= end_date)) |
-        ((Schedule.end_time >= start_date) & (Schedule.end_time <= end_date))
-    )
+    # Filter by date range, including events that span the whole window
+    query = query.filter(Schedule.overlapping(start_date, end_date))
     
     # Get schedules
     schedules = query.order_by(Schedule.start_time).all()
     
+    # Recurring course events stop at the end of the course
+    course_end_dates = dict(db.session.query(Course.id, Course.end_date).filter(
+        Course.id.in_({schedule.course_id for schedule in schedules if schedule.is_recurring and schedule.course_id})
+    ).all())
+    
+    # Expand recurring events into their occurrences inside the window
+    occurrences = []
+    for schedule in schedules:
+        until = course_end_dates.get(schedule.course_id)
+        occurrences.extend((start, end, schedule)
+                           for start, end in schedule_occurrences(schedule, start_date, end_date, until))
+    occurrences.sort(key=lambda occurrence: occurrence[0])
+    
     # Format for calendar
     calendar_events = []
-    for schedule in schedules:
+    for start_time, end_time, schedule in occurrences:
         # Determine color based on type
         if schedule.course_id:
             color = '#3788d8'  # Blue for course events
@@ -69,13 +84,13 @@ def index():
         calendar_events.append({
             'id': schedule.id,
             'title': schedule.title,
-            'start': schedule.start_time.isoformat(),
-            'end': schedule.end_time.isoformat(),
+            'start': start_time.isoformat(),
+            'end': end_time.isoformat(),
             'description': schedule.description,
             'location': schedule.location,
             'color': color,
             'course_id': schedule.course_id,
-            'allDay': (schedule.end_time - schedule.start_time) >= timedelta(hours=23)
+            'allDay': (end_time - start_time) >= timedelta(hours=23)
         })
     
     return render_template('schedule/index.html',
@@ -317,4 +332,91 @@ def api_get_suggestions():
         suggestions = generate_schedule_suggestions(current_user.id, start_date, end_date)
         return jsonify(suggestions)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@schedule_bp.route('/api/free-busy', methods=['GET'])
+@login_required
+def api_free_busy():
+    """API endpoint to get the busy bitset and common free slots of a week.
+    
+    Without course_id this covers the current user; with it, the course's
+    faculty member and every enrolled student.
+    """
+    week_start = week_start_of(parse_date(request.args.get('start_date'), default=datetime.utcnow()))
+    course_id = request.args.get('course_id', type=int)
+    min_minutes = request.args.get('min_minutes', default=60, type=int)
+    
+    user_ids = [current_user.id]
+    if course_id:
+        course = Course.query.get_or_404(course_id)
+        if not (current_user.is_admin() or course.faculty_id == current_user.id or
+                course in current_user.enrolled_courses):
+            return jsonify({'error': 'You do not have access to this course'}), 403
+        user_ids = [student_id for student_id, in db.session.query(course_students.c.user_id).filter(
+            course_students.c.course_id == course_id
+        )]
+        if course.faculty_id:
+            user_ids.append(course.faculty_id)
+    
+    try:
+        bitmaps = busy_bitmaps(user_ids, week_start)
+        return jsonify({
+            'week_start': week_start.isoformat(),
+            'slot_minutes': SLOT_MINUTES,
+            'member_count': len(user_ids),
+            # Busy if any member is busy; one bit per slot, most significant bit first
+            'busy': base64.b64encode(np.bitwise_or.reduce(bitmaps, axis=0).tobytes()).decode('ascii'),
+            'free_slots': [{'start': start.isoformat(), 'end': end.isoformat()}
+                           for start, end in common_free_slots(bitmaps, week_start, min_minutes)]
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@schedule_bp.route('/api/feed-url', methods=['GET'])
+@login_required
+def api_feed_url():
+    """API endpoint to get the current user's calendar subscription URL."""
+    return jsonify({'url': url_for('schedule.feed', token=feed_token(current_user), _external=True)})
+
+@schedule_bp.route('/api/feed-url/reset', methods=['POST'])
+@login_required
+def api_reset_feed_url():
+    """API endpoint to revoke the current user's calendar subscription URLs and issue a new one."""
+    try:
+        revoke_feed_tokens(current_user)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'url': url_for('schedule.feed', token=feed_token(current_user), _external=True)})
+
+@schedule_bp.route('/feed/<token>.ics')
+def feed(token):
+    """iCalendar feed of a user's events and assignment deadlines, for calendar clients.
+    
+    Authenticated by the signed token in the URL. Unchanged feeds are
+    answered with 304 Not Modified after a single aggregate query.
+    """
+    user_id, token_version = read_feed_token(token)
+    if user_id is None:
+        abort(404)
+    
+    version = feed_version(user_id, token_version)
+    if version is None:
+        abort(404)
+    last_modified, etag = version
+    response = Response(mimetype='text/calendar')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    
+    if etag in request.if_none_match or (
+            not request.if_none_match and last_modified and request.if_modified_since
+            and last_modified <= request.if_modified_since.replace(tzinfo=None)):
+        response.status_code = 304
+        return response
+    
+    response.response = stream_with_context(generate_feed(user_id, host=request.host))
+    response.headers['Content-Disposition'] = 'inline; filename="campusiq.ics"'
+    return response
@@ -8,8 +8,10 @@ import os
 
 from app import db
 from models import User, RoleType, Course, Assignment, Submission, Grade, SubmissionStatus, AssignmentStatus
-from utils import allowed_file, save_file, parse_date
+from utils import (allowed_file, save_file, parse_date, get_student_assignment_statuses,
+                   parse_assignment_cursor)
 from ai_services import predict_student_performance, generate_assignment_recommendations
+from metric_store import get_student_course_metrics
 
 student_bp = Blueprint('student', __name__)
 
@@ -48,18 +50,19 @@ def dashboard():
     ).order_by(Grade.graded_at.desc()).limit(5).all()
     
     # Get course progress
+    course_ids = [c.id for c in courses]
+    published_counts = dict(db.session.query(
+        Assignment.course_id, db.func.count(Assignment.id)
+    ).filter(
+        Assignment.course_id.in_(course_ids),
+        Assignment.status == AssignmentStatus.PUBLISHED
+    ).group_by(Assignment.course_id).all()) if course_ids else {}
+    course_metrics = get_student_course_metrics(current_user.id, course_ids)
+    
     course_progress = []
     for course in courses:
-        assignments = Assignment.query.filter_by(
-            course_id=course.id,
-            status=AssignmentStatus.PUBLISHED
-        ).all()
-        
-        total = len(assignments)
-        completed = Submission.query.join(Assignment).filter(
-            Assignment.course_id == course.id,
-            Submission.student_id == current_user.id
-        ).count()
+        total = published_counts.get(course.id, 0)
+        completed = int(course_metrics[course.id]['submission_count'])
         
         if total > 0:
             progress_percentage = (completed / total) * 100
@@ -184,72 +187,28 @@ def assignments():
     """View all assignments for enrolled courses."""
     # Get filter parameters
     course_id = request.args.get('course_id', type=int)
-    status = request.args.get('status')
     search = request.args.get('search', '')
+    cursor = request.args.get('after')
     
     # Get enrolled courses
     enrolled_courses = current_user.enrolled_courses
     enrolled_ids = [c.id for c in enrolled_courses]
     
-    # Base query for assignments
-    query = Assignment.query.join(Course).filter(
-        Course.id.in_(enrolled_ids),
-        Assignment.status == AssignmentStatus.PUBLISHED
+    # One page of published assignments with the student's submission status, in one query
+    assignments_with_status, next_cursor = get_student_assignment_statuses(
+        current_user.id, enrolled_ids,
+        course_id=course_id,
+        search=search,
+        after=parse_assignment_cursor(cursor)
     )
     
-    # Apply filters
-    if course_id:
-        query = query.filter(Course.id == course_id)
-    
-    if search:
-        query = query.filter(Assignment.title.ilike(f'%{search}%'))
-    
-    # Get submissions for each assignment
-    assignments_with_status = []
-    
-    # Get assignments with pagination
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
-    assignments = query.order_by(Assignment.due_date.desc()).paginate(page=page, per_page=per_page)
-    
-    for assignment in assignments.items:
-        # Check if student has already submitted
-        submission = Submission.query.filter_by(
-            assignment_id=assignment.id,
-            student_id=current_user.id
-        ).first()
-        
-        if submission:
-            # If submitted and graded
-            if submission.status in [SubmissionStatus.GRADED, SubmissionStatus.RETURNED]:
-                status = "Graded"
-                grade = Grade.query.filter_by(submission_id=submission.id).first()
-                grade_value = grade.score if grade else None
-            # If submitted but not graded
-            else:
-                status = "Submitted"
-                grade_value = None
-        # If not submitted
-        else:
-            # If past due date
-            if assignment.due_date < datetime.utcnow():
-                status = "Overdue"
-            else:
-                status = "Pending"
-            grade_value = None
-        
-        assignments_with_status.append({
-            'assignment': assignment,
-            'status': status,
-            'grade': grade_value,
-            'submission': submission
-        })
-    
     return render_template('student/assignments.html',
-                          assignments=assignments,
                           assignments_with_status=assignments_with_status,
+                          next_cursor=next_cursor,
+                          is_first_page=not cursor,
                           enrolled_courses=enrolled_courses,
                           current_course_id=course_id,
+                          current_status=None,
                           search=search)
 
 @student_bp.route('/assignments/<int:assignment_id>/submit', methods=['GET', 'POST'])
@@ -435,7 +394,8 @@ def analytics():
                 'assignment': assignment.title,
                 'score': grade.score,
                 'max_score': assignment.max_score,
-                'percentage': percentage
+                'percentage': percentage,
+                'timestamp': assignment.due_date
             })
         
         analytics_data['grades'] = grade_data
@@ -527,7 +487,8 @@ def api_predict_performance():
             'assignment': assignment.title,
             'score': grade.score,
             'max_score': assignment.max_score,
-            'percentage': percentage
+            'percentage': percentage,
+            'timestamp': assignment.due_date
         })
     
     try:
@@ -5,6 +5,8 @@ from datetime import datetime, timedelta
 
 from app import db
 from models import User, Course, Assignment, Submission, Grade
+from metric_store import get_student_course_metrics
+from utils import get_student_assignment_statuses, parse_assignment_cursor
 
 student_bp = Blueprint('student_bp', __name__)
 
@@ -46,31 +48,31 @@ def dashboard():
         filter(Assignment.due_date > now, Assignment.due_date <= next_week).\
         order_by(Assignment.due_date).all()
     
-    # Get grade statistics
-    grades = Grade.query.join(Submission).filter(Submission.student_id == current_user.id).all()
+    # Get grade statistics from the metric store
+    course_ids = [c.id for c in courses]
+    course_metrics = get_student_course_metrics(current_user.id, course_ids)
+    graded_count = sum(m['graded_count'] for m in course_metrics.values())
     
     grade_stats = {
-        'total': len(grades),
+        'total': int(graded_count),
         'average': 0,
         'highest': 0,
-        'lowest': 100
+        'lowest': 0
     }
     
-    if grades:
-        total_score_percentage = 0
-        for grade in grades:
-            percentage = (grade.score / grade.submission.assignment.max_score) * 100
-            total_score_percentage += percentage
-            
-            if percentage > grade_stats['highest']:
-                grade_stats['highest'] = percentage
-                
-            if percentage < grade_stats['lowest']:
-                grade_stats['lowest'] = percentage
-            
-        grade_stats['average'] = total_score_percentage / len(grades)
-    else:
-        grade_stats['lowest'] = 0
+    if graded_count:
+        grade_stats['average'] = sum(m['score_pct_sum'] for m in course_metrics.values()) / graded_count
+        
+        # Extremes cannot be maintained incrementally, so fetch them in one aggregate
+        percentage = Grade.score * 100.0 / db.func.nullif(Assignment.max_score, 0)
+        highest, lowest = db.session.query(
+            db.func.max(percentage), db.func.min(percentage)
+        ).select_from(Grade).join(Submission).join(Assignment).filter(
+            Submission.student_id == current_user.id,
+            Assignment.course_id.in_(course_ids)
+        ).one()
+        grade_stats['highest'] = highest or 0
+        grade_stats['lowest'] = lowest or 0
     
     return render_template('student/dashboard.html',
                           courses=courses,
@@ -91,37 +93,25 @@ def assignments():
     # Get filter parameters
     course_id = request.args.get('course_id', type=int)
     status = request.args.get('status')
+    cursor = request.args.get('after')
     
-    # Base query
-    query = Assignment.query.join(Course).filter(Course.id.in_(course_ids))
-    
-    # Apply filters
-    if course_id:
-        query = query.filter(Assignment.course_id == course_id)
-        
-    if status == 'upcoming':
-        query = query.filter(Assignment.due_date > datetime.utcnow())
-    elif status == 'past':
-        query = query.filter(Assignment.due_date <= datetime.utcnow())
-    
-    # Get assignments
-    assignments = query.order_by(Assignment.due_date.desc()).all()
-    
-    # Get submission status for each assignment
-    for assignment in assignments:
-        submission = Submission.query.filter_by(
-            assignment_id=assignment.id,
-            student_id=current_user.id
-        ).first()
-        
-        assignment.submission_status = submission.status.value if submission else 'Not Submitted'
-        assignment.submission = submission
+    # One page of assignments with the student's submission status, in one query
+    assignments_with_status, next_cursor = get_student_assignment_statuses(
+        current_user.id, course_ids,
+        course_id=course_id,
+        due=status,
+        published_only=False,
+        after=parse_assignment_cursor(cursor)
+    )
     
     return render_template('student/assignments.html',
-                          assignments=assignments,
-                          courses=courses,
+                          assignments_with_status=assignments_with_status,
+                          next_cursor=next_cursor,
+                          is_first_page=not cursor,
+                          enrolled_courses=courses,
                           current_course_id=course_id,
-                          current_status=status)
+                          current_status=status,
+                          search=None)
 
 @student_bp.route('/submissions')
 @login_required
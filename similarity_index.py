@@ -0,0 +1,220 @@
+import zlib
+import hashlib
+import logging
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import and_, or_, insert
+from sqlalchemy.orm import aliased, joinedload
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app import db
+from models import Assignment, Submission, SubmissionSignature, SubmissionLshBucket
+from ai_services import preprocess_tokens, preprocess_many
+from text_models import get_course_model
+
+logger = logging.getLogger(__name__)
+
+# MinHash / LSH parameters. With 32 bands of 4 rows, pairs with a shingle
+# Jaccard similarity above ~0.42 are very likely to share at least one bucket.
+NUM_PERM = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 3  # consecutive preprocessed words per shingle
+
+# Pairs at or above this TF-IDF cosine similarity are reported
+DEFAULT_THRESHOLD = 0.8
+
+# Fixed seed: stored signatures must stay comparable across processes
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_random = np.random.RandomState(1)
+_PERM_A = _random.randint(1, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _random.randint(0, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text):
+    """Return the set of word shingles of a text, after preprocessing."""
+    tokens = preprocess_tokens(text)
+    if len(tokens) < SHINGLE_SIZE:
+        return {' '.join(tokens)} if tokens else set()
+    return {' '.join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text):
+    """Return the MinHash signature (uint32 array of NUM_PERM values), or None for empty text."""
+    text_shingles = shingles(text)
+    if not text_shingles:
+        return None
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in text_shingles),
+                         dtype=np.uint64, count=len(text_shingles))
+    # One universal hash per permutation; uint64 arithmetic wraps, as in the usual MinHash recipe
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME
+    return (permuted.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def band_buckets(signature):
+    """Return the LSH bucket id of each band of a signature."""
+    return [
+        int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), 'big', signed=True)
+        for band in signature.reshape(BANDS, ROWS_PER_BAND)
+    ]
+
+
+def _content_hash(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def index_submissions(submissions):
+    """Compute and store signatures and LSH buckets for new or changed submissions.
+
+    Returns the number of submissions (re)indexed.
+    """
+    submissions = [submission for submission in submissions if submission.content]
+    if not submissions:
+        return 0
+
+    existing = {
+        signature.submission_id: signature for signature in SubmissionSignature.query.filter(
+            SubmissionSignature.submission_id.in_([submission.id for submission in submissions])
+        )
+    }
+
+    stale = []
+    buckets = []
+    for submission in submissions:
+        content_hash = _content_hash(submission.content)
+        signature = existing.get(submission.id)
+        if (signature is not None and signature.content_hash == content_hash
+                and len(signature.signature) == NUM_PERM * 4):
+            continue
+
+        values = minhash_signature(submission.content)
+        if values is None:
+            # Nothing left after preprocessing; drop any old signature
+            if signature is not None:
+                db.session.delete(signature)
+                stale.append(submission.id)
+            continue
+
+        if signature is None:
+            signature = SubmissionSignature(submission_id=submission.id)
+            db.session.add(signature)
+        signature.content_hash = content_hash
+        signature.signature = values.tobytes()
+        signature.computed_at = datetime.utcnow()
+        stale.append(submission.id)
+        buckets.extend({'submission_id': submission.id, 'band': band, 'bucket': bucket}
+                       for band, bucket in enumerate(band_buckets(values)))
+
+    if not stale:
+        return 0
+
+    try:
+        SubmissionLshBucket.query.filter(
+            SubmissionLshBucket.submission_id.in_(stale)
+        ).delete(synchronize_session=False)
+        if buckets:
+            db.session.execute(insert(SubmissionLshBucket), buckets)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error indexing submission signatures: {e}")
+        raise
+    return len(stale)
+
+
+def candidate_pairs(assignment, include_past=False):
+    """Return (submission_id, other_submission_id) pairs sharing an LSH bucket.
+
+    Pairs are taken within the assignment and, with include_past, against
+    submissions to earlier assignments of the same course. Pairs by the same
+    student are skipped.
+    """
+    bucket = aliased(SubmissionLshBucket)
+    other_bucket = aliased(SubmissionLshBucket)
+    other = aliased(Submission)
+    other_assignment = aliased(Assignment)
+
+    scope = and_(other.assignment_id == assignment.id, bucket.submission_id < other_bucket.submission_id)
+    if include_past:
+        scope = or_(scope, and_(other_assignment.course_id == assignment.course_id,
+                                other_assignment.due_date < assignment.due_date))
+
+    return db.session.query(bucket.submission_id, other_bucket.submission_id).join(
+        other_bucket, and_(other_bucket.band == bucket.band,
+                           other_bucket.bucket == bucket.bucket,
+                           other_bucket.submission_id != bucket.submission_id)
+    ).join(
+        Submission, Submission.id == bucket.submission_id
+    ).join(
+        other, other.id == other_bucket.submission_id
+    ).join(
+        other_assignment, other_assignment.id == other.assignment_id
+    ).filter(
+        Submission.assignment_id == assignment.id,
+        other.student_id != Submission.student_id,
+        scope
+    ).distinct().all()
+
+
+def find_similar_submissions(assignment, threshold=DEFAULT_THRESHOLD, include_past=False):
+    """Find near-duplicate submission pairs for an assignment.
+
+    LSH candidates are confirmed with an exact cosine similarity over one
+    shared TF-IDF matrix (the course model if fitted). Returns a list of dicts
+    sorted by similarity, highest first.
+    """
+    index_submissions(Submission.query.filter_by(assignment_id=assignment.id).all())
+    if include_past:
+        # Earlier submissions may predate the index or have changed since
+        index_submissions(Submission.query.join(Assignment).filter(
+            Assignment.course_id == assignment.course_id,
+            Assignment.due_date < assignment.due_date
+        ).all())
+
+    pairs = candidate_pairs(assignment, include_past)
+    if not pairs:
+        return []
+
+    submission_ids = sorted({submission_id for pair in pairs for submission_id in pair})
+    submissions = {
+        submission.id: submission for submission in Submission.query.options(
+            joinedload(Submission.student), joinedload(Submission.assignment),
+            joinedload(Submission.signature)
+        ).filter(Submission.id.in_(submission_ids))
+    }
+    row = {submission_id: i for i, submission_id in enumerate(submission_ids)}
+
+    # Shared sparse matrix over every submission involved in a candidate pair
+    documents = preprocess_many([submissions[submission_id].content for submission_id in submission_ids])
+    course_model = get_course_model(assignment.course_id)
+    if course_model is not None:
+        matrix = course_model.transform(documents)
+    else:
+        matrix = TfidfVectorizer(token_pattern=r'\S+', lowercase=False).fit_transform(documents)
+
+    # Rows are L2-normalized, so the row-wise dot product is the cosine similarity
+    left = [row[a] for a, b in pairs]
+    right = [row[b] for a, b in pairs]
+    cosine = np.asarray(matrix[left].multiply(matrix[right]).sum(axis=1)).ravel()
+
+    results = []
+    for (a, b), similarity in zip(pairs, cosine):
+        if similarity < threshold:
+            continue
+        first, second = submissions[a], submissions[b]
+        first_signature = np.frombuffer(first.signature.signature, dtype=np.uint32)
+        second_signature = np.frombuffer(second.signature.signature, dtype=np.uint32)
+        results.append({
+            'submission_id': first.id,
+            'student': f"{first.student.first_name} {first.student.last_name}",
+            'other_submission_id': second.id,
+            'other_student': f"{second.student.first_name} {second.student.last_name}",
+            'other_assignment_id': second.assignment_id,
+            'other_assignment': second.assignment.title,
+            'similarity': float(similarity),
+            'estimated_jaccard': float(np.mean(first_signature == second_signature))
+        })
+
+    results.sort(key=lambda result: result['similarity'], reverse=True)
+    return results
@@ -0,0 +1,211 @@
+import os
+import re
+import sys
+import time
+import logging
+import threading
+from functools import lru_cache
+from collections import Counter, deque
+from datetime import datetime
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Literals and bound values are stripped so that every execution of the
+# same query shape shares one fingerprint
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|:\w+|\$\d+|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+_PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Rolling, process-wide report shown on /admin/system
+_lock = threading.Lock()
+_recent = deque(maxlen=200)
+_endpoints = {}
+_suspects = {}
+_settings = {'enabled': False, 'headers': False, 'threshold': 5}
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement):
+    """Return the shape of a SQL statement: literals and parameters replaced by ?.
+
+    Statements come from SQLAlchemy's compiled cache, so the same strings recur
+    and their shapes are memoized.
+    """
+    shape = _STRING.sub('?', statement)
+    shape = _PLACEHOLDER.sub('?', shape)
+    shape = _NUMBER.sub('?', shape)
+    shape = _IN_LIST.sub('(?, ...)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+def _call_site():
+    """Return 'file:line in function' of the innermost project frame issuing the statement."""
+    # Walk the frames directly; traceback.extract_stack() would read every source line
+    frame = sys._getframe(2)
+    this_file = os.path.abspath(__file__)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_PROJECT_ROOT) and filename != this_file \
+                and os.sep + 'site-packages' + os.sep not in filename:
+            return f"{os.path.relpath(filename, _PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_profile' in g:
+        conn.info.setdefault('sql_profile_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not (has_request_context() and 'sql_profile' in g):
+        return
+    started = conn.info.get('sql_profile_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+
+    profile = g.sql_profile
+    profile['statements'] += 1
+    profile['db_time'] += elapsed
+    shape = fingerprint(statement)
+    profile['shapes'][shape] += 1
+    # The statement that crosses the threshold is issued from inside the loop
+    if profile['shapes'][shape] == _settings['threshold']:
+        profile['sites'][shape] = _call_site()
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    connection = exception_context.connection
+    if connection is None or not (has_request_context() and 'sql_profile' in g):
+        return
+    started = connection.info.get('sql_profile_started')
+    if started:
+        started.pop()
+
+
+def _start_request():
+    g.sql_profile = {
+        'started': time.perf_counter(),
+        'statements': 0,
+        'db_time': 0.0,
+        'shapes': Counter(),
+        'sites': {},
+    }
+
+
+def _finish_request(response):
+    profile = g.pop('sql_profile', None)
+    if profile is None:
+        return response
+
+    endpoint = request.endpoint or request.path
+    duration = time.perf_counter() - profile['started']
+    repeated = [(shape, count) for shape, count in profile['shapes'].most_common()
+                if count >= _settings['threshold'] and shape.upper().startswith('SELECT')]
+
+    _record(endpoint, request.method, request.path, response.status_code, profile, duration, repeated)
+    for shape, count in repeated:
+        logger.warning(f"Possible N+1 in {endpoint}: {count} x {shape[:120]}"
+                       f" ({profile['sites'].get(shape) or 'unknown call site'})")
+
+    if _settings['headers']:
+        response.headers['X-SQL-Statements'] = str(profile['statements'])
+        response.headers['X-SQL-Time-Ms'] = f"{profile['db_time'] * 1000:.1f}"
+        response.headers['X-SQL-N-Plus-One'] = str(len(repeated))
+    return response
+
+
+def _record(endpoint, method, path, status, profile, duration, repeated):
+    now = datetime.utcnow()
+    with _lock:
+        _recent.append({
+            'time': now,
+            'endpoint': endpoint,
+            'method': method,
+            'path': path,
+            'status': status,
+            'statements': profile['statements'],
+            'db_ms': profile['db_time'] * 1000,
+            'total_ms': duration * 1000,
+            'n_plus_one': len(repeated),
+        })
+
+        stats = _endpoints.setdefault(endpoint, {'endpoint': endpoint, 'requests': 0, 'statements': 0,
+                                                 'max_statements': 0, 'db_time': 0.0, 'total_time': 0.0})
+        stats['requests'] += 1
+        stats['statements'] += profile['statements']
+        stats['max_statements'] = max(stats['max_statements'], profile['statements'])
+        stats['db_time'] += profile['db_time']
+        stats['total_time'] += duration
+
+        for shape, count in repeated:
+            suspect = _suspects.setdefault((endpoint, shape), {'endpoint': endpoint, 'statement': shape,
+                                                               'requests': 0, 'max_repeats': 0})
+            suspect['requests'] += 1
+            suspect['max_repeats'] = max(suspect['max_repeats'], count)
+            suspect['call_site'] = profile['sites'].get(shape) or suspect.get('call_site')
+            suspect['last_seen'] = now
+
+
+def sql_report(limit=20):
+    """Return the rolling SQL report of this process for the admin system page."""
+    with _lock:
+        endpoints = [dict(stats) for stats in _endpoints.values()]
+        suspects = [dict(suspect) for suspect in _suspects.values()]
+        recent = list(_recent)[-limit:]
+
+    for stats in endpoints:
+        stats['avg_statements'] = stats['statements'] / stats['requests']
+        stats['avg_db_ms'] = stats['db_time'] * 1000 / stats['requests']
+        stats['avg_total_ms'] = stats['total_time'] * 1000 / stats['requests']
+    endpoints.sort(key=lambda stats: stats['avg_statements'], reverse=True)
+    suspects.sort(key=lambda suspect: (suspect['max_repeats'], suspect['requests']), reverse=True)
+
+    return {
+        'enabled': _settings['enabled'],
+        'threshold': _settings['threshold'],
+        'endpoints': endpoints[:limit],
+        'n_plus_one': suspects[:limit],
+        'recent': list(reversed(recent)),
+    }
+
+
+def reset_sql_report():
+    """Forget everything recorded so far."""
+    with _lock:
+        _recent.clear()
+        _endpoints.clear()
+        _suspects.clear()
+
+
+def init_app(app):
+    """Count statements and DB time of every request and flag repeated query shapes.
+
+    Enabled by SQL_PROFILING; SQL_PROFILE_HEADERS adds the X-SQL-* response
+    headers (meant for development).
+    """
+    global _recent
+    _settings['enabled'] = app.config.get('SQL_PROFILING', False)
+    _settings['headers'] = app.config.get('SQL_PROFILE_HEADERS', False)
+    _settings['threshold'] = app.config.get('N_PLUS_ONE_THRESHOLD', 5)
+    _recent = deque(maxlen=app.config.get('SQL_PROFILE_HISTORY', 200))
+    if not _settings['enabled']:
+        return
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(db.engine, 'handle_error', _handle_error)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,135 @@
+import os
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_models = {}  # course_id -> (file mtime, CourseTextModel)
+
+
+class CourseTextModel:
+    """TF-IDF weights fitted over one course's corpus.
+
+    Terms and IDF weights are saved together in one file per course; texts
+    passed in must already be preprocessed (see ai_services.preprocess_text).
+    """
+
+    def __init__(self, course_id, terms, idf, fitted_at, document_count):
+        self.course_id = course_id
+        self.idf = idf
+        self.fitted_at = fitted_at
+        self.document_count = document_count
+        self._counter = CountVectorizer(vocabulary=terms, token_pattern=r'\S+', lowercase=False)
+
+    @property
+    def fingerprint(self):
+        """Identifies this fit; used to key cached results that depend on it."""
+        return f"course{self.course_id}@{self.fitted_at}"
+
+    def transform(self, processed_texts):
+        """Return the L2-normalized TF-IDF rows (sparse) of preprocessed texts."""
+        counts = self._counter.transform(processed_texts).astype(np.float64)
+        return normalize(counts.multiply(self.idf).tocsr())
+
+    def similarity(self, processed_text1, processed_text2):
+        """Cosine similarity of two preprocessed texts under the course weights."""
+        matrix = self.transform([processed_text1, processed_text2])
+        return float(matrix[0].multiply(matrix[1]).sum())
+
+
+def model_dir():
+    """Return the absolute path of the directory holding the fitted models."""
+    path = Config.TEXT_MODEL_DIR
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    return path
+
+
+def _path(course_id):
+    return os.path.join(model_dir(), f"course_{course_id}.npz")
+
+
+def course_corpus(course_id):
+    """Return the course's texts: materials, assignment descriptions and submissions."""
+    from app import db
+    from models import Material, Assignment, Submission
+
+    materials = db.session.query(Material.title, Material.description).filter(
+        Material.course_id == course_id
+    ).all()
+    assignments = db.session.query(Assignment.title, Assignment.description).filter(
+        Assignment.course_id == course_id
+    ).all()
+    submissions = db.session.query(Submission.content).join(Assignment).filter(
+        Assignment.course_id == course_id,
+        Submission.content.isnot(None)
+    ).all()
+
+    corpus = [f"{title} {description or ''}" for title, description in materials + assignments]
+    corpus.extend(content for content, in submissions)
+    return corpus
+
+
+def fit_course_model(course_id):
+    """Fit the course's TF-IDF model over its corpus and save it to disk.
+
+    Returns the number of documents used, or 0 if there was nothing to fit.
+    """
+    from ai_services import preprocess_many
+
+    documents = [text for text in preprocess_many(course_corpus(course_id)) if text]
+    if not documents:
+        return 0
+
+    vectorizer = TfidfVectorizer(token_pattern=r'\S+', lowercase=False)
+    vectorizer.fit(documents)
+    terms = vectorizer.get_feature_names_out().tolist()
+
+    path = _path(course_id)
+    os.makedirs(model_dir(), exist_ok=True)
+    # Terms and weights share one file, swapped in by a single rename, so readers
+    # never see a half-written model or the weights of one fit with the terms of another
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, terms=np.array(terms, dtype=str), idf=vectorizer.idf_.astype(np.float64),
+                 fitted_at=np.array(datetime.utcnow().isoformat()), document_count=np.array(len(documents)))
+    os.replace(path + '.tmp', path)
+
+    logger.info(f"Fitted text model for course {course_id} on {len(documents)} documents")
+    return len(documents)
+
+
+def get_course_model(course_id):
+    """Return the fitted model of a course, or None if it has not been fitted.
+
+    Models are loaded on first use and reloaded when a refit replaces them.
+    """
+    if course_id is None:
+        return None
+    path = _path(course_id)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    cached = _models.get(course_id)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with _lock:
+        try:
+            with np.load(path, allow_pickle=False) as saved:
+                model = CourseTextModel(course_id, saved['terms'].tolist(), saved['idf'],
+                                        str(saved['fitted_at']), int(saved['document_count']))
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error loading text model for course {course_id}: {e}")
+            return None
+        _models[course_id] = (mtime, model)
+    return model
@@ -3,12 +3,24 @@ import re
 import csv
 import uuid
 import json
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 from flask import current_app, flash
-from models import User, Course, Assignment, Submission, Grade, Material, Schedule, RoleType
+from sqlalchemy import insert, and_, or_
+from sqlalchemy.orm import contains_eager
+from models import (User, Course, Assignment, Submission, Grade, Material, Schedule, RoleType, SubmissionStatus,
+                    AssignmentStatus, course_students)
 from app import db
+from ai_services import predict_cohort_performance, build_conflict_graph, color_timetable
+from freebusy import find_meeting_times, busy_bitmaps_by_week, week_starts_between
+
+# Students predicted below this percentage are listed as at risk
+AT_RISK_THRESHOLD = 60
+
+# Marks the Schedule rows written by generate_exam_timetable, so a rerun can replace them
+EXAM_TIMETABLE_DESCRIPTION = 'Generated exam timetable'
 
 def allowed_file(filename):
     """Check if a file extension is allowed."""
@@ -64,8 +76,156 @@ def get_user_courses(user):
     else:
         return user.enrolled_courses
         
+def get_faculty_course_stats(faculty_id):
+    """Get the roster and submission statistics of every course a faculty member teaches.
+
+    One statement: enrollments, and assignments with their submissions, are
+    each aggregated per course in a grouped subquery (statuses are counted
+    with conditional sums) and joined to the courses.
+
+    Returns:
+        list: dicts with 'course', 'student_count', 'assignment_count',
+        'total_submissions', 'graded_submissions' and 'pending_submissions',
+        ordered by course id
+    """
+    taught = db.session.query(Course.id).filter(Course.faculty_id == faculty_id)
+    
+    enrollment_stats = db.session.query(
+        course_students.c.course_id.label('course_id'),
+        db.func.count(course_students.c.user_id).label('student_count')
+    ).filter(
+        course_students.c.course_id.in_(taught)
+    ).group_by(course_students.c.course_id).subquery()
+    
+    graded_case = db.case((Submission.status.in_([SubmissionStatus.GRADED, SubmissionStatus.RETURNED]), 1), else_=0)
+    pending_case = db.case((Submission.status == SubmissionStatus.SUBMITTED, 1), else_=0)
+    submission_stats = db.session.query(
+        Assignment.course_id.label('course_id'),
+        db.func.count(db.distinct(Assignment.id)).label('assignment_count'),
+        db.func.count(Submission.id).label('total_submissions'),
+        db.func.sum(graded_case).label('graded_submissions'),
+        db.func.sum(pending_case).label('pending_submissions')
+    ).outerjoin(
+        Submission, Submission.assignment_id == Assignment.id
+    ).filter(
+        Assignment.course_id.in_(taught)
+    ).group_by(Assignment.course_id).subquery()
+    
+    rows = db.session.query(
+        Course,
+        db.func.coalesce(enrollment_stats.c.student_count, 0),
+        db.func.coalesce(submission_stats.c.assignment_count, 0),
+        db.func.coalesce(submission_stats.c.total_submissions, 0),
+        db.func.coalesce(submission_stats.c.graded_submissions, 0),
+        db.func.coalesce(submission_stats.c.pending_submissions, 0)
+    ).outerjoin(
+        enrollment_stats, enrollment_stats.c.course_id == Course.id
+    ).outerjoin(
+        submission_stats, submission_stats.c.course_id == Course.id
+    ).filter(
+        Course.faculty_id == faculty_id
+    ).order_by(Course.id).all()
+    
+    return [{
+        'course': course,
+        'student_count': int(student_count),
+        'assignment_count': int(assignment_count),
+        'total_submissions': int(total_submissions),
+        'graded_submissions': int(graded_submissions),
+        'pending_submissions': int(pending_submissions)
+    } for course, student_count, assignment_count, total_submissions, graded_submissions, pending_submissions
+        in rows]
+
+def assignment_cursor(assignment):
+    """Return the keyset cursor of an assignment in due-date order: '<due date>_<id>'."""
+    return f"{assignment.due_date.isoformat()}_{assignment.id}"
+
+def parse_assignment_cursor(cursor):
+    """Return (due_date, id) of an assignment cursor, or None if it is missing or malformed."""
+    try:
+        due_date, assignment_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(due_date), int(assignment_id)
+    except (AttributeError, ValueError):
+        return None
+
+def get_student_assignment_statuses(student_id, course_ids, course_id=None, search=None, due=None,
+                                    published_only=True, after=None, per_page=10):
+    """Get one page of a student's assignments, latest due first, with their submission status.
+
+    Each assignment comes with the student's submission and score from a
+    single outer-join query. Pages are keyset-paginated on (due_date, id):
+    pass the returned cursor as `after` to get the next page.
+
+    Args:
+        due: 'upcoming' or 'past' to keep only assignments due after or before now
+        after: cursor of the last assignment of the previous page
+
+    Returns:
+        tuple: (list of dicts with 'assignment', 'submission', 'status' -
+        Graded, Submitted, Overdue or Pending - and 'grade', next page cursor or None)
+    """
+    now = datetime.utcnow()
+    query = db.session.query(Assignment, Submission, Grade.score).join(
+        Course, Course.id == Assignment.course_id
+    ).outerjoin(
+        Submission, and_(Submission.assignment_id == Assignment.id, Submission.student_id == student_id)
+    ).outerjoin(
+        Grade, Grade.submission_id == Submission.id
+    ).options(
+        contains_eager(Assignment.course)
+    ).filter(
+        Assignment.course_id.in_(course_ids)
+    )
+    
+    if published_only:
+        query = query.filter(Assignment.status == AssignmentStatus.PUBLISHED)
+    if course_id:
+        query = query.filter(Assignment.course_id == course_id)
+    if search:
+        query = query.filter(Assignment.title.ilike(f'%{search}%'))
+    if due == 'upcoming':
+        query = query.filter(Assignment.due_date > now)
+    elif due == 'past':
+        query = query.filter(Assignment.due_date <= now)
+    
+    # Resume after the previous page's last assignment
+    if after:
+        due_date, assignment_id = after
+        query = query.filter(or_(
+            Assignment.due_date < due_date,
+            and_(Assignment.due_date == due_date, Assignment.id < assignment_id)
+        ))
+    
+    # One extra row tells whether there is a next page
+    rows = query.order_by(Assignment.due_date.desc(), Assignment.id.desc()).limit(per_page + 1).all()
+    next_cursor = assignment_cursor(rows[per_page - 1][0]) if len(rows) > per_page else None
+    
+    statuses = []
+    for assignment, submission, score in rows[:per_page]:
+        grade = None
+        if submission is None:
+            status = "Overdue" if assignment.due_date < now else "Pending"
+        elif submission.status in [SubmissionStatus.GRADED, SubmissionStatus.RETURNED]:
+            status = "Graded"
+            grade = score
+        else:
+            status = "Submitted"
+        statuses.append({
+            'assignment': assignment,
+            'submission': submission,
+            'status': status,
+            'grade': grade
+        })
+    
+    return statuses, next_cursor
+
 def calculate_course_analytics(course_id):
-    """Calculate analytics for a specific course."""
+    """Calculate analytics for a specific course.
+
+    Everything is aggregated in the database with grouped queries, so the
+    number of round trips stays the same regardless of roster size or the
+    number of assignments and submissions in the course.
+    """
     analytics = {}
     
     # Get course data
@@ -73,81 +233,110 @@ def calculate_course_analytics(course_id):
     if not course:
         return analytics
     
-    # Get all assignments for the course
-    assignments = Assignment.query.filter_by(course_id=course_id).all()
-    assignment_count = len(assignments)
+    # Per-assignment submission statistics, aggregated in one grouped query
+    late_case = db.case((Submission.submission_date > Assignment.due_date, 1), else_=0)
+    submission_stats = db.session.query(
+        Submission.assignment_id.label('assignment_id'),
+        db.func.count(Submission.id).label('submission_count'),
+        db.func.count(Grade.id).label('graded_count'),
+        db.func.sum(Grade.score).label('score_total'),
+        db.func.sum(late_case).label('late_submissions')
+    ).join(Assignment, Submission.assignment_id == Assignment.id).outerjoin(
+        Grade, Grade.submission_id == Submission.id
+    ).filter(
+        Assignment.course_id == course_id
+    ).group_by(Submission.assignment_id).subquery()
+    
+    # Get all assignments for the course joined with their statistics
+    assignment_rows = db.session.query(
+        Assignment.id, Assignment.title, Assignment.max_score,
+        submission_stats.c.submission_count,
+        submission_stats.c.graded_count,
+        submission_stats.c.score_total,
+        submission_stats.c.late_submissions
+    ).outerjoin(
+        submission_stats, submission_stats.c.assignment_id == Assignment.id
+    ).filter(
+        Assignment.course_id == course_id
+    ).order_by(Assignment.id).all()
+    
+    assignment_count = len(assignment_rows)
     analytics['assignment_count'] = assignment_count
     
     # Calculate average grade for each assignment
     assignment_analytics = []
-    overall_avg_score = 0
-    total_submissions = 0
+    overall_score_total = 0
+    total_graded = 0
     
-    for assignment in assignments:
-        submissions = Submission.query.filter_by(assignment_id=assignment.id).all()
-        submission_count = len(submissions)
-        
-        # Skip assignments with no submissions
-        if submission_count == 0:
+    for row in assignment_rows:
+        # Assignments with no submissions keep the short form
+        if not row.submission_count:
             assignment_analytics.append({
-                'id': assignment.id,
-                'title': assignment.title,
+                'id': row.id,
+                'title': row.title,
                 'submission_count': 0,
                 'avg_score': None,
-                'max_score': assignment.max_score,
+                'max_score': row.max_score,
                 'late_submissions': 0
             })
             continue
         
-        # Calculate statistics
-        graded_submissions = [s for s in submissions if s.grade is not None]
-        grades = [s.grade.score for s in graded_submissions]
-        late_submissions = sum(1 for s in submissions if s.is_late())
-        
-        avg_score = sum(grades) / len(grades) if grades else None
-        
-        if avg_score is not None:
-            overall_avg_score += sum(grades)
-            total_submissions += len(grades)
+        if row.graded_count:
+            avg_score = row.score_total / row.graded_count
+            overall_score_total += row.score_total
+            total_graded += row.graded_count
+        else:
+            avg_score = None
         
         assignment_analytics.append({
-            'id': assignment.id,
-            'title': assignment.title,
-            'submission_count': submission_count,
-            'graded_count': len(graded_submissions),
+            'id': row.id,
+            'title': row.title,
+            'submission_count': row.submission_count,
+            'graded_count': row.graded_count,
             'avg_score': avg_score,
-            'max_score': assignment.max_score,
-            'late_submissions': late_submissions
+            'max_score': row.max_score,
+            'late_submissions': int(row.late_submissions or 0)
         })
     
     analytics['assignment_details'] = assignment_analytics
-    analytics['overall_avg_score'] = overall_avg_score / total_submissions if total_submissions > 0 else None
+    analytics['overall_avg_score'] = overall_score_total / total_graded if total_graded > 0 else None
+    
+    # Per-student statistics for the course, aggregated in one grouped query
+    student_stats = db.session.query(
+        Submission.student_id.label('student_id'),
+        db.func.count(Submission.id).label('submission_count'),
+        db.func.avg(Grade.score).label('avg_grade')
+    ).join(Assignment, Submission.assignment_id == Assignment.id).outerjoin(
+        Grade, Grade.submission_id == Submission.id
+    ).filter(
+        Assignment.course_id == course_id
+    ).group_by(Submission.student_id).subquery()
+    
+    # Student performance over the whole roster
+    student_rows = db.session.query(
+        User.id, User.first_name, User.last_name,
+        student_stats.c.submission_count,
+        student_stats.c.avg_grade
+    ).join(
+        course_students, course_students.c.user_id == User.id
+    ).outerjoin(
+        student_stats, student_stats.c.student_id == User.id
+    ).filter(
+        course_students.c.course_id == course_id
+    ).order_by(User.id).all()
     
-    # Student performance
-    students = course.students
     student_analytics = []
     
-    for student in students:
-        student_submissions = Submission.query.join(Assignment).filter(
-            Submission.student_id == student.id,
-            Assignment.course_id == course_id
-        ).all()
-        
-        submission_count = len(student_submissions)
-        graded_submissions = [s for s in student_submissions if s.grade is not None]
-        
-        if graded_submissions:
-            avg_grade = sum(s.grade.score for s in graded_submissions) / len(graded_submissions)
-        else:
-            avg_grade = None
+    for row in student_rows:
+        submission_count = row.submission_count or 0
         
         student_analytics.append({
-            'id': student.id,
-            'name': student.get_full_name(),
+            'id': row.id,
+            'name': f"{row.first_name} {row.last_name}",
             'submission_count': submission_count,
             'assignment_count': assignment_count,
             'completion_rate': (submission_count / assignment_count * 100) if assignment_count > 0 else 0,
-            'avg_grade': avg_grade
+            'avg_grade': float(row.avg_grade) if row.avg_grade is not None else None
         })
     
     analytics['student_performance'] = student_analytics
@@ -229,32 +418,74 @@ def generate_schedule_suggestions(user_id, start_date=None, end_date=None):
         start_date = datetime.now()
     if not end_date:
         end_date = start_date + timedelta(days=30)
+    if not isinstance(start_date, datetime):
+        start_date = datetime.combine(start_date, datetime.min.time())
+    if not isinstance(end_date, datetime):
+        end_date = datetime.combine(end_date, datetime.min.time())
     
     suggestions = []
     
+    # Suggested times avoid everyone's existing schedule (see freebusy)
+    now = datetime.now()
+    window_start = max(start_date, now)
+    
     # For faculty: suggest office hours and grading sessions
     if user.is_faculty():
-        courses = Course.query.filter_by(faculty_id=user_id).all()
+        courses = Course.query.filter_by(faculty_id=user_id).order_by(Course.id).all()
+        course_ids = [course.id for course in courses]
+        
+        # Every roster in one query; busy times are loaded once for all their members
+        rosters = {course_id: [] for course_id in course_ids}
+        if course_ids:
+            for course_id, student_id in db.session.query(
+                course_students.c.course_id, course_students.c.user_id
+            ).filter(course_students.c.course_id.in_(course_ids)):
+                rosters[course_id].append(student_id)
+        members = [user_id] + sorted({student_id for roster in rosters.values() for student_id in roster}
+                                     - {user_id})
+        rows = {member_id: i for i, member_id in enumerate(members)}
+        bitmaps = busy_bitmaps_by_week(members, week_starts_between(window_start, end_date))
+        
+        def busy_of(user_ids):
+            indices = [rows[member_id] for member_id in user_ids]
+            return {week_start: week[indices] for week_start, week in bitmaps.items()}
+        
+        grading_times = [meeting['start'] for meeting in find_meeting_times(
+            [user_id], window_start, end_date, 120, bitmaps=busy_of([user_id])
+        )]
+        
+        # Ungraded submissions of every assignment of these courses, in one grouped query
+        assignments = {course_id: [] for course_id in course_ids}
+        ungraded_counts = {}
+        if course_ids:
+            for assignment in Assignment.query.filter(
+                Assignment.course_id.in_(course_ids)
+            ).order_by(Assignment.due_date, Assignment.id):
+                assignments[assignment.course_id].append(assignment)
+            ungraded_counts = dict(db.session.query(
+                Submission.assignment_id, db.func.count(Submission.id)
+            ).join(Assignment, Submission.assignment_id == Assignment.id).outerjoin(Grade).filter(
+                Assignment.course_id.in_(course_ids),
+                Grade.id.is_(None)
+            ).group_by(Submission.assignment_id).all())
         
         for course in courses:
-            # Suggest office hours
+            # Suggest office hours when most of the class is free
+            group = [user_id] + rosters[course.id]
+            meetings = find_meeting_times(group, window_start, end_date, 60, limit=2,
+                                          weekdays_only=True, bitmaps=busy_of(group))
             suggestions.append({
                 'type': 'office_hours',
                 'title': f"Office Hours for {course.code}",
                 'description': f"Weekly office hours for {course.title}",
                 'course_id': course.id,
-                'suggested_times': [
-                    start_date.replace(hour=14, minute=0, second=0, microsecond=0) + timedelta(days=i)
-                    for i in range(7) if i != 5 and i != 6  # Weekdays only
-                ][:2]  # Limit to 2 suggestions
+                'suggested_times': [meeting['start'] for meeting in meetings],
+                'available_counts': [meeting['free'] for meeting in meetings]
             })
             
-            # Get pending assignments that need grading
-            pending_assignments = Assignment.query.filter_by(course_id=course.id).all()
-            for assignment in pending_assignments:
-                ungraded_count = Submission.query.filter_by(
-                    assignment_id=assignment.id
-                ).outerjoin(Grade).filter(Grade.id.is_(None)).count()
+            # Assignments with submissions that need grading
+            for assignment in assignments[course.id]:
+                ungraded_count = ungraded_counts.get(assignment.id, 0)
                 
                 if ungraded_count > 0:
                     suggestions.append({
@@ -264,10 +495,7 @@ def generate_schedule_suggestions(user_id, start_date=None, end_date=None):
                         'course_id': course.id,
                         'assignment_id': assignment.id,
                         'ungraded_count': ungraded_count,
-                        'suggested_times': [
-                            datetime.now() + timedelta(hours=i*24)
-                            for i in range(1, 4)
-                        ]
+                        'suggested_times': grading_times
                     })
     
     # For students: suggest study sessions for upcoming assignments
@@ -277,10 +505,17 @@ def generate_schedule_suggestions(user_id, start_date=None, end_date=None):
             course_students
         ).filter(
             course_students.c.user_id == user_id,
-            Assignment.due_date > datetime.now(),
-            Assignment.due_date <= datetime.now() + timedelta(days=14)
+            Assignment.due_date > now,
+            Assignment.due_date <= now + timedelta(days=14)
         ).order_by(Assignment.due_date).all()
         
+        # One free hour per day until the last due date
+        free_times = []
+        if upcoming_assignments:
+            free_times = [meeting['start'] for meeting in find_meeting_times(
+                [user_id], now, upcoming_assignments[-1].due_date, 60, limit=14
+            )]
+        
         for assignment in upcoming_assignments:
             # Check if already submitted
             submission_exists = Submission.query.filter_by(
@@ -290,11 +525,15 @@ def generate_schedule_suggestions(user_id, start_date=None, end_date=None):
             
             if not submission_exists:
                 # Calculate days until due
-                days_until_due = (assignment.due_date - datetime.now()).days
+                days_until_due = (assignment.due_date - now).days
                 
                 # More urgent assignments get more study sessions
                 num_sessions = max(1, min(3, 7 // days_until_due)) if days_until_due > 0 else 1
                 
+                # Spread the sessions over the free hours before the deadline
+                before_due = [time for time in free_times if time + timedelta(hours=1) <= assignment.due_date]
+                step = max(1, len(before_due) // num_sessions)
+                
                 suggestions.append({
                     'type': 'study_session',
                     'title': f"Study for {assignment.title}",
@@ -303,10 +542,7 @@ def generate_schedule_suggestions(user_id, start_date=None, end_date=None):
                     'assignment_id': assignment.id,
                     'due_date': assignment.due_date,
                     'days_until_due': days_until_due,
-                    'suggested_times': [
-                        datetime.now() + timedelta(days=i*(days_until_due//(num_sessions+1)))
-                        for i in range(1, num_sessions+1)
-                    ]
+                    'suggested_times': before_due[::step][:num_sessions]
                 })
     
     return suggestions
@@ -423,3 +659,147 @@ def get_course_progression(course_id):
         progression_data.append(student_data)
     
     return progression_data
+
+def get_course_grade_matrix(course_id):
+    """Get a course's grade percentages as a students x assignments array.
+    
+    Returns (students, assignment_ids, matrix): rows follow `students` (the
+    roster, by id), columns the assignments in due-date order, and missing
+    grades are NaN.
+    """
+    students = User.query.join(
+        course_students, course_students.c.user_id == User.id
+    ).filter(course_students.c.course_id == course_id).order_by(User.id).all()
+    
+    assignment_ids = [assignment_id for assignment_id, in db.session.query(Assignment.id).filter(
+        Assignment.course_id == course_id
+    ).order_by(Assignment.due_date, Assignment.id)]
+    
+    grades = db.session.query(
+        Submission.student_id,
+        Submission.assignment_id,
+        (Grade.score * 100.0 / db.func.nullif(Assignment.max_score, 0)).label('percentage')
+    ).join(Grade, Grade.submission_id == Submission.id).join(
+        Assignment, Assignment.id == Submission.assignment_id
+    ).filter(Assignment.course_id == course_id).all()
+    
+    matrix = np.full((len(students), len(assignment_ids)), np.nan)
+    rows = {student.id: i for i, student in enumerate(students)}
+    columns = {assignment_id: j for j, assignment_id in enumerate(assignment_ids)}
+    
+    # Grades of students no longer on the roster are ignored
+    cells = [(rows[student_id], columns[assignment_id], percentage)
+             for student_id, assignment_id, percentage in grades
+             if student_id in rows and percentage is not None]
+    if cells:
+        row_index, column_index, values = zip(*cells)
+        matrix[list(row_index), list(column_index)] = values
+    
+    return students, assignment_ids, matrix
+
+def get_at_risk_students(course_id, threshold=AT_RISK_THRESHOLD):
+    """Get the students of a course whose predicted grade is below `threshold`, lowest first."""
+    students, _, matrix = get_course_grade_matrix(course_id)
+    cohort = predict_cohort_performance(matrix)
+    
+    # NaN predictions (fewer than two grades) never compare below the threshold
+    with np.errstate(invalid='ignore'):
+        at_risk = np.flatnonzero(cohort['prediction'] < threshold)
+    at_risk = at_risk[np.argsort(cohort['prediction'][at_risk], kind='stable')]
+    
+    return [{
+        'student_id': students[i].id,
+        'student_name': students[i].get_full_name(),
+        'prediction': float(cohort['prediction'][i]),
+        'current_average': float(cohort['current_average'][i]),
+        'trend': float(cohort['trend'][i]),
+        'confidence': float(cohort['confidence'][i]),
+        'grade_count': int(cohort['grade_count'][i])
+    } for i in at_risk]
+
+def exam_slots(start_date, days, slots_per_day, duration_minutes=120, first_start='09:00', gap_minutes=30):
+    """Build exam time slots: `slots_per_day` sittings on each of `days` days, skipping weekends.
+    
+    Returns a list of (start_time, end_time) tuples in chronological order.
+    """
+    hour, minute = (int(part) for part in first_start.split(':'))
+    slots = []
+    day = datetime.combine(start_date, datetime.min.time())
+    while len(slots) < days * slots_per_day:
+        if day.weekday() < 5:
+            start = day.replace(hour=hour, minute=minute)
+            for _ in range(slots_per_day):
+                slots.append((start, start + timedelta(minutes=duration_minutes)))
+                start += timedelta(minutes=duration_minutes + gap_minutes)
+        day += timedelta(days=1)
+    return slots
+
+def generate_exam_timetable(slots, rooms=None, owner_id=None, course_ids=None, replace=False):
+    """Generate a conflict-free exam timetable and save it as Schedule rows.
+    
+    Args:
+        slots: list of (start_time, end_time) tuples, chronological (see exam_slots)
+        rooms (list, optional): (name, capacity) tuples; rooms are not allocated if omitted
+        owner_id (int, optional): owner of exams whose course has no faculty
+        course_ids (list, optional): courses to schedule (default: every active course with students)
+        replace (bool): delete previously generated exams of these courses first
+        
+    Returns:
+        dict: 'scheduled' and 'unplaced' course ids, and 'adjacent_conflicts'
+    """
+    query = db.session.query(course_students.c.course_id, course_students.c.user_id).join(
+        Course, Course.id == course_students.c.course_id
+    )
+    if course_ids is None:
+        query = query.filter(Course.is_active == True)
+    else:
+        query = query.filter(Course.id.in_(course_ids))
+    enrollments = np.array(query.all(), dtype=np.int64).reshape(-1, 2)
+    
+    # Compact ids to matrix positions
+    course_id_list, course_index = np.unique(enrollments[:, 0], return_inverse=True)
+    _, student_index = np.unique(enrollments[:, 1], return_inverse=True)
+    conflicts = build_conflict_graph(course_index, student_index, len(course_id_list))
+    sizes = np.bincount(course_index, minlength=len(course_id_list))
+    
+    # Consecutive sittings on the same day count as adjacent
+    adjacent_slots = np.array([slots[t][0].date() == slots[t + 1][0].date() for t in range(len(slots) - 1)],
+                              dtype=bool)
+    result = color_timetable(conflicts, sizes, len(slots),
+                             room_capacities=[capacity for _, capacity in rooms] if rooms else None,
+                             adjacent_slots=adjacent_slots)
+    
+    courses = {course.id: course for course in Course.query.filter(Course.id.in_(course_id_list.tolist()))}
+    rows = []
+    for position, course_id in enumerate(course_id_list.tolist()):
+        slot = int(result['slots'][position])
+        course = courses[course_id]
+        if slot == -1 or not (course.faculty_id or owner_id):
+            continue
+        start_time, end_time = slots[slot]
+        rows.append({
+            'title': f"{course.code} Exam",
+            'description': EXAM_TIMETABLE_DESCRIPTION,
+            'start_time': start_time,
+            'end_time': end_time,
+            'course_id': course_id,
+            'owner_id': course.faculty_id or owner_id,
+            'location': ', '.join(rooms[room][0] for room in result['rooms'][position])[:100] if rooms else None,
+            'is_recurring': False
+        })
+    
+    if replace:
+        Schedule.query.filter(
+            Schedule.course_id.in_(course_id_list.tolist()),
+            Schedule.description == EXAM_TIMETABLE_DESCRIPTION
+        ).delete(synchronize_session=False)
+    if rows:
+        db.session.execute(insert(Schedule), rows)
+    db.session.commit()
+    
+    scheduled = {row['course_id'] for row in rows}
+    return {
+        'scheduled': sorted(scheduled),
+        'unplaced': [course_id for course_id in course_id_list.tolist() if course_id not in scheduled],
+        'adjacent_conflicts': result['adjacent_conflicts']
+    }